@@ -0,0 +1,139 @@
+"""
+Captura de artefatos de erro (screenshot + DOM) sem travar a automação.
+
+- No thread da automação fica só o mínimo que precisa do driver: screenshot em
+  JPEG comprimido direto do Chrome (CDP Page.captureScreenshot; PNG como
+  fallback) e o page_source. Compressão gzip do DOM e gravação em disco rodam em
+  um thread de background, com fila limitada (se encher, o artefato é
+  descartado).
+- Limite de taxa (token bucket): numa tempestade de erros, capturas além de
+  max_per_minute são puladas antes de qualquer chamada ao driver.
+- Cada execução grava em um diretório próprio, com nomes únicos
+  (<seq>_<unidade>_<passo>.*) e um teto de tamanho: ao passar de max_bytes os
+  artefatos mais antigos são apagados (ring buffer).
+"""
+import base64
+import gzip
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_writer_ids = itertools.count(1)
+
+
+def _safe_name(text) -> str:
+    return re.sub(r'[^\w.-]+', '_', str(text or 'na'))[:60]
+
+
+class ArtifactWriter:
+    def __init__(self, base_dir: str = 'erros', max_bytes: int = 200 * 1024 * 1024,
+                 max_per_minute: int = 6, queue_size: int = 20, jpeg_quality: int = 50):
+        # um diretório por writer (várias sessões no mesmo processo não se misturam)
+        self.run_dir = os.path.join(base_dir, f"{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{next(_writer_ids)}")
+        self.max_bytes = max_bytes
+        self.jpeg_quality = jpeg_quality
+        self.rate = max_per_minute / 60.0
+        self.capacity = float(max_per_minute)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._files: deque = deque()  # (path, size) em ordem de gravação
+        self._total = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name='siad-artifacts', daemon=True)
+        self._thread.start()
+
+    def _take_token(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            self._seq += 1
+            return True
+
+    def _grab_screenshot(self, driver):
+        try:
+            data = driver.execute_cdp_cmd('Page.captureScreenshot', {'format': 'jpeg', 'quality': self.jpeg_quality})
+            return 'jpg', base64.b64decode(data['data'])
+        except Exception:
+            return 'png', driver.get_screenshot_as_png()
+
+    def capture(self, driver, unit: Optional[str], step: str, error: Optional[str] = None) -> bool:
+        """Grabs screenshot + DOM on the calling thread (rate limited) and queues the write."""
+        if not self._take_token():
+            self.dropped += 1
+            logger.debug("Artefato de erro pulado (limite de taxa): %s", step)
+            return False
+        item = {'seq': self._seq, 'unit': unit, 'step': step, 'error': error, 'ts': time.time()}
+        try:
+            item['shot_ext'], item['shot'] = self._grab_screenshot(driver)
+        except Exception as e:
+            item['shot_error'] = str(e)
+        try:
+            item['dom'] = driver.page_source
+            item['url'] = driver.current_url
+        except Exception as e:
+            item['dom_error'] = str(e)
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _write(self, path: str, data: bytes):
+        with open(path, 'wb') as f:
+            f.write(data)
+        self._files.append((path, len(data)))
+        self._total += len(data)
+
+    def _enforce_cap(self):
+        while self._total > self.max_bytes and self._files:
+            path, size = self._files.popleft()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self._total -= size
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                # diretório só é criado quando há o primeiro artefato
+                os.makedirs(self.run_dir, exist_ok=True)
+                stem = os.path.join(self.run_dir, f"{item['seq']:05d}_{_safe_name(item['unit'])}_{_safe_name(item['step'])}")
+                if item.get('shot'):
+                    self._write(f"{stem}.{item['shot_ext']}", item.pop('shot'))
+                if item.get('dom') is not None:
+                    self._write(f"{stem}.html.gz", gzip.compress(item.pop('dom').encode('utf-8'), compresslevel=6))
+                self._write(f"{stem}.json", json.dumps(item, ensure_ascii=False, default=str).encode('utf-8'))
+                self._enforce_cap()
+            except Exception as e:
+                logger.warning("Falha ao gravar artefato de erro: %s", e)
+
+    def close(self, timeout: float = 10.0):
+        """Drains the queue and stops the writer."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+        if self.dropped:
+            logger.info("Artefatos de erro descartados por limite de taxa/fila: %s", self.dropped)
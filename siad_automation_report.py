@@ -1,5 +1,6 @@
 import pandas as pd
 import logging
+import os
 import time
 from typing import List
 import openpyxl # Necessário para manipulação de arquivos .xlsx
@@ -14,6 +15,9 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.options import Options
 
+from siad_artifacts import ArtifactWriter
+from siad_logging import setup_async_logging
+
 # Classe de exceção personalizada para erros de automação
 class AutomationError(Exception):
     pass
@@ -26,13 +30,8 @@ class SIADAutomation:
         :param excel_path: Path to the Excel file with unit data
         :param log_file: Path for the log file
         """
-        # Configure logging
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            filename=log_file,
-            filemode='w'
-        )
+        # Configure logging (arquivos por execução, JSONL + texto, gravados em background)
+        setup_async_logging(log_file)
         self.logger = logging.getLogger(__name__)
 
         # Browser configuration for sandbox environment
@@ -48,9 +47,12 @@ class SIADAutomation:
             service = Service(ChromeDriverManager().install())
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
         except Exception as e:
-            self.logger.error(f"WebDriver initialization failed: {e}")
+            self.logger.error("WebDriver initialization failed: %s", e)
             raise
 
+        # Screenshots/DOM de erro gravados em background (limite de taxa e de tamanho)
+        self.artifacts = ArtifactWriter()
+
         # Configuration parameters
         self.TIMEOUT = 60 # Aumentado para 60s devido à lentidão do sistema
         self.excel_path = excel_path
@@ -113,25 +115,28 @@ class SIADAutomation:
 
             if interaction_type == 'click':
                 element.click()
-                self.logger.info(f"Clicou em: {xpath_key} ({xpath})")
+                self.logger.info("Clicou em: %s (%s)", xpath_key, xpath)
             elif interaction_type == 'send_keys':
+                # senha não vai para o log
+                shown = '***' if 'senha' in xpath_key else input_text
                 try:
                     # Tenta a digitação normal
                     element.clear()
                     element.send_keys(input_text)
-                    self.logger.info(f"Digitou '{input_text}' em: {xpath_key} ({xpath})")
+                    self.logger.info("Digitou '%s' em: %s (%s)", shown, xpath_key, xpath)
                 except Exception as e:
-                    self.logger.warning(f"Falha na digitação normal ({e}). Tentando forçar via JavaScript...")
-                    # Fallback: Força a digitação via JavaScript
-                    script_send = f"arguments[0].value = '{input_text}'; arguments[0].dispatchEvent(new Event('change'));"
-                    self.driver.execute_script(script_send, element)
-                    self.logger.info(f"Digitou '{input_text}' em: {xpath_key} via JS.")
+                    self.logger.warning("Falha na digitação normal (%s). Tentando forçar via JavaScript...", e)
+                    # Fallback: Força a digitação via JavaScript; o valor vai como argumento (mascarado no
+                    # trace de comandos), nunca dentro do código do script
+                    script_send = "arguments[0].value = arguments[1]; arguments[0].dispatchEvent(new Event('change'));"
+                    self.driver.execute_script(script_send, element, input_text)
+                    self.logger.info("Digitou '%s' em: %s via JS.", shown, xpath_key)
             
             return element
 
         except Exception as e:
-            self.logger.error(f"Erro ao interagir com {xpath_key} ({xpath}): {e}")
-            self.driver.save_screenshot(f'erro_{xpath_key}.png')
+            self.logger.error("Erro ao interagir com %s (%s): %s", xpath_key, xpath, e)
+            self.artifacts.capture(self.driver, None, f'erro_{xpath_key}', str(e))
             raise AutomationError(f"Falha na interação com {xpath_key}. Verifique a screenshot.")
 
     def login(self):
@@ -148,7 +153,7 @@ class SIADAutomation:
 
     def select_unit_initial(self, unit_code: str):
         """Select the unit on the initial modal screen"""
-        self.logger.info(f"Selecionando unidade inicial: {unit_code}")
+        self.logger.info("Selecionando unidade inicial: %s", unit_code)
         
         # 1. Digitar a unidade no campo do modal via Selenium (mais confiável para digitação)
         # O elemento é retornado para que possamos enviar as teclas
@@ -169,11 +174,11 @@ class SIADAutomation:
             return 
             
         # Se chegou aqui, a seleção foi bem-sucedida
-        self.logger.info(f"Unidade inicial {unit_code} selecionada com sucesso.")
+        self.logger.info("Unidade inicial %s selecionada com sucesso.", unit_code)
 
     def generate_inventory_report(self, unit_code: str):
         """Navigate and generate the inventory report for a single unit"""
-        self.logger.info(f"Iniciando geração de relatório para unidade: {unit_code}")
+        self.logger.info("Iniciando geração de relatório para unidade: %s", unit_code)
         
         # 1. Esperar a página principal carregar (ícone do menu principal)
         self.wait_and_interact('menu_principal_icon')
@@ -211,12 +216,12 @@ class SIADAutomation:
         # 6. Clicar em "OK" na caixa de diálogo de confirmação
         self.wait_and_interact('btn_ok')
         
-        self.logger.info(f"Solicitação de geração de relatório para {unit_code} concluída.")
+        self.logger.info("Solicitação de geração de relatório para %s concluída.", unit_code)
         time.sleep(2) # Pausa para garantir que a solicitação foi processada antes de mudar de unidade
 
     def change_unit_and_loop(self, unit_code: str):
         """Change the current unit to the next one in the loop"""
-        self.logger.info(f"Iniciando alteração de unidade para a próxima: {unit_code}")
+        self.logger.info("Iniciando alteração de unidade para a próxima: %s", unit_code)
         
         # 1. Clicar no menu de usuário (ícone superior direito)
         self.wait_and_interact('menu_usuario_icon')
@@ -238,7 +243,7 @@ class SIADAutomation:
             # Se o erro foi tratado, a unidade foi pulada e o método deve retornar
             return 
             
-        self.logger.info(f"Unidade alterada com sucesso para: {unit_code}")
+        self.logger.info("Unidade alterada com sucesso para: %s", unit_code)
         time.sleep(2)
 
     def write_unauthorized_unit(self, unit_code: str):
@@ -263,10 +268,10 @@ class SIADAutomation:
             
             # Salva o DataFrame de volta no arquivo
             df.to_excel(unauthorized_file, index=False, engine='openpyxl')
-            self.logger.warning(f"Unidade não autorizada {unit_code} registrada em {unauthorized_file}")
+            self.logger.warning("Unidade não autorizada %s registrada em %s", unit_code, unauthorized_file)
             
         except Exception as e:
-            self.logger.error(f"ERRO FATAL ao escrever unidade não autorizada {unit_code} no Excel: {e}")
+            self.logger.error("ERRO FATAL ao escrever unidade não autorizada %s no Excel: %s", unit_code, e)
 
     def handle_unit_error(self, unit_code: str):
         """
@@ -282,7 +287,7 @@ class SIADAutomation:
                 EC.presence_of_element_located((By.XPATH, self.XPATHS['error_unidade_nao_autorizada']))
             )
             
-            self.logger.warning(f"Erro de acesso detectado para a unidade: {unit_code}. A unidade será registrada e pulada.")
+            self.logger.warning("Erro de acesso detectado para a unidade: %s. A unidade será registrada e pulada.", unit_code)
             
             # 1. Registrar a unidade no arquivo Excel
             self.write_unauthorized_unit(unit_code)
@@ -309,14 +314,14 @@ class SIADAutomation:
                 self.logger.warning("Nenhuma unidade encontrada na primeira coluna do Excel. Encerrando.")
                 return
 
-            self.logger.info(f"Total de {len(unit_codes)} unidades para processar.")
+            self.logger.info("Total de %s unidades para processar.", len(unit_codes))
             
             # 2. Login
             self.login()
             
             # 3. Loop de Automação
             for i, unit_code in enumerate(unit_codes):
-                self.logger.info(f"--- Processando unidade {i+1}/{len(unit_codes)}: {unit_code} ---")
+                self.logger.info("--- Processando unidade %s/%s: %s ---", i+1, len(unit_codes), unit_code)
                 
                 # A primeira unidade usa a função select_unit_initial
                 if i == 0:
@@ -331,9 +336,9 @@ class SIADAutomation:
             self.logger.info("Automação concluída com sucesso para todas as unidades.")
         
         except AutomationError as e:
-            self.logger.error(f"Automação interrompida devido a um erro de interação: {e}")
+            self.logger.error("Automação interrompida devido a um erro de interação: %s", e)
         except Exception as e:
-            self.logger.error(f"Erro inesperado durante a execução: {e}")
+            self.logger.error("Erro inesperado durante a execução: %s", e)
         
         finally:
             # Garantir que o driver feche
@@ -341,12 +346,18 @@ class SIADAutomation:
                 self.driver.quit()
             except:
                 pass
+            self.artifacts.close()
             self.logger.info("WebDriver fechado.")
 
 def main():
     try:
         # ATENÇÃO: Substitua o caminho do Excel se necessário e insira suas credenciais na classe SIADAutomation
         automation = SIADAutomation()
+        # SIAD_TRACE_COMMANDS=arquivo.jsonl grava cada comando WebDriver (ver siad_command_trace.py)
+        trace_path = os.environ.get('SIAD_TRACE_COMMANDS')
+        if trace_path:
+            from siad_command_trace import CommandRecorder
+            CommandRecorder(trace_path).attach(automation.driver)
         automation.execute_automation()
     except Exception as e:
         print(f"A automação falhou: {e}")
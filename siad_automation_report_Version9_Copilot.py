@@ -15,12 +15,19 @@ Principais mudanças:
   realmente críticos (por exemplo, falha ao acionar botão 'Alterar' após abrir modal).
 - Logs mais claros para seguir o fluxo de tentativa direta vs. menu.
 
-Observação: salve este arquivo como .py sem cabeçalhos extras. Recomendo instalar
-pyperclip (pip install pyperclip) para melhor confiabilidade do Ctrl+V.
+Observação: salve este arquivo como .py sem cabeçalhos extras. Por padrão os campos
+são preenchidos sem usar a área de transferência do sistema (CDP Input.insertText,
+isolado por aba/sessão); pyperclip só é necessário com --input-mode clipboard.
 """
+import argparse
+import json
 import logging
+import os
+import re
+import threading
 import time
-from typing import Optional
+from contextlib import contextmanager
+from typing import Callable, Iterable, List, Optional
 
 import pandas as pd
 import openpyxl
@@ -36,48 +43,232 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.options import Options
 from selenium.common.exceptions import WebDriverException, TimeoutException
 
+from siad_artifacts import ArtifactWriter
+from siad_browser_pool import default_chrome_options, default_chrome_service
+from siad_logging import set_log_context, set_log_step, setup_async_logging
+from siad_scheduling import MakespanReport, UnitDurationHistory, lpt_order
+from siad_selectors import SelectorCompiler, SelectorStaleError
+
+DEFAULT_EXCEL_PATH = 'C:/Users/p0134255/Documents/Rogério/Backup/Tj/Projetos/Phyton/Automação-SIAD/UNIDADES_DIVIDIDAS.xlsx'
+UNAUTHORIZED_FILE = 'C:/Users/p0134255/Documents/Rogério/Backup/Tj/Projetos/Phyton/Automação-SIAD/unidades_sem_acesso.xlsx'
+_ROW_STAMP_RE = re.compile(r'\d{2}/\d{2}/\d{4}(?:\s+\d{2}:\d{2}(?::\d{2})?)?')
+# sessões em threads gravam no mesmo xlsx: leitura + reescrita precisam ser atômicas
+_UNAUTHORIZED_LOCK = threading.Lock()
+
+# Credenciais - substituir por mecanismo seguro
+DEFAULT_USUARIO = 'x0159191'
+DEFAULT_SENHA = 'jl1542'
+
+# Relatórios solicitados a cada seleção de unidade (todos antes de trocar de unidade).
+# Cada job referencia seletores pelo nome: primeiro em 'selectors' do próprio job,
+# depois em SIADAutomation.XPATHS; qualquer outro valor é tratado como XPath literal.
+# Valores de 'fields' aceitam o placeholder {unit_code}.
+# Pode ser substituído por um arquivo JSON com a mesma estrutura (--report-jobs).
+DEFAULT_REPORT_JOBS = [
+    {
+        'name': 'inventario_patrimonios',
+        'selectors': {
+            'tela_pronta': "//span[normalize-space(text())='Unidade emitente:']",
+            'dialogo_confirmacao': "//div[contains(@class, 'z-messagebox')]",
+            'linhas_listagem': "//tr[contains(@class, 'z-row') or contains(@class, 'z-listitem')]",
+            'links_download': "//tr[contains(@class, 'z-row') or contains(@class, 'z-listitem')]//a[@href]",
+        },
+        'menu': ['menu_principal_icon', 'menu_item_relatorios', 'menu_item_relatorios', 'menu_item_inventario'],
+        'wait_for': 'tela_pronta',
+        'open': ['btn_pesquisar', 'relatorio_link'],
+        'fields': [{'selector': 'input_unidade_tarefa', 'value': '{unit_code}'}],
+        'submit': ['btn_solicitar_geracao', 'btn_ok'],
+        # opcionais: texto do diálogo antes do último clique de 'submit' e
+        # listagem de relatórios (cliques a partir da tela + seletor das linhas)
+        'confirmation': 'dialogo_confirmacao',
+        'listing': ['btn_pesquisar'],
+        'listing_rows': 'linhas_listagem',
+        'download_links': 'links_download',
+    },
+]
+
+# Macro executada dentro da página (execute_async_script) para uma sequência de passos.
+# arguments[0] = lista de {kind: 'click'|'wait'|'fill'|'text', name, xpath, value?},
+# arguments[1] = timeout por passo (ms). Entre passos espera o ZK terminar as
+# requisições AU (zAu.processing()). Retorna {ok, failed_at, steps: [{name, kind, ok, ms, error, text}]}.
+MACRO_JS = r"""
+var steps = arguments[0], stepTimeout = arguments[1], done = arguments[arguments.length - 1];
+var out = {ok: true, failed_at: null, steps: []};
+function find(xpath) {
+  return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function visible(el) { return el && (el.offsetWidth || el.offsetHeight || el.getClientRects().length); }
+function zkIdle() { return !(window.zAu && zAu.processing && zAu.processing()); }
+function setValue(el, value) {
+  el.focus();
+  el.value = value;
+  el.dispatchEvent(new Event('input', {bubbles: true}));
+  el.dispatchEvent(new Event('change', {bubbles: true}));
+  var w = (window.zk && zk.Widget) ? zk.Widget.$(el) : null;
+  if (w && w.updateChange_) { w.updateChange_(); }
+  el.dispatchEvent(new Event('blur'));
+}
+function run(i) {
+  if (i >= steps.length) { done(out); return; }
+  var step = steps[i], start = performance.now();
+  (function poll() {
+    var el = find(step.xpath);
+    var ready = el && visible(el) && zkIdle();
+    if (!ready) {
+      if (performance.now() - start > stepTimeout) {
+        out.ok = false; out.failed_at = i;
+        out.steps.push({name: step.name, kind: step.kind, ok: false, ms: performance.now() - start, error: el ? 'not ready' : 'not found'});
+        done(out); return;
+      }
+      setTimeout(poll, 50); return;
+    }
+    var rec = {name: step.name, kind: step.kind, ok: true, ms: 0, error: null};
+    try {
+      if (step.kind === 'click') { el.scrollIntoView({block: 'center'}); el.click(); }
+      else if (step.kind === 'fill') {
+        setValue(el, step.value);
+        if (String(el.value).trim() !== String(step.value).trim()) { throw new Error('value mismatch: ' + el.value); }
+      }
+      else if (step.kind === 'text') { rec.text = (el.innerText || '').trim(); }
+    } catch (e) {
+      rec.ok = false; rec.error = String(e); out.ok = false; out.failed_at = i;
+    }
+    rec.ms = performance.now() - start;
+    out.steps.push(rec);
+    if (!rec.ok) { done(out); return; }
+    setTimeout(function () { run(i + 1); }, 0);
+  })();
+}
+run(0);
+"""
+
+# Preenchimento de campos sem clipboard: commit do valor para o widget ZK
+# (change + updateChange_ faz o servidor receber o onChange sem precisar de blur)
+_JS_FOCUS_SELECT = "arguments[0].focus(); if (arguments[0].select) { arguments[0].select(); }"
+_JS_ZK_COMMIT = (
+    "var el = arguments[0]; el.dispatchEvent(new Event('change', {bubbles: true}));"
+    "var w = (window.zk && zk.Widget) ? zk.Widget.$(el) : null; if (w && w.updateChange_) { w.updateChange_(); }"
+    "return el.value;"
+)
+_JS_ZK_SET_VALUE = (
+    "var el = arguments[0]; el.focus(); el.value = arguments[1];"
+    "el.dispatchEvent(new Event('input', {bubbles: true}));" + _JS_ZK_COMMIT
+)
+
+INPUT_MODES = ('insert_text', 'js', 'clipboard')
+
+
 # Exceção que marca erros fatais que devem encerrar execução
 class AutomationFatalError(Exception):
     pass
 
+
+def configure_logging(log_file: str = 'siad_automation.log'):
+    # arquivos por execução (JSONL + texto) gravados em background; no-op se já configurado
+    setup_async_logging(log_file)
+
+
+def append_unauthorized_units(unit_codes: List[str], path: str = UNAUTHORIZED_FILE):
+    """Records several units without access in one write (same columns as SIADAutomation.write_unauthorized_unit)."""
+    if not unit_codes:
+        return
+    now = pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')
+    new_rows = pd.DataFrame({
+        'Unidade': list(unit_codes),
+        'Data_Registro': [now] * len(unit_codes),
+        'Motivo': ['NAO EXISTE PERFIL AUTORIZADO'] * len(unit_codes),
+    })
+    with _UNAUTHORIZED_LOCK:
+        try:
+            df = pd.read_excel(path, engine='openpyxl')
+        except FileNotFoundError:
+            df = pd.DataFrame(columns=['Unidade', 'Data_Registro', 'Motivo'])
+        pd.concat([df, new_rows], ignore_index=True).to_excel(path, index=False, engine='openpyxl')
+    logging.getLogger(__name__).warning("%s unidades sem acesso registradas em %s", len(unit_codes), path)
+
+
+def load_unauthorized_units(path: str = UNAUTHORIZED_FILE) -> dict:
+    """Unit code -> most recent registration time found in unidades_sem_acesso.xlsx."""
+    try:
+        df = pd.read_excel(path, engine='openpyxl', dtype=str)
+    except FileNotFoundError:
+        return {}
+    df = df.dropna(subset=['Unidade'])
+    registered = pd.to_datetime(df['Data_Registro'], errors='coerce')
+    latest = {}
+    for code, when in zip(df['Unidade'].str.strip(), registered):
+        if code not in latest or (pd.notna(when) and (pd.isna(latest[code]) or when > latest[code])):
+            latest[code] = when
+    return latest
+
+
+def filter_known_unauthorized(unit_codes: List[str], recheck_days: float = 30.0,
+                              path: str = UNAUTHORIZED_FILE) -> List[str]:
+    """
+    Drops units already recorded as 'NAO EXISTE PERFIL AUTORIZADO' in previous runs.
+    Records older than recheck_days are retried (the profile may have been granted since).
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        known = load_unauthorized_units(path)
+    except Exception as e:
+        logger.warning("Não foi possível ler unidades sem acesso (%s); pré-verificação ignorada.", e)
+        return list(unit_codes)
+    cutoff = pd.Timestamp.now() - pd.Timedelta(days=recheck_days)
+    kept, skipped = [], []
+    for code in unit_codes:
+        when = known.get(str(code).strip())
+        if when is not None and pd.notna(when) and when >= cutoff:
+            skipped.append(code)
+        else:
+            kept.append(code)
+    if skipped:
+        logger.info("Pré-verificação: %s unidades sem acesso conhecidas puladas (rechecagem após %g dias).",
+                    len(skipped), recheck_days)
+    return kept
+
+
+def load_unit_codes(excel_path: str = DEFAULT_EXCEL_PATH) -> List[str]:
+    df = pd.read_excel(excel_path, sheet_name=0, header=0, dtype=str)
+    return df.iloc[:, 0].dropna().unique().tolist()
+
+
 class SIADAutomation:
     def __init__(self,
-                 excel_path: str = 'C:/Users/p0134255/Documents/Rogério/Backup/Tj/Projetos/Phyton/Automação-SIAD/UNIDADES_DIVIDIDAS.xlsx',
-                 log_file: str = 'siad_automation.log'):
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            filename=log_file,
-            filemode='w'
-        )
+                 excel_path: str = DEFAULT_EXCEL_PATH,
+                 log_file: str = 'siad_automation.log',
+                 health_check_every: int = 25,
+                 max_heap_mb: float = 1024.0,
+                 max_dom_nodes: int = 120000,
+                 recycle_mode: str = 'restart',
+                 report_jobs=None,
+                 browser_pool=None,
+                 capture_network: bool = False):
+        configure_logging(log_file)
         self.logger = logging.getLogger(__name__)
 
-        chrome_options = Options()
-        # chrome_options.add_argument("--headless")  # descomente se desejar rodar sem UI
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_experimental_option("prefs", {"credentials_enable_service": False, "profile.password_manager_enabled": False})
-
-        try:
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-        except Exception as e:
-            self.logger.error(f"WebDriver initialization failed: {e}")
-            raise
+        self.driver = None
+        # SharedChrome: sessão em um contexto isolado de um Chrome compartilhado; None = Chrome próprio
+        self.browser_pool = browser_pool
+        # log "performance" do Chrome ligado, para gravar o tráfego (siad_protocol.har_from_driver)
+        # e medir o tempo de rede por passo (siad_network_timing)
+        self.capture_network = capture_network
+        # siad_command_trace.CommandRecorder: grava cada comando WebDriver (reanexado após reciclagem)
+        self.command_recorder = None
+        # siad_network_timing.NetworkTimeline: servidor/transferência/cliente de cada passo
+        self.network_timeline = None
+        self._start_driver()
+        # screenshots/DOM de erro gravados em background, com limite de taxa e de tamanho
+        self.artifacts = ArtifactWriter()
 
         self.TIMEOUT = 30
         self.excel_path = excel_path
         self.base_url = 'https://www.siad.mg.gov.br/jasi-frontend/'
 
-        # Credenciais - substituir por mecanismo seguro
-        self.usuario = 'x0159191'
-        self.senha = 'jl1542'
+        self.usuario = DEFAULT_USUARIO
+        self.senha = DEFAULT_SENHA
 
         self.XPATHS = {
             'input_usuario': "//input[@placeholder='Usuário']",
@@ -98,8 +289,204 @@ class SIADAutomation:
             'btn_alterar': "//button[normalize-space(text())='Alterar']",
             'error_unidade_nao_autorizada': "//span[contains(translate(., 'abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'), 'NAO EXISTE PERFIL AUTORIZADO')]",
             'btn_sair_modal_erro': "//button[normalize-space(text())='SAIR']",
+            'opcoes_unidade': "//li[contains(@class, 'z-comboitem')] | //div[contains(@class, 'z-bandpopup')]//tr[contains(@class, 'z-listitem')]",
         }
 
+        # Compilação/validação dos seletores na primeira página carregada (siad_selectors);
+        # espera longa falha após fail_fast_s se o ZK estiver ocioso e o elemento não existir
+        self.compile_selectors = True
+        self.fail_fast_s = 5.0
+        self.selectors: Optional[SelectorCompiler] = None
+        # Timeouts por passo a partir da latência observada (siad_timeouts.AdaptiveTimeouts);
+        # None = TIMEOUT/valor passado pelo chamador, como antes
+        self.timeouts = None
+        # Troca de unidade: siad_strategy.StrategySelector(['direct', 'menu']) escolhe o fluxo
+        # mais rápido com exploração; None = sempre 'direct' (modal, com fallback pelo menu)
+        self.switch_selector = None
+        self._unauthorized_unit: Optional[str] = None
+
+        # Modo macro: sequência de solicitação do relatório roda dentro da página (MACRO_JS),
+        # com o fluxo passo a passo como fallback
+        self.use_macro = False
+
+        # Preenchimento de campos: 'insert_text' (CDP Input.insertText), 'js' (setter na página)
+        # ou 'clipboard' (Ctrl+V via pyperclip, compartilhado pelo processo inteiro)
+        self.input_mode = 'insert_text'
+
+        # Pré-verificação: lê as unidades acessíveis no modal de seleção logo após o login
+        self.preflight_listing = False
+        # listagem com menos unidades que isto é tratada como incompleta (dropdown paginado/não carregou)
+        self.preflight_min_listed = 5
+
+        # report_jobs: lista de jobs, caminho de um JSON ou None (DEFAULT_REPORT_JOBS)
+        self.report_jobs = self._load_report_jobs(report_jobs)
+
+        # Reciclagem preventiva do navegador (memória / tamanho do DOM)
+        # health_check_every=0 desativa a amostragem; recycle_mode: 'restart' | 'reload'
+        self.health_check_every = health_check_every
+        self.max_heap_mb = max_heap_mb
+        self.max_dom_nodes = max_dom_nodes
+        self.recycle_mode = recycle_mode
+        self.unit_durations = []  # segundos por unidade, na ordem processada
+        self.recycle_events = []  # índices (em unit_durations) onde houve reciclagem
+        self._trend_window = 10
+
+        # Observadores de latência por passo: callable(unit_code, step, duration_s, timed_out)
+        # (usado pelo governador de concorrência em siad_concurrency.py)
+        self.step_listeners: List[Callable[[Optional[str], str, float, bool], None]] = []
+        self.current_unit: Optional[str] = None
+        # Resultado por unidade: callable(unit_code, outcome, duration_s); outcome em 'ok' | 'skipped' | 'failed'
+        self.unit_listeners: List[Callable[[str, str, float], None]] = []
+        # Chamados imediatamente antes de 'Solicitar geração': callable(unit_code) -> bool.
+        # Qualquer False cancela a solicitação (ex.: lease perdido na fila compartilhada).
+        self.submit_guards: List[Callable[[str], bool]] = []
+        # Na fronteira entre unidades, antes de começar cada uma: callable(unit_code); pode bloquear
+        # (ritmo/pausa conforme a latência, siad_run_scheduler.LatencyPacer)
+        self.unit_gates: List[Callable[[str], None]] = []
+        # Após cada solicitação: callable(unit_code, job_name, dialog_text)
+        self.submission_listeners: List[Callable[[str, str, str], None]] = []
+        # Conferência periódica da listagem de relatórios (siad_report_tracker.ReportTracker)
+        self.report_tracker = None
+        self.track_every = 50
+        # Download em lote dos relatórios gerados ao final de process_units (siad_downloader)
+        self.download_dir: Optional[str] = None
+        self.download_connections = 4
+
+    # -------------------------
+    # Browser lifecycle
+    # -------------------------
+    def _start_driver(self):
+        try:
+            if self.browser_pool is not None:
+                # contexto isolado dentro do Chrome compartilhado (siad_browser_pool.SharedChrome)
+                self.driver = self.browser_pool.new_driver()
+            else:
+                options = default_chrome_options()
+                if self.capture_network:
+                    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+                    # só eventos Network.*: os de Page/Timeline só aumentam o log drenado
+                    options.add_experimental_option('perfLoggingPrefs', {'enableNetwork': True, 'enablePage': False})
+                self.driver = webdriver.Chrome(service=default_chrome_service(), options=options)
+        except Exception as e:
+            self.logger.error("WebDriver initialization failed: %s", e)
+            raise
+        if getattr(self, 'selectors', None) is not None:
+            self.selectors.set_driver(self.driver)
+        if self.command_recorder is not None:
+            self.command_recorder.attach(self.driver)
+        if getattr(self, 'network_timeline', None) is not None:
+            self.network_timeline.reset()
+
+    def _quit_driver(self):
+        try:
+            if self.browser_pool is not None:
+                self.browser_pool.release(self.driver)
+            else:
+                self.driver.quit()
+        except Exception:
+            pass
+
+    def sample_browser_health(self) -> dict:
+        """
+        Samples renderer memory and DOM size. Uses CDP Performance.getMetrics when
+        available (JSHeapUsedSize, Nodes, JSEventListeners) and falls back to
+        performance.memory / document.getElementsByTagName('*') otherwise.
+        """
+        health = {'heap_mb': None, 'dom_nodes': None, 'listeners': None}
+        try:
+            self.driver.execute_cdp_cmd('Performance.enable', {})
+            metrics = self.driver.execute_cdp_cmd('Performance.getMetrics', {})
+            values = {m['name']: m['value'] for m in metrics.get('metrics', [])}
+            if 'JSHeapUsedSize' in values:
+                health['heap_mb'] = values['JSHeapUsedSize'] / (1024 * 1024)
+            if 'Nodes' in values:
+                health['dom_nodes'] = int(values['Nodes'])
+            if 'JSEventListeners' in values:
+                health['listeners'] = int(values['JSEventListeners'])
+        except Exception as e:
+            self.logger.debug("CDP Performance.getMetrics indisponível: %s", e)
+
+        if health['heap_mb'] is None:
+            used = self._safe_js("return (window.performance && performance.memory) ? performance.memory.usedJSHeapSize : null;")
+            if used:
+                health['heap_mb'] = used / (1024 * 1024)
+        if health['dom_nodes'] is None:
+            health['dom_nodes'] = self._safe_js("return document.getElementsByTagName('*').length;")
+        return health
+
+    def _health_exceeded(self, health: dict) -> bool:
+        heap = health.get('heap_mb')
+        nodes = health.get('dom_nodes')
+        if self.max_heap_mb and heap is not None and heap >= self.max_heap_mb:
+            return True
+        if self.max_dom_nodes and nodes is not None and nodes >= self.max_dom_nodes:
+            return True
+        return False
+
+    def _mean_duration(self, durations) -> Optional[float]:
+        return sum(durations) / len(durations) if durations else None
+
+    def recycle_browser(self) -> bool:
+        """
+        Restarts the browser (recycle_mode='restart') or reloads the ZK desktop
+        (recycle_mode='reload'). Must only be called at a unit boundary.
+        Returns True when the next unit must go through select_unit_initial
+        (fresh login shows the initial unit modal).
+        """
+        before = self._mean_duration(self.unit_durations[-self._trend_window:])
+        self.recycle_events.append(len(self.unit_durations))
+        before_txt = f"{before:.2f}s" if before is not None else "n/d"
+        self.logger.warning("Reciclando navegador (modo=%s); média por unidade antes: %s", self.recycle_mode, before_txt)
+
+        if self.recycle_mode == 'reload':
+            try:
+                self.driver.get(self.base_url)
+                time.sleep(2)
+                # sessão expirada -> tela de login de novo
+                if self.driver.find_elements(By.XPATH, self.XPATHS['input_usuario']):
+                    self._fill_field_guaranteed('input_usuario', self.usuario, allow_clipboard=True)
+                    self._fill_field_guaranteed('input_senha', self.senha, allow_clipboard=True)
+                    self._click('btn_entrar')
+                    time.sleep(2)
+                    return True
+                return False
+            except Exception as e:
+                self.logger.warning("Reload do desktop falhou (%s); reiniciando navegador.", e)
+
+        self._quit_driver()
+        self._start_driver()
+        self.login()
+        return True
+
+    def _maybe_recycle_browser(self, processed: int) -> bool:
+        """Checks the watermarks every health_check_every units. Returns recycle_browser() result or False."""
+        if not self.health_check_every or processed == 0 or processed % self.health_check_every != 0:
+            return False
+        health = self.sample_browser_health()
+        self.logger.info(
+            "Saúde do navegador após %s unidades: heap=%s MB, nós DOM=%s, listeners=%s",
+            processed, health['heap_mb'], health['dom_nodes'], health['listeners']
+        )
+        if not self._health_exceeded(health):
+            return False
+        return self.recycle_browser()
+
+    def _log_recycle_trend(self):
+        """Logs per-unit latency before vs. after the last recycle once enough units ran after it."""
+        if not self.recycle_events:
+            return
+        idx = self.recycle_events[-1]
+        after = self.unit_durations[idx:]
+        if len(after) != self._trend_window:
+            return
+        before = self.unit_durations[max(0, idx - self._trend_window):idx]
+        mb, ma = self._mean_duration(before), self._mean_duration(after)
+        if mb is not None and ma is not None:
+            self.logger.info(
+                "Tendência de latência por unidade: antes da reciclagem %.2fs, depois %.2fs (%+.1f%%)",
+                mb, ma, (ma - mb) / mb * 100 if mb else 0
+            )
+
     # -------------------------
     # Helpers
     # -------------------------
@@ -112,27 +499,101 @@ class SIADAutomation:
             self.logger.debug("Texto copiado para clipboard.")
             return True
         except Exception as e:
-            self.logger.warning(f"Falha ao copiar para clipboard: {e}")
+            self.logger.warning("Falha ao copiar para clipboard: %s", e)
             return False
 
+    def _notify_step(self, step: str, duration: float, timed_out: bool = False):
+        self.logger.info("Passo %s: %.3fs%s", step, duration, " (timeout)" if timed_out else "",
+                         extra={'step': step, 'duration_s': round(duration, 3)})
+        if self.network_timeline is not None:
+            self.network_timeline.on_step(self.driver, self.current_unit, step, duration)
+        for listener in self.step_listeners:
+            try:
+                listener(self.current_unit, step, duration, timed_out)
+            except Exception as e:
+                self.logger.debug("Step listener falhou: %s", e)
+
+    def _notify_unit(self, unit_code: str, outcome: str, duration: float):
+        for listener in self.unit_listeners:
+            try:
+                listener(unit_code, outcome, duration)
+            except Exception as e:
+                self.logger.debug("Unit listener falhou: %s", e)
+
+    @contextmanager
+    def _timed_step(self, step: str):
+        """Times the enclosed block and reports it to step_listeners (TimeoutException counts as timeout)."""
+        set_log_step(step)
+        start = time.monotonic()
+        timed_out = False
+        try:
+            yield
+        except TimeoutException:
+            timed_out = True
+            raise
+        finally:
+            self._notify_step(step, time.monotonic() - start, timed_out)
+
     def _safe_js(self, script: str, *args):
         try:
             return self.driver.execute_script(script, *args)
         except Exception as e:
-            self.logger.debug(f"JS execution failed: {e}")
+            self.logger.debug("JS execution failed: %s", e)
             return None
 
+    def _locate(self, key_or_xpath: str):
+        if self.selectors is not None:
+            return self.selectors.locator(key_or_xpath)
+        return By.XPATH, self.XPATHS.get(key_or_xpath, key_or_xpath)
+
+    def _until(self, condition, key_or_xpath: str, timeout: float):
+        """
+        WebDriverWait on condition(locator) using the compiled locator for key_or_xpath.
+        Raises SelectorStaleError (a TimeoutException) early when the selector looks broken.
+        """
+        locator = self._locate(key_or_xpath)
+        expected = condition(locator)
+        requested = timeout
+        if self.timeouts is not None:
+            timeout = self.timeouts.timeout_for(key_or_xpath, requested)
+        start = time.monotonic()
+        try:
+            if self.selectors is None or timeout <= self.selectors.fail_fast_s:
+                el = WebDriverWait(self.driver, timeout).until(expected)
+            else:
+                stale = self.selectors.stale_probe(key_or_xpath)
+
+                def check(driver):
+                    found = expected(driver)
+                    if not found and stale():
+                        raise SelectorStaleError(f"Seletor '{key_or_xpath}' ausente com o ZK ocioso")
+                    return found
+
+                el = WebDriverWait(self.driver, timeout).until(check)
+        except SelectorStaleError:
+            raise
+        except TimeoutException:
+            if self.timeouts is not None:
+                self.timeouts.record_timeout(key_or_xpath, timeout, requested)
+            raise
+        if self.timeouts is not None:
+            self.timeouts.record(key_or_xpath, time.monotonic() - start)
+        if self.selectors is not None and key_or_xpath in self.XPATHS:
+            self.selectors.verify(key_or_xpath)
+        return el
+
     def _wait_visible(self, xpath: str, timeout: Optional[int] = None):
-        timeout = timeout or self.TIMEOUT
-        return WebDriverWait(self.driver, timeout).until(EC.visibility_of_element_located((By.XPATH, xpath)))
+        return self._until(EC.visibility_of_element_located, xpath, timeout or self.TIMEOUT)
 
     def _wait_clickable(self, xpath: str, timeout: Optional[int] = None):
-        timeout = timeout or self.TIMEOUT
-        return WebDriverWait(self.driver, timeout).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+        return self._until(EC.element_to_be_clickable, xpath, timeout or self.TIMEOUT)
+
+    def _wait_present(self, xpath: str, timeout: Optional[int] = None):
+        return self._until(EC.presence_of_element_located, xpath, timeout or self.TIMEOUT)
 
     def _screenshot(self, name: str):
         try:
-            self.driver.save_screenshot(name)
+            self.artifacts.capture(self.driver, self.current_unit, os.path.splitext(name)[0])
         except Exception:
             pass
 
@@ -140,9 +601,11 @@ class SIADAutomation:
     def _click(self, xpath_key: str, js_fallback: bool = True, raise_on_fail: bool = True) -> bool:
         xpath = self.XPATHS.get(xpath_key, xpath_key)
         last_exc = None
+        set_log_step(xpath_key)
+        start = time.monotonic()
         for attempt in range(1, 3):  # 2 attempts
             try:
-                el = WebDriverWait(self.driver, 8).until(EC.element_to_be_clickable((By.XPATH, xpath)))
+                el = self._wait_clickable(xpath_key, timeout=8)
                 try:
                     # ensure visible
                     self.driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", el)
@@ -158,11 +621,12 @@ class SIADAutomation:
                             raise
                     else:
                         raise
-                self.logger.info(f"Clicou em {xpath_key}")
+                self.logger.info("Clicou em %s", xpath_key)
+                self._notify_step(xpath_key, time.monotonic() - start)
                 return True
             except Exception as e:
                 last_exc = e
-                self.logger.debug(f"Attempt {attempt} to click {xpath_key} failed: {e}")
+                self.logger.debug("Attempt %s to click %s failed: %s", attempt, xpath_key, e)
                 # try remove overlays and touch body before retry
                 try:
                     self._safe_js("document.querySelectorAll('.z-modal, .z-shadow, .overlay, .ui-widget-overlay').forEach(function(el){el.parentNode && el.parentNode.removeChild(el);});")
@@ -171,77 +635,116 @@ class SIADAutomation:
                     pass
                 time.sleep(0.4)
         # after retries
+        if self.selectors is not None:
+            self.selectors.record_failure(xpath_key)
+        self._notify_step(xpath_key, time.monotonic() - start, isinstance(last_exc, TimeoutException))
         self._screenshot(f'erro_click_{xpath_key}.png')
-        self.logger.error(f"Falha ao clicar em {xpath_key}: {last_exc}")
+        self.logger.error("Falha ao clicar em %s: %s", xpath_key, last_exc)
         if raise_on_fail:
             raise AutomationFatalError(f"Erro ao clicar em {xpath_key}: {last_exc}")
         return False
 
-    # Preenche campo com validação (Ctrl+V, send_keys, JS set)
-    def _fill_field_guaranteed(self, xpath_key: str, text: str, allow_clipboard: bool = True):
-        xpath = self.XPATHS.get(xpath_key, xpath_key)
-        if allow_clipboard:
-            did_clip = self._set_clipboard(text)
-        else:
-            did_clip = False
+    def _value_matches(self, el, text: str) -> bool:
+        val = self._safe_js("return arguments[0].value", el)
+        return str(val).strip() == str(text).strip()
 
-        el = self._wait_visible(xpath, timeout=10)
+    def _input_insert_text(self, el, text: str) -> bool:
+        # insertText vai para o elemento focado da aba deste driver: nada passa pelo SO
+        self.driver.execute_script(_JS_FOCUS_SELECT, el)
+        self.driver.execute_cdp_cmd('Input.insertText', {'text': str(text)})
+        self._safe_js(_JS_ZK_COMMIT, el)
+        return self._value_matches(el, text)
 
-        # Try Ctrl+V
-        if did_clip:
-            try:
-                try:
-                    el.click()
-                except Exception:
-                    pass
-                el.send_keys(Keys.CONTROL, 'v')
-                time.sleep(0.25)
-                self._safe_js("arguments[0].dispatchEvent(new Event('input')); arguments[0].dispatchEvent(new Event('change'));", el)
-                val = self._safe_js("return arguments[0].value", el)
-                if str(val).strip() == str(text).strip():
-                    self.logger.info(f"Colado (Ctrl+V) '{text}' em {xpath_key}")
-                    return
-                else:
-                    self.logger.debug(f"Valor após Ctrl+V difere: '{val}' (esperado '{text}').")
-            except Exception as e:
-                self.logger.debug(f"Ctrl+V falhou: {e}")
+    def _input_js(self, el, text: str) -> bool:
+        self.driver.execute_script(_JS_ZK_SET_VALUE, el, str(text))
+        return self._value_matches(el, text)
 
-        # Try send_keys
+    def _input_clipboard(self, el, text: str) -> bool:
+        if not self._set_clipboard(text):
+            return False
         try:
-            try:
-                el.clear()
-            except Exception:
-                pass
             el.click()
-            el.send_keys(text)
-            time.sleep(0.2)
-            self._safe_js("arguments[0].dispatchEvent(new Event('input')); arguments[0].dispatchEvent(new Event('change'));", el)
-            val = self._safe_js("return arguments[0].value", el)
-            if str(val).strip() == str(text).strip():
-                self.logger.info(f"Digitado '{text}' em {xpath_key}")
-                return
-            else:
-                self.logger.debug(f"Valor após send_keys difere: '{val}' (esperado '{text}').")
-        except Exception as e:
-            self.logger.debug(f"send_keys falhou: {e}")
+        except Exception:
+            pass
+        el.send_keys(Keys.CONTROL, 'v')
+        time.sleep(0.25)
+        self._safe_js("arguments[0].dispatchEvent(new Event('input')); arguments[0].dispatchEvent(new Event('change'));", el)
+        return self._value_matches(el, text)
 
-        # Try JS set
+    def _input_send_keys(self, el, text: str) -> bool:
         try:
-            safe_text = str(text).replace("'", "\\'")
-            self._safe_js("arguments[0].value = arguments[1]; arguments[0].dispatchEvent(new Event('input')); arguments[0].dispatchEvent(new Event('change'));", el, safe_text)
-            time.sleep(0.15)
-            val = self._safe_js("return arguments[0].value", el)
-            if str(val).strip() == str(text).strip():
-                self.logger.info(f"Set via JS '{text}' em {xpath_key}")
-                return
-            else:
-                self.logger.debug(f"Valor após JS set difere: '{val}' (esperado '{text}').")
-        except Exception as e:
-            self.logger.debug(f"JS set falhou: {e}")
+            el.clear()
+        except Exception:
+            pass
+        el.click()
+        el.send_keys(text)
+        time.sleep(0.2)
+        self._safe_js("arguments[0].dispatchEvent(new Event('input')); arguments[0].dispatchEvent(new Event('change'));", el)
+        return self._value_matches(el, text)
+
+    def _input_strategy_map(self) -> dict:
+        return {
+            'insert_text': self._input_insert_text,
+            'js': self._input_js,
+            'clipboard': self._input_clipboard,
+            'send_keys': self._input_send_keys,
+        }
+
+    def _input_strategies(self, allow_clipboard: bool):
+        strategies = self._input_strategy_map()
+        if self.input_mode == 'clipboard':
+            order = ['clipboard', 'send_keys', 'js'] if allow_clipboard else ['send_keys', 'js']
+        elif self.input_mode == 'js':
+            order = ['js', 'insert_text', 'send_keys']
+        else:
+            order = ['insert_text', 'js', 'send_keys']
+        return [(name, strategies[name]) for name in order]
+
+    # Preenche campo com validação (insertText / JS set / send_keys; Ctrl+V só com input_mode='clipboard')
+    def _fill_field_guaranteed(self, xpath_key: str, text: str, allow_clipboard: bool = True):
+        with self._timed_step(f'wait_{xpath_key}'):
+            el = self._wait_visible(xpath_key, timeout=10)
+
+        for name, strategy in self._input_strategies(allow_clipboard):
+            try:
+                if strategy(el, text):
+                    self.logger.info("Preenchido (%s) '%s' em %s", name, text, xpath_key)
+                    return
+                self.logger.debug("Valor após %s difere (esperado '%s').", name, text)
+            except Exception as e:
+                self.logger.debug("%s falhou: %s", name, e)
 
         self._screenshot(f'erro_preencher_{xpath_key}.png')
         raise AutomationFatalError(f"Não foi possível preencher o campo {xpath_key} com '{text}'")
 
+    def benchmark_input_modes(self, xpath_key: str = 'input_usuario', rounds: int = 20, text: str = '1234567') -> dict:
+        """
+        Fills the same field `rounds` times with each strategy and logs median/p95
+        latency and success rate. Needs a page where xpath_key is visible (e.g. login).
+        """
+        el = self._wait_visible(xpath_key, timeout=self.TIMEOUT)
+        strategies = self._input_strategy_map()
+        results = {}
+        for name, strategy in strategies.items():
+            times, ok = [], 0
+            for _ in range(rounds):
+                self._safe_js("arguments[0].value=''; arguments[0].dispatchEvent(new Event('input'));", el)
+                start = time.perf_counter()
+                try:
+                    ok += bool(strategy(el, text))
+                except Exception as e:
+                    self.logger.debug("Benchmark %s falhou: %s", name, e)
+                times.append((time.perf_counter() - start) * 1000)
+            times.sort()
+            results[name] = {
+                'median_ms': times[len(times) // 2],
+                'p95_ms': times[min(len(times) - 1, int(len(times) * 0.95))],
+                'success': ok / rounds,
+            }
+            self.logger.info("Benchmark de preenchimento %-11s mediana %7.1f ms  p95 %7.1f ms  sucesso %3.0f%%",
+                             name, results[name]['median_ms'], results[name]['p95_ms'], results[name]['success'] * 100)
+        return results
+
     # -------------------------
     # NEW: attempt direct fill in currently-open modal (preferential flow)
     # -------------------------
@@ -253,14 +756,12 @@ class SIADAutomation:
           - False if the field wasn't present / couldn't be used (caller should fallback to menu)
         """
         try:
-            el = WebDriverWait(self.driver, 2).until(EC.visibility_of_element_located((By.XPATH, self.XPATHS['input_digite_unidade'])))
+            el = self._wait_visible('input_digite_unidade', timeout=2)
         except Exception:
             return False  # field not present -> fallback required
 
         self.logger.info("Campo modal 'Digite a Unidade' está presente: tentando colar diretamente sem abrir menu.")
         try:
-            # prepare clipboard and fill
-            self._set_clipboard(unit_code)
             self._fill_field_guaranteed('input_digite_unidade', unit_code, allow_clipboard=True)
 
             # try to trigger Selecionar (JS click more robust)
@@ -284,7 +785,7 @@ class SIADAutomation:
 
             return True
         except Exception as e:
-            self.logger.debug(f"Tentativa direta no modal falhou: {e}")
+            self.logger.debug("Tentativa direta no modal falhou: %s", e)
             # do not raise here — fallback will handle via opening menu
             return False
 
@@ -294,17 +795,80 @@ class SIADAutomation:
     def login(self):
         self.logger.info("Iniciando login")
         self.driver.get(self.base_url)
+        if self.compile_selectors and self.selectors is None:
+            self.selectors = SelectorCompiler(self.driver, self.XPATHS, fail_fast_s=self.fail_fast_s)
+            try:
+                self.selectors.compile_all()
+            except ValueError as e:
+                raise AutomationFatalError(str(e))
         self._fill_field_guaranteed('input_usuario', self.usuario, allow_clipboard=True)
         self._fill_field_guaranteed('input_senha', self.senha, allow_clipboard=True)
         self._click('btn_entrar')
         time.sleep(2)
 
+    def list_accessible_units(self) -> set:
+        """
+        Opens the dropdown of the 'Digite a Unidade' field once and reads every
+        option in a single JS call. Returns the set of unit codes the account can
+        select (empty set if the listing is not available).
+        """
+        try:
+            el = self._wait_visible('input_digite_unidade', timeout=5)
+            el.click()
+            el.send_keys(Keys.ARROW_DOWN)
+            time.sleep(1.0)
+            texts = self._safe_js(
+                "var r = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);"
+                "var out = []; for (var i = 0; i < r.snapshotLength; i++) { out.push(r.snapshotItem(i).innerText); } return out;",
+                self.XPATHS['opcoes_unidade'],
+            ) or []
+            el.send_keys(Keys.ESCAPE)
+            self._safe_js("arguments[0].value=''; arguments[0].dispatchEvent(new Event('input'));", el)
+        except Exception as e:
+            self.logger.info("Listagem de unidades acessíveis indisponível: %s", e)
+            return set()
+        codes = set()
+        for text in texts:
+            code = (text or '').strip().split(' ')[0].split('-')[0].strip()
+            if code.isdigit():
+                codes.add(code)
+        self.logger.info("Pré-verificação: %s unidades acessíveis listadas no modal.", len(codes))
+        return codes
+
+    def _filter_accessible(self, unit_codes: Iterable[str]) -> Iterable[str]:
+        accessible = self.list_accessible_units()
+        if len(accessible) < self.preflight_min_listed:
+            if accessible:
+                self.logger.info("Pré-verificação: só %s unidades listadas; lista tratada como incompleta, sem filtro.",
+                                 len(accessible))
+            return unit_codes
+        # o combobox do ZK renderiza as opções sob demanda (lista pode vir cortada em 20/50 linhas):
+        # ausência na listagem só confirma unidades já registradas sem acesso, nunca pula as demais
+        try:
+            known_unauthorized = set(load_unauthorized_units())
+        except Exception as e:
+            self.logger.warning("Não foi possível ler unidades sem acesso (%s); listagem não usada como filtro.", e)
+            return unit_codes
+        return self._skip_not_accessible(unit_codes, accessible, known_unauthorized)
+
+    def _skip_not_accessible(self, unit_codes: Iterable[str], accessible: set, known_unauthorized: set):
+        for code in unit_codes:
+            key = str(code).strip()
+            if key in accessible or key not in known_unauthorized:
+                yield code
+            else:
+                self.logger.info("Pré-verificação: unidade %s sem acesso registrado e fora da listagem; pulada.", code)
+                # fila/governador precisam ver a unidade como concluída (pulada); duração 0 = não processada,
+                # ignorada pelo histórico de durações
+                self._notify_unit(code, 'skipped', 0.0)
+
     def select_unit_initial(self, unit_code: str) -> bool:
         """
         Select unit on initial modal. Returns True if selected/processed.
         If unauthorized, records and returns False so caller can decide (skip).
         """
-        self.logger.info(f"Selecionando unidade inicial: {unit_code}")
+        self.logger.info("Selecionando unidade inicial: %s", unit_code)
+        self._unauthorized_unit = None
 
         # Prefer direct fill if modal input visible
         tried_direct = self.attempt_fill_in_current_modal(unit_code)
@@ -315,7 +879,6 @@ class SIADAutomation:
             return not self._is_last_unit_unauthorized(unit_code)
 
         # If direct attempt not possible, fallback to fill normally (shouldn't happen on initial, but safe)
-        self._set_clipboard(unit_code)
         self._fill_field_guaranteed('input_digite_unidade', unit_code, allow_clipboard=True)
         try:
             self._safe_js("document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue.click();", self.XPATHS['btn_selecionar'])
@@ -331,18 +894,40 @@ class SIADAutomation:
     def change_unit_and_loop(self, unit_code: str) -> bool:
         """
         Change unit for subsequent iterations.
-        First tries direct modal fill (if modal present). If not present, opens menu and uses 'Alterar Unidade'.
+        With switch_selector set, picks 'direct' or 'menu' (A/B with exploration) and
+        records duration and success; otherwise always 'direct'.
         Returns True if unit changed successfully, False if unit had no access and was recorded/cleaned (skip).
         """
-        self.logger.info(f"Iniciando alteração de unidade para: {unit_code}")
+        self.logger.info("Iniciando alteração de unidade para: %s", unit_code)
+        if self.switch_selector is None:
+            return self.switch_unit_direct(unit_code)
+
+        name = self.switch_selector.choose()
+        strategy = {'direct': self.switch_unit_direct, 'menu': self.switch_unit_menu}[name]
+        self._unauthorized_unit = None
+        start = time.monotonic()
+        ok = False
+        try:
+            changed = strategy(unit_code)
+            # sem acesso também é uma troca concluída: a estratégia funcionou
+            ok = changed or self._is_last_unit_unauthorized(unit_code)
+            return changed
+        finally:
+            duration = time.monotonic() - start
+            self.switch_selector.record(name, duration, ok)
+            self._notify_step(f'switch_{name}', duration)
 
-        # 1) attempt direct fill in current modal (preferred)
+    def switch_unit_direct(self, unit_code: str) -> bool:
+        """Direct fill in the current modal (if present), falling back to the menu flow."""
+        self._unauthorized_unit = None
         tried_direct = self.attempt_fill_in_current_modal(unit_code)
         if tried_direct:
             # direct attempt either selected unit or recorded unauthorized -> decide skip based on detection
             return not self._is_last_unit_unauthorized(unit_code)
+        return self.switch_unit_menu(unit_code)
 
-        # 2) fallback: open menu and use Alterar Unidade flow
+    def switch_unit_menu(self, unit_code: str) -> bool:
+        """User menu -> Alterar Unidade -> OK -> fill modal -> Alterar."""
         ok = self._click('menu_usuario_icon', raise_on_fail=False)
         if not ok:
             self.logger.warning("Não foi possível abrir o menu do usuário; pulando esta unidade para continuar execução.")
@@ -359,8 +944,7 @@ class SIADAutomation:
         except Exception:
             pass
 
-        # prepare clipboard and fill the modal input
-        self._set_clipboard(unit_code)
+        # fill the modal input
         self._fill_field_guaranteed('input_digite_unidade', unit_code, allow_clipboard=True)
 
         # click 'Alterar' - if this fails, treat as fatal (can't proceed reliably)
@@ -373,49 +957,212 @@ class SIADAutomation:
 
         # check unauthorized
         if self._detect_and_record_unauthorized_and_cleanup(unit_code):
-            self.logger.warning(f"Unidade {unit_code} sem acesso detectada. Registrada e pulada.")
+            self.logger.warning("Unidade %s sem acesso detectada. Registrada e pulada.", unit_code)
             return False
 
         return True
 
-    def generate_inventory_report(self, unit_code: str):
-        self.logger.info(f"Iniciando geração de relatório para unidade: {unit_code}")
-        self._click('menu_principal_icon')
-        self._click('menu_item_relatorios')
-        self._click('menu_item_relatorios')
-        self._click('menu_item_inventario')
+    def _allow_submit(self, unit_code: str) -> bool:
+        for guard in self.submit_guards:
+            try:
+                if not guard(unit_code):
+                    return False
+            except Exception as e:
+                self.logger.error("Verificação antes de solicitar geração falhou para %s: %s", unit_code, e)
+                return False
+        return True
+
+    # -------------------------
+    # Report jobs
+    # -------------------------
+    def _load_report_jobs(self, report_jobs) -> List[dict]:
+        if report_jobs is None:
+            jobs = DEFAULT_REPORT_JOBS
+        elif isinstance(report_jobs, str):
+            with open(report_jobs, 'r', encoding='utf-8') as f:
+                jobs = json.load(f)
+        else:
+            jobs = report_jobs
+
+        for job in jobs:
+            missing = [k for k in ('name', 'menu', 'open', 'fields', 'submit') if k not in job]
+            if missing:
+                raise ValueError(f"Job de relatório {job.get('name', '?')} sem as chaves: {missing}")
+            # seletores do job entram em XPATHS com prefixo, para _click/_fill continuarem usando chaves
+            for name, xpath in job.get('selectors', {}).items():
+                self.XPATHS[f"{job['name']}.{name}"] = xpath
+        return list(jobs)
+
+    def _job_key(self, job: dict, name: str) -> str:
+        if name in job.get('selectors', {}):
+            return f"{job['name']}.{name}"
+        return name
+
+    def _macro_step(self, job: dict, kind: str, name: str, value: Optional[str] = None) -> dict:
+        key = self._job_key(job, name)
+        step = {'kind': kind, 'name': key, 'xpath': self.XPATHS.get(key, key)}
+        if value is not None:
+            step['value'] = value
+        return step
+
+    def _run_macro(self, steps: List[dict]) -> dict:
+        self.driver.set_script_timeout(self.TIMEOUT * len(steps) + 5)
+        result = self.driver.execute_async_script(MACRO_JS, steps, self.TIMEOUT * 1000)
+        for rec in result.get('steps', []):
+            self._notify_step(f"macro_{rec['name']}", rec['ms'] / 1000.0, rec['error'] in ('not found', 'not ready'))
+        timing = ', '.join(f"{r['name']}={r['ms']:.0f}ms{'' if r['ok'] else ' (' + str(r['error']) + ')'}" for r in result.get('steps', []))
+        self.logger.info("Macro: ok=%s passos: %s", result.get('ok'), timing)
+        return result
+
+    def run_report_job_macro(self, unit_code: str, job: dict) -> Optional[bool]:
+        """
+        Runs the job as two in-page macros: (1) menu -> screen -> rows -> fields,
+        (2) submit buttons + confirmation text, with the submit guard checked
+        in Python between them. Returns None when the step-by-step path should
+        run instead (nothing was submitted yet).
+        """
+        prepare = [self._macro_step(job, 'click', name) for name in job['menu']]
+        if job.get('wait_for'):
+            prepare.append(self._macro_step(job, 'wait', job['wait_for']))
+        prepare += [self._macro_step(job, 'click', name) for name in job['open']]
+        prepare += [
+            self._macro_step(job, 'fill', field['selector'], str(field['value']).format(unit_code=unit_code))
+            for field in job['fields']
+        ]
+        try:
+            result = self._run_macro(prepare)
+        except Exception as e:
+            self.logger.warning("Macro de preparação falhou (%s); usando fluxo passo a passo.", e)
+            return None
+        if not result.get('ok'):
+            self.logger.warning("Macro parou no passo %s; usando fluxo passo a passo.", result.get('failed_at'))
+            self._safe_js("document.querySelectorAll('.z-modal, .z-shadow, .overlay, .ui-widget-overlay').forEach(function(el){el.parentNode && el.parentNode.removeChild(el);});")
+            return None
 
-        WebDriverWait(self.driver, self.TIMEOUT).until(
-            EC.presence_of_element_located((By.XPATH, "//span[normalize-space(text())='Unidade emitente:']"))
-        )
+        if not self._allow_submit(unit_code):
+            self.logger.warning("Solicitação de '%s' cancelada para %s (verificação prévia negou).", job['name'], unit_code)
+            return False
 
-        self._click('btn_pesquisar')
-        self._click('relatorio_link')
-        self._fill_field_guaranteed('input_unidade_tarefa', unit_code, allow_clipboard=True)
-        self._click('btn_solicitar_geracao')
-        self._click('btn_ok')
+        submit = [self._macro_step(job, 'click', name) for name in job['submit'][:-1]]
+        if job.get('confirmation'):
+            submit.append(self._macro_step(job, 'text', job['confirmation']))
+        submit.append(self._macro_step(job, 'click', job['submit'][-1]))
+        try:
+            result = self._run_macro(submit)
+        except Exception as e:
+            raise AutomationFatalError(f"Macro de solicitação falhou para {unit_code}: {e}")
+        if not result.get('ok'):
+            if result.get('failed_at') == 0 and result['steps'][0]['error'] == 'not found':
+                # nada foi clicado ainda: seguro refazer pelo fluxo passo a passo
+                return None
+            raise AutomationFatalError(
+                f"Macro de solicitação parou no passo {result.get('failed_at')} para {unit_code}; "
+                f"não repetindo para evitar solicitação duplicada."
+            )
+        dialog_text = next((r.get('text') or '' for r in result['steps'] if r['kind'] == 'text'), '')
+        for listener in self.submission_listeners:
+            try:
+                listener(unit_code, job['name'], dialog_text)
+            except Exception as e:
+                self.logger.debug("Submission listener falhou: %s", e)
         time.sleep(1.2)
+        return True
+
+    def run_report_job(self, unit_code: str, job: dict) -> bool:
+        """Runs one report job for the currently selected unit. Returns False if a submit guard vetoed it."""
+        if self.use_macro:
+            submitted = self.run_report_job_macro(unit_code, job)
+            if submitted is not None:
+                return submitted
+        self.logger.info("Iniciando geração do relatório '%s' para unidade: %s", job['name'], unit_code)
+        for name in job['menu']:
+            self._click(self._job_key(job, name))
+
+        if job.get('wait_for'):
+            key = self._job_key(job, job['wait_for'])
+            with self._timed_step(f'wait_{key}'):
+                self._wait_present(key)
+
+        for name in job['open']:
+            self._click(self._job_key(job, name))
+        for field in job['fields']:
+            value = str(field['value']).format(unit_code=unit_code)
+            self._fill_field_guaranteed(self._job_key(job, field['selector']), value, allow_clipboard=True)
+
+        if not self._allow_submit(unit_code):
+            self.logger.warning("Solicitação de '%s' cancelada para %s (verificação prévia negou).", job['name'], unit_code)
+            return False
+        for name in job['submit'][:-1]:
+            self._click(self._job_key(job, name))
+        dialog_text = self._read_confirmation(job)
+        self._click(self._job_key(job, job['submit'][-1]))
+        for listener in self.submission_listeners:
+            try:
+                listener(unit_code, job['name'], dialog_text)
+            except Exception as e:
+                self.logger.debug("Submission listener falhou: %s", e)
+        time.sleep(1.2)
+        return True
+
+    def _read_confirmation(self, job: dict) -> str:
+        if not job.get('confirmation'):
+            return ''
+        key = self._job_key(job, job['confirmation'])
+        try:
+            el = self._wait_visible(key, timeout=5)
+            return (el.text or '').strip()
+        except Exception as e:
+            self.logger.debug("Diálogo de confirmação de '%s' não lido: %s", job['name'], e)
+            return ''
+
+    def _open_report_listing(self, job: dict):
+        for name in job['menu']:
+            self._click(self._job_key(job, name))
+        if job.get('wait_for'):
+            key = self._job_key(job, job['wait_for'])
+            self._wait_present(key)
+        for name in job.get('listing', []):
+            self._click(self._job_key(job, name))
+        time.sleep(1.0)
+
+    def scan_report_listing(self, job: Optional[dict] = None) -> List[str]:
+        """
+        Opens the report listing of job (first job by default) and returns the
+        text of every row, collected in a single JS call.
+        """
+        job = job or self.report_jobs[0]
+        if not job.get('listing_rows'):
+            return []
+        self._open_report_listing(job)
+
+        key = self._job_key(job, job['listing_rows'])
+        rows = self._safe_js(
+            "var r = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);"
+            "var out = []; for (var i = 0; i < r.snapshotLength; i++) { out.push(r.snapshotItem(i).innerText); } return out;",
+            self.XPATHS.get(key, key),
+        )
+        self.logger.info("Listagem de relatórios lida: %s linhas", len(rows or []))
+        return rows or []
+
+    def generate_reports(self, unit_code: str) -> bool:
+        """Submits every configured report job while unit_code is selected. False if any job was vetoed."""
+        submitted = True
+        for job in self.report_jobs:
+            submitted = self.run_report_job(unit_code, job) and submitted
+        return submitted
+
+    def generate_inventory_report(self, unit_code: str) -> bool:
+        """Requests only the first configured job (INVENTARIO DE PATRIMONIOS by default)."""
+        return self.run_report_job(unit_code, self.report_jobs[0])
 
     # -------------------------
     # Unauthorized detection & record
     # -------------------------
     def write_unauthorized_unit(self, unit_code: str):
-        unauthorized_file = 'C:/Users/p0134255/Documents/Rogério/Backup/Tj/Projetos/Phyton/Automação-SIAD/unidades_sem_acesso.xlsx'
         try:
-            try:
-                df = pd.read_excel(unauthorized_file, engine='openpyxl')
-            except FileNotFoundError:
-                df = pd.DataFrame(columns=['Unidade', 'Data_Registro', 'Motivo'])
-            new_row = pd.DataFrame({
-                'Unidade': [unit_code],
-                'Data_Registro': [pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')],
-                'Motivo': ['NAO EXISTE PERFIL AUTORIZADO']
-            })
-            df = pd.concat([df, new_row], ignore_index=True)
-            df.to_excel(unauthorized_file, index=False, engine='openpyxl')
-            self.logger.warning(f"Unidade não autorizada {unit_code} registrada em {unauthorized_file}")
+            append_unauthorized_units([unit_code])
         except Exception as e:
-            self.logger.error(f"ERRO ao escrever unidade não autorizada: {e}")
+            self.logger.error("ERRO ao escrever unidade não autorizada: %s", e)
 
     def _detect_and_record_unauthorized_and_cleanup(self, unit_code: str) -> bool:
         """
@@ -426,15 +1173,14 @@ class SIADAutomation:
          - returns True indicating unit had no access (caller should skip it)
         """
         try:
-            WebDriverWait(self.driver, 1.5).until(
-                EC.presence_of_element_located((By.XPATH, self.XPATHS['error_unidade_nao_autorizada']))
-            )
-            self.logger.warning(f"Erro de acesso detectado para a unidade: {unit_code}")
+            self._wait_present('error_unidade_nao_autorizada', timeout=1.5)
+            self.logger.warning("Erro de acesso detectado para a unidade: %s", unit_code)
+            self._unauthorized_unit = str(unit_code).strip()
             self.write_unauthorized_unit(unit_code)
 
             # try to click 'SAIR'
             try:
-                btn = WebDriverWait(self.driver, 2).until(EC.element_to_be_clickable((By.XPATH, self.XPATHS['btn_sair_modal_erro'])))
+                btn = self._wait_clickable('btn_sair_modal_erro', timeout=2)
                 try:
                     btn.click()
                 except Exception:
@@ -453,7 +1199,7 @@ class SIADAutomation:
 
             # clear and focus the input if present
             try:
-                el = self.driver.find_element(By.XPATH, self.XPATHS['input_digite_unidade'])
+                el = self.driver.find_element(*self._locate('input_digite_unidade'))
                 try:
                     self._safe_js("arguments[0].removeAttribute('readonly'); arguments[0].removeAttribute('disabled');", el)
                 except Exception:
@@ -477,74 +1223,470 @@ class SIADAutomation:
         except Exception:
             return False
 
-    # Helper to detect whether the last processed unit_code was registered as unauthorized
-    # (we simply check the unidades_sem_acesso.xlsx last row if exists and matches unit_code)
+    # Helper to detect whether unit_code was just detected as unauthorized by this session
+    # (not the xlsx's last row: with concurrent sessions it may belong to another one)
     def _is_last_unit_unauthorized(self, unit_code: str) -> bool:
-        unauthorized_file = 'C:/Users/p0134255/Documents/Rogério/Backup/Tj/Projetos/Phyton/Automação-SIAD/unidades_sem_acesso.xlsx'
-        try:
-            df = pd.read_excel(unauthorized_file, engine='openpyxl', dtype=str)
-            if not df.empty:
-                last = str(df.iloc[-1]['Unidade']).strip()
-                return last == str(unit_code).strip()
-            return False
-        except Exception:
-            return False
+        return self._unauthorized_unit is not None and self._unauthorized_unit == str(unit_code).strip()
 
     # -------------------------
     # Main orchestration
     # -------------------------
-    def execute_automation(self):
-        try:
-            df = pd.read_excel(self.excel_path, sheet_name=0, header=0, dtype=str)
-            unit_codes = df.iloc[:, 0].dropna().unique().tolist()
-            if not unit_codes:
-                self.logger.warning("Nenhuma unidade encontrada na planilha. Encerrando.")
-                return
-
-            self.logger.info(f"Total de {len(unit_codes)} unidades para processar.")
-            self.login()
+    def load_unit_codes(self) -> List[str]:
+        return load_unit_codes(self.excel_path)
 
-            for i, unit_code in enumerate(unit_codes):
-                self.logger.info(f"--- Processando unidade {i+1}/{len(unit_codes)}: {unit_code} ---")
-                try:
-                    # prepare clipboard BEFORE interacting
-                    self._set_clipboard(unit_code)
+    def collect_download_links(self, unit_codes: List[str], job: Optional[dict] = None) -> List[dict]:
+        """
+        Reads every download link of the report listing in one JS call and maps
+        each one to the processed unit whose code appears in the row text (as a
+        whole number, longest code first; see siad_downloader.unit_in_text).
+        """
+        from siad_downloader import unit_in_text
+
+        job = job or self.report_jobs[0]
+        if not job.get('download_links'):
+            return []
+        self._open_report_listing(job)
+        key = self._job_key(job, job['download_links'])
+        found = self._safe_js(
+            "var r = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);"
+            "var out = []; for (var i = 0; i < r.snapshotLength; i++) { var a = r.snapshotItem(i);"
+            "var row = a.closest('tr'); out.push({href: a.getAttribute('href'), filename: a.getAttribute('download'),"
+            "text: row ? row.innerText : a.innerText}); } return out;",
+            self.XPATHS.get(key, key),
+        ) or []
+        codes = [str(c).strip() for c in unit_codes]
+        links = []
+        for item in found:
+            if not item.get('href') or item['href'].startswith('javascript:'):
+                continue
+            text = item.get('text') or ''
+            unit = unit_in_text(text, codes)
+            # versão = datas/horas da linha (geração do relatório); sem datas, o texto da linha
+            stamps = _ROW_STAMP_RE.findall(text)
+            version = ' '.join(stamps) if stamps else ' '.join(text.split())
+            links.append({'href': item['href'], 'filename': item.get('filename'), 'unit_code': unit, 'version': version,
+                          'job': job['name']})
+        self.logger.info("Links de download encontrados: %s", len(links))
+        return links
+
+    def download_finished_reports(self, unit_codes: List[str]):
+        from siad_downloader import ReportDownloader, cookie_header_from_driver, items_from_links
+
+        links = [link for job in self.report_jobs for link in self.collect_download_links(unit_codes, job)
+                 if link['unit_code']]
+        if not links:
+            return []
+        downloader = ReportDownloader(
+            self.download_dir,
+            cookie_header=cookie_header_from_driver(self.driver),
+            user_agent=self._safe_js("return navigator.userAgent;"),
+            max_connections=self.download_connections,
+        )
+        return downloader.download_all(items_from_links(links, self.driver.current_url))
 
-                    if i == 0:
-                        ok = self.select_unit_initial(unit_code)
-                    else:
-                        ok = self.change_unit_and_loop(unit_code)
+    def _maybe_track_reports(self, processed: int, force: bool = False):
+        if self.report_tracker is None or not processed:
+            return
+        if not force and (not self.track_every or processed % self.track_every != 0):
+            return
+        try:
+            job = self.report_jobs[0]
+            self.report_tracker.reconcile(self.scan_report_listing(job), job=job['name'])
+        except Exception as e:
+            self.logger.warning("Conferência da listagem de relatórios falhou: %s", e)
 
-                    if not ok:
-                        # skip unit and continue with next (was unauthorized or menu open failed)
-                        self.logger.info(f"Pulando unidade {unit_code} e seguindo para próxima.")
-                        time.sleep(0.6)
-                        continue
+    def process_units(self, unit_codes: Iterable[str], total: Optional[int] = None):
+        """
+        Logs in and processes every unit yielded by unit_codes (list or generator).
+        Does not quit the driver; AutomationFatalError is propagated to the caller.
+        """
+        self.login()
+        if self.preflight_listing:
+            unit_codes = self._filter_accessible(unit_codes)
+
+        needs_initial = True
+        processed_units: List[str] = []
+        for i, unit_code in enumerate(unit_codes):
+            for gate in self.unit_gates:
+                try:
+                    gate(unit_code)
+                except Exception as e:
+                    self.logger.debug("Unit gate falhou: %s", e)
+            self.logger.info("--- Processando unidade %s/%s: %s ---", i+1, total or '?', unit_code)
+            # reciclagem e conferência de relatórios só na fronteira entre unidades
+            if self._maybe_recycle_browser(i):
+                needs_initial = True
+            if not needs_initial:
+                self._maybe_track_reports(i)
+            self.current_unit = unit_code
+            set_log_context(unit=unit_code)
+            processed_units.append(unit_code)
+            unit_start = time.monotonic()
+            outcome = 'failed'
+            try:
+                if needs_initial:
+                    ok = self.select_unit_initial(unit_code)
+                    needs_initial = False
+                else:
+                    ok = self.change_unit_and_loop(unit_code)
 
-                    # generate report for this unit
-                    self.generate_inventory_report(unit_code)
+                if not ok:
+                    # skip unit and continue with next (was unauthorized or menu open failed)
+                    self.logger.info("Pulando unidade %s e seguindo para próxima.", unit_code)
+                    outcome = 'skipped'
                     time.sleep(0.6)
+                    continue
+
+                # generate all configured reports for this unit before switching;
+                # solicitação vetada por um submit guard (ex.: lease perdido) não é 'skipped':
+                # a unidade precisa voltar para a fila
+                outcome = 'ok' if self.generate_reports(unit_code) else 'failed'
+                time.sleep(0.6)
+
+            except AutomationFatalError as e:
+                self.logger.error("Erro inesperado (fatal). Parando execução. Detalhes: %s", e)
+                self._screenshot(f'erro_fatal_unidade_{unit_code}.png')
+                raise
+            finally:
+                duration = time.monotonic() - unit_start
+                self.unit_durations.append(duration)
+                self._notify_step('unit_total', duration)
+                self._notify_unit(unit_code, outcome, duration)
+                self.current_unit = None
+                set_log_context()
+                self._log_recycle_trend()
+
+        if self.selectors is not None:
+            self.selectors.report()
+
+        # conferência final (só se alguma unidade já foi selecionada)
+        if not needs_initial:
+            self._maybe_track_reports(len(self.unit_durations), force=True)
+            if self.download_dir:
+                try:
+                    self.download_finished_reports(processed_units)
+                except Exception as e:
+                    self.logger.warning("Download dos relatórios falhou: %s", e)
 
-                except AutomationFatalError as e:
-                    self.logger.error(f"Erro inesperado (fatal). Parando execução. Detalhes: {e}")
-                    self._screenshot(f'erro_fatal_unidade_{unit_code}.png')
-                    raise
+    def execute_automation(self, unit_codes: Optional[List[str]] = None):
+        try:
+            if unit_codes is None:
+                unit_codes = self.load_unit_codes()
+            if not unit_codes:
+                self.logger.warning("Nenhuma unidade encontrada na planilha. Encerrando.")
+                return
 
+            self.logger.info("Total de %s unidades para processar.", len(unit_codes))
+            self.process_units(unit_codes, total=len(unit_codes))
             self.logger.info("Execução finalizada (todas unidades processadas).")
 
         except Exception as e:
-            self.logger.error(f"Execução interrompida com erro: {e}")
+            self.logger.error("Execução interrompida com erro: %s", e)
         finally:
-            try:
-                self.driver.quit()
-            except Exception:
-                pass
-            self.logger.info("WebDriver fechado.")
+            self.close()
+
+    def close(self):
+        self._quit_driver()
+        self.artifacts.close()
+        self.logger.info("WebDriver fechado.")
 
 def main():
-    try:
+    parser = argparse.ArgumentParser(description="Automação de relatórios de inventário do SIAD")
+    parser.add_argument('--sessions', type=int, default=1,
+                        help="Máximo de sessões SIAD simultâneas (>1 ativa o governador AIMD)")
+    parser.add_argument('--queue', default=None,
+                        help="Arquivo SQLite da fila compartilhada (ex.: em um compartilhamento de rede)")
+    parser.add_argument('--run-id', default=time.strftime('%Y-%m-%d'),
+                        help="Identificador da execução na fila compartilhada (padrão: data de hoje)")
+    parser.add_argument('--lease', type=float, default=300.0, help="Duração do lease de cada unidade, em segundos")
+    parser.add_argument('--report-jobs', default=None,
+                        help="JSON com a lista de relatórios a solicitar por unidade (padrão: só INVENTARIO DE PATRIMONIOS)")
+    parser.add_argument('--track-reports', default=None, metavar='DB',
+                        help="Registra as solicitações e confere a listagem de relatórios (arquivo SQLite)")
+    parser.add_argument('--track-every', type=int, default=50,
+                        help="Conferir a listagem de relatórios a cada N unidades")
+    parser.add_argument('--download-dir', default=None,
+                        help="Baixa os relatórios gerados para este diretório ao final da execução")
+    parser.add_argument('--download-connections', type=int, default=4)
+    parser.add_argument('--incremental', action='store_true',
+                        help="Só solicita relatório para unidades cujo inventário mudou ou expirou")
+    parser.add_argument('--full-refresh', action='store_true',
+                        help="Com --incremental, solicita todas as unidades mesmo assim (e atualiza o estado)")
+    parser.add_argument('--recheck-unauthorized-days', type=float, default=30.0,
+                        help="Unidades registradas sem acesso há menos que isso são puladas antes do loop")
+    parser.add_argument('--no-preflight', action='store_true',
+                        help="Não pula unidades sem acesso registradas em execuções anteriores")
+    parser.add_argument('--preflight-listing', action='store_true',
+                        help="Lê a lista de unidades acessíveis no modal de seleção e pula as que, além de "
+                             "fora dela, já foram registradas sem acesso (mesmo antes de --recheck-unauthorized-days)")
+    parser.add_argument('--macro', action='store_true',
+                        help="Solicita cada relatório com uma macro dentro da página (fallback: passo a passo)")
+    parser.add_argument('--spreadsheet-order', action='store_true',
+                        help="Processa na ordem da planilha em vez de mais demoradas primeiro (LPT)")
+    parser.add_argument('--adaptive-timeouts', action='store_true',
+                        help="Timeout de cada espera = p99 da latência observada x 3 (mín. 3s, máx. o timeout fixo)")
+    parser.add_argument('--protocol', default=None, metavar='RECEITA',
+                        help="Solicita via HTTP direto (receita de siad_protocol.py learn); falhas voltam para o Selenium")
+    parser.add_argument('--protocol-sessions', type=int, default=8,
+                        help="Sessões HTTP simultâneas do motor de protocolo")
+    parser.add_argument('--record-protocol', default=None, metavar='HAR',
+                        help="Processa só a primeira unidade gravando o tráfego de rede neste HAR e sai")
+    parser.add_argument('--trace-commands', default=None, metavar='JSONL',
+                        help="Grava cada comando WebDriver (duração, origem, unidade/passo); ver siad_command_trace.py")
+    parser.add_argument('--perf-history', default='siad_perf_history.db', metavar='DB',
+                        help="Histórico de desempenho (unid/min, p50/p95 por passo) comparado com execuções anteriores")
+    parser.add_argument('--no-perf-history', action='store_true',
+                        help="Não grava esta execução no histórico de desempenho")
+    parser.add_argument('--schedule', action='store_true',
+                        help="Começa na janela de horário mais rápida do histórico e ajusta o ritmo à latência (--pace)")
+    parser.add_argument('--schedule-horizon', type=int, default=12, metavar='HORAS',
+                        help="Até quantas horas à frente o --schedule pode adiar o início")
+    parser.add_argument('--pace', action='store_true',
+                        help="Espaça as unidades ou pausa quando a latência do SIAD sobe; retoma sozinho")
+    parser.add_argument('--profile', default=None, metavar='ARQUIVO',
+                        help="Amostra a pilha Python durante a execução e grava pilhas colapsadas (flamegraph)")
+    parser.add_argument('--profile-interval', type=float, default=10.0, metavar='MS',
+                        help="Intervalo entre amostras do --profile (ms)")
+    parser.add_argument('--network-timing', action='store_true',
+                        help="Separa o tempo de cada passo em servidor, transferência e cliente (log de rede do Chrome)")
+    parser.add_argument('--shared-browser', action='store_true',
+                        help="Com --sessions/--queue, cada sessão é um contexto isolado em um único Chrome")
+    parser.add_argument('--switch-strategy', choices=('auto', 'direct', 'menu'), default='auto',
+                        help="Fluxo de troca de unidade: auto escolhe o mais rápido medido na execução (A/B)")
+    parser.add_argument('--input-mode', choices=INPUT_MODES, default='insert_text',
+                        help="Como preencher os campos: insert_text (CDP, padrão), js ou clipboard (Ctrl+V)")
+    parser.add_argument('--benchmark-input', type=int, default=0, metavar='N',
+                        help="Só compara as formas de preenchimento (N repetições no campo de usuário do login) e sai")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Expõe métricas ao vivo (formato Prometheus) em http://127.0.0.1:PORTA/metrics")
+    args = parser.parse_args()
+    if args.protocol and args.queue:
+        parser.error("--protocol não é compatível com --queue (as máquinas solicitariam as mesmas unidades)")
+
+    configure_logging()
+    if args.record_protocol:
+        from siad_protocol import har_from_driver
+        units = load_unit_codes()[:1]
+        automation = SIADAutomation(report_jobs=args.report_jobs, capture_network=True)
+        try:
+            automation.process_units(units, total=1)
+            har_from_driver(automation.driver, args.record_protocol)
+        finally:
+            automation.close()
+        logging.getLogger(__name__).info(
+            "Gere a receita com: python siad_protocol.py learn --har %s --unit %s --usuario ... --senha ...",
+            args.record_protocol, units[0] if units else '?')
+        return
+    if args.benchmark_input:
         automation = SIADAutomation()
-        automation.execute_automation()
+        try:
+            automation.driver.get(automation.base_url)
+            automation.benchmark_input_modes(rounds=args.benchmark_input)
+        finally:
+            automation.close()
+        return
+    try:
+        tracker = None
+        if args.track_reports:
+            from siad_report_tracker import ReportTracker
+            tracker = ReportTracker(args.track_reports)
+
+        incremental = None
+        if args.incremental:
+            from siad_incremental import IncrementalState
+            incremental = IncrementalState()
+            if not args.download_dir:
+                logging.getLogger(__name__).warning(
+                    "--incremental sem --download-dir: sem os relatórios não há como detectar mudança; "
+                    "cada unidade volta a ser solicitada a cada %.0f dia(s).", incremental.min_days)
+
+        metrics = metrics_server = None
+        if args.metrics_port:
+            from siad_metrics import RunMetrics, start_metrics_server
+            metrics = RunMetrics()
+            metrics_server = start_metrics_server(metrics, args.metrics_port)
+
+        timeouts = None
+        if args.adaptive_timeouts:
+            from siad_timeouts import AdaptiveTimeouts
+            timeouts = AdaptiveTimeouts()
+
+        command_recorder = None
+        if args.trace_commands:
+            from siad_command_trace import CommandRecorder
+            command_recorder = CommandRecorder(args.trace_commands)
+
+        # tipo inclui o que muda a vazão esperada: só se compara com execuções equivalentes
+        run_kind = f"run-s{args.sessions}" + ('-protocol' if args.protocol else '') + ('-queue' if args.queue else '')
+
+        network_timelines = []
+
+        switch_selector = None
+        if args.switch_strategy == 'auto':
+            from siad_strategy import StrategySelector
+            switch_selector = StrategySelector(['direct', 'menu'])
+        elif args.switch_strategy == 'menu':
+            from siad_strategy import StrategySelector
+            switch_selector = StrategySelector(['menu'])
+
+        history = UnitDurationHistory()
+        unit_codes = load_unit_codes()
+        if not args.no_preflight:
+            unit_codes = filter_known_unauthorized(unit_codes, args.recheck_unauthorized_days)
+        if incremental is not None:
+            unit_codes = incremental.select_units(unit_codes, force=args.full_refresh)
+        scheduled = unit_codes if args.spreadsheet_order else lpt_order(unit_codes, history)
+        makespan = MakespanReport(unit_codes, scheduled, history, workers=max(1, args.sessions))
+
+        pacer = None
+        if args.schedule or args.pace:
+            from siad_perf_history import PerfHistory
+            from siad_run_scheduler import LatencyPacer, pick_start, wait_until
+            perf_baseline = PerfHistory(args.perf_history)
+            pacer = LatencyPacer(baseline=perf_baseline.step_baseline(run_kind))
+            if args.schedule and scheduled:
+                start, cost, cost_now = pick_start(perf_baseline.hourly_profile(run_kind), makespan.predicted_lpt,
+                                                   horizon_h=args.schedule_horizon)
+                logging.getLogger(__name__).info(
+                    "Janela de início: %s (custo relativo %.2f; começando agora %.2f)",
+                    start.strftime('%d/%m %H:%M'), cost, cost_now)
+                wait_until(start)
+
+        # criado depois da espera do --schedule, para não deixar um Chrome parado por horas
+        browser_pool = None
+        if args.shared_browser:
+            from siad_browser_pool import SharedChrome
+            browser_pool = SharedChrome()
+            if args.network_timing:
+                logging.getLogger(__name__).warning(
+                    "--network-timing não funciona com --shared-browser (sessões anexadas não têm log de performance).")
+
+        run_stats = None
+        if not args.no_perf_history:
+            from siad_perf_history import RunStats
+            run_stats = RunStats()
+
+        def make_automation():
+            automation = SIADAutomation(report_jobs=args.report_jobs, browser_pool=browser_pool,
+                                        capture_network=args.network_timing)
+            automation.unit_listeners.append(history.record)
+            automation.download_dir = args.download_dir
+            automation.preflight_listing = args.preflight_listing
+            automation.use_macro = args.macro
+            automation.input_mode = args.input_mode
+            automation.timeouts = timeouts
+            automation.switch_selector = switch_selector
+            if command_recorder is not None:
+                automation.command_recorder = command_recorder
+                command_recorder.attach(automation.driver)
+            if args.network_timing:
+                from siad_network_timing import NetworkTimeline
+                automation.network_timeline = NetworkTimeline()
+                network_timelines.append(automation.network_timeline)
+            automation.download_connections = args.download_connections
+            if incremental is not None:
+                automation.unit_listeners.append(incremental.record_request)
+            if metrics is not None:
+                automation.step_listeners.append(metrics.on_step)
+                automation.unit_listeners.append(metrics.on_unit)
+            if run_stats is not None:
+                automation.step_listeners.append(run_stats.on_step)
+                automation.unit_listeners.append(run_stats.on_unit)
+            if pacer is not None:
+                automation.step_listeners.append(pacer.record_step)
+                automation.unit_gates.append(pacer.gate)
+            if tracker is not None:
+                automation.report_tracker = tracker
+                automation.track_every = args.track_every
+                automation.submission_listeners.append(tracker.record_submission)
+            return automation
+
+        engine = None
+        if args.protocol:
+            from siad_protocol import ProtocolEngine, load_recipe
+            engine = ProtocolEngine(load_recipe(args.protocol), DEFAULT_USUARIO, DEFAULT_SENHA,
+                                    sessions=args.protocol_sessions)
+            engine.unit_listeners.append(history.record)
+            if incremental is not None:
+                engine.unit_listeners.append(incremental.record_request)
+            if metrics is not None:
+                engine.unit_listeners.append(metrics.on_unit)
+            if run_stats is not None:
+                engine.unit_listeners.append(run_stats.on_unit)
+            if tracker is not None:
+                engine.submission_listeners.append(tracker.record_submission)
+
+        profiler = None
+        if args.profile:
+            from siad_profiler import SamplingProfiler
+            profiler = SamplingProfiler(interval_s=args.profile_interval / 1000.0)
+            profiler.start()
+
+        makespan.start()
+        try:
+            if engine is not None:
+                outcomes = engine.run(scheduled)
+                append_unauthorized_units([u for u, o in outcomes.items() if o == 'unauthorized'])
+                scheduled = [u for u in scheduled if outcomes.get(str(u)) == 'failed']
+                if scheduled:
+                    logging.getLogger(__name__).info(
+                        "%s unidades voltam para o fluxo Selenium após falha no motor de protocolo.", len(scheduled))
+
+            if not scheduled:
+                pass
+            elif args.queue:
+                from siad_work_queue import LeaseWorker, SQLiteWorkQueue
+                work_queue = SQLiteWorkQueue(args.queue)
+                # publicar é idempotente: todas as máquinas podem rodar o mesmo comando
+                work_queue.publish(args.run_id, scheduled)
+                LeaseWorker(work_queue, args.run_id, lease_s=args.lease).run(make_automation)
+            elif args.sessions > 1:
+                from siad_concurrency import AIMDGovernor, run_multi_session
+                governor = AIMDGovernor(max_sessions=args.sessions)
+                run_multi_session(scheduled, make_automation, governor)
+            else:
+                make_automation().execute_automation(scheduled)
+        finally:
+            makespan.finish()
+            if run_stats is not None:
+                from siad_perf_history import PerfHistory
+                run_stats.finish()
+                perf_history = PerfHistory(args.perf_history)
+                run_id = perf_history.record_run(run_kind, run_stats.summary(), params={
+                    'sessions': args.sessions, 'queue': bool(args.queue), 'protocol': bool(args.protocol),
+                    'shared_browser': args.shared_browser, 'switch_strategy': args.switch_strategy,
+                    'input_mode': args.input_mode, 'macro': args.macro, 'adaptive_timeouts': args.adaptive_timeouts,
+                })
+                perf_history.compare(run_id)
+            if profiler is not None:
+                profiler.stop()
+                profiler.write_collapsed(args.profile)
+                profiler.report()
+            history.save()
+            if switch_selector is not None:
+                switch_selector.report('Troca de unidade por estratégia')
+            if timeouts is not None:
+                timeouts.report()
+                timeouts.save()
+            if network_timelines:
+                from siad_network_timing import merge_reports
+                merge_reports(network_timelines).report()
+            if metrics_server is not None:
+                metrics_server.shutdown()
+            if browser_pool is not None:
+                browser_pool.close()
+            if command_recorder is not None:
+                command_recorder.close()
+            if incremental is not None:
+                if args.download_dir:
+                    incremental.update_from_downloads(args.download_dir)
+                incremental.save()
+            if tracker is not None:
+                missing = tracker.missing()
+                logging.getLogger(__name__).info(
+                    "Relatórios não concluídos: %s (%s)",
+                    len(missing), ', '.join(sorted({m['unit_code'] for m in missing})[:50])
+                )
     except Exception as e:
         print(f"A automação falhou: {e}")
 
@@ -0,0 +1,234 @@
+"""
+Várias sessões SIAD dentro de um único processo do Chrome.
+
+Em vez de um Chrome por sessão (centenas de MB cada), SharedChrome abre um Chrome
+"hospedeiro" e, para cada sessão, cria um contexto de navegação isolado
+(Target.createBrowserContext: cookies/armazenamento próprios, então cada aba tem
+seu login e sua unidade) com uma janela nele. Cada sessão recebe um WebDriver
+próprio anexado ao mesmo Chrome (debuggerAddress) e posicionado na sua janela,
+então as sessões continuam rodando em paralelo, uma thread por sessão, como em
+siad_concurrency.run_multi_session.
+
+Os comandos de contexto/alvo vão pelo endpoint CDP do navegador (websocket-client,
+já instalado como dependência do selenium). O Chrome hospedeiro roda sem
+throttling de timers em segundo plano, senão o polling do ZK (zAu) fica lento nas
+janelas que não estão em foco.
+
+Medição de memória (python siad_browser_pool.py --sessions 4 --url URL_DO_MOCK):
+abre N sessões como N processos Chrome e depois como N contextos em um Chrome,
+carrega a página em cada uma e soma a memória (PSS quando disponível, senão RSS)
+de toda a árvore de processos (chromedriver + Chrome). Requer psutil.
+"""
+import argparse
+import itertools
+import json
+import logging
+import threading
+import time
+import urllib.request
+from typing import Callable, Dict, List, Optional, Tuple
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from webdriver_manager.chrome import ChromeDriverManager
+
+try:
+    import websocket  # websocket-client
+except Exception:
+    websocket = None
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+_BACKGROUND_FLAGS = (
+    "--disable-background-timer-throttling",
+    "--disable-renderer-backgrounding",
+    "--disable-backgrounding-occluded-windows",
+)
+
+
+def default_chrome_options() -> Options:
+    chrome_options = Options()
+    # chrome_options.add_argument("--headless")  # descomente se desejar rodar sem UI
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_experimental_option("prefs", {"credentials_enable_service": False, "profile.password_manager_enabled": False})
+    return chrome_options
+
+
+def default_chrome_service() -> Service:
+    return Service(ChromeDriverManager().install())
+
+
+class SharedChrome:
+    def __init__(self,
+                 options_factory: Callable[[], Options] = default_chrome_options,
+                 service_factory: Callable[[], Service] = default_chrome_service):
+        self._service_factory = service_factory
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._contexts: Dict[int, Tuple[str, str]] = {}  # id(driver) -> (browserContextId, targetId)
+        self.drivers: List[webdriver.Chrome] = []
+
+        options = options_factory()
+        for flag in _BACKGROUND_FLAGS:
+            options.add_argument(flag)
+        self.host = webdriver.Chrome(service=service_factory(), options=options)
+        self.debugger_address = self.host.capabilities['goog:chromeOptions']['debuggerAddress']
+        with urllib.request.urlopen(f"http://{self.debugger_address}/json/version", timeout=10) as resp:
+            self._ws_url = json.load(resp)['webSocketDebuggerUrl']
+        logger.info("Chrome compartilhado em %s", self.debugger_address)
+
+    def _browser_cdp(self, method: str, params: Optional[dict] = None) -> dict:
+        if websocket is None:
+            raise RuntimeError("websocket-client não instalado (pip install websocket-client)")
+        with self._lock:
+            ws = websocket.create_connection(self._ws_url, timeout=30, suppress_origin=True)
+            try:
+                msg_id = next(self._ids)
+                ws.send(json.dumps({'id': msg_id, 'method': method, 'params': params or {}}))
+                while True:
+                    msg = json.loads(ws.recv())
+                    if msg.get('id') == msg_id:
+                        break
+            finally:
+                ws.close()
+        if 'error' in msg:
+            raise RuntimeError(f"{method}: {msg['error'].get('message')}")
+        return msg.get('result', {})
+
+    def new_driver(self) -> webdriver.Chrome:
+        """Opens an isolated context + window and returns a WebDriver attached to it."""
+        context_id = self._browser_cdp('Target.createBrowserContext', {'disposeOnDetach': False})['browserContextId']
+        target_id = self._browser_cdp('Target.createTarget', {
+            'url': 'about:blank', 'browserContextId': context_id, 'newWindow': True,
+        })['targetId']
+        options = Options()
+        options.debugger_address = self.debugger_address
+        driver = webdriver.Chrome(service=self._service_factory(), options=options)
+        # no chromedriver o handle da janela é o targetId do CDP
+        driver.switch_to.window(target_id)
+        with self._lock:
+            self._contexts[id(driver)] = (context_id, target_id)
+            self.drivers.append(driver)
+        return driver
+
+    def release(self, driver):
+        """Quits the attached session (the shared Chrome keeps running) and disposes its context."""
+        with self._lock:
+            context = self._contexts.pop(id(driver), None)
+            if driver in self.drivers:
+                self.drivers.remove(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        if context is not None:
+            try:
+                self._browser_cdp('Target.disposeBrowserContext', {'browserContextId': context[0]})
+            except Exception as e:
+                logger.debug("Falha ao descartar contexto %s: %s", context[0], e)
+
+    def close(self):
+        for driver in list(self.drivers):
+            self.release(driver)
+        try:
+            self.host.quit()
+        except Exception:
+            pass
+
+    def pids(self) -> List[int]:
+        """chromedriver processes (host first; Chrome runs under the host one)."""
+        out = []
+        for driver in [self.host] + list(self.drivers):
+            try:
+                out.append(driver.service.process.pid)
+            except Exception:
+                pass
+        return out
+
+
+# -------------------------
+# Medição de memória
+# -------------------------
+def process_tree_mb(root_pids: List[int]) -> float:
+    """Sum of PSS (or RSS) in MB over root_pids and all their descendants."""
+    if psutil is None:
+        raise RuntimeError("psutil não instalado (pip install psutil)")
+    seen = {}
+    for pid in root_pids:
+        try:
+            root = psutil.Process(pid)
+        except psutil.Error:
+            continue
+        for proc in [root] + root.children(recursive=True):
+            if proc.pid in seen:
+                continue
+            try:
+                try:
+                    seen[proc.pid] = proc.memory_full_info().pss
+                except (AttributeError, psutil.AccessDenied):
+                    seen[proc.pid] = proc.memory_info().rss
+            except psutil.Error:
+                pass
+    return sum(seen.values()) / (1024 * 1024)
+
+
+def _load(drivers, url: str, settle_s: float):
+    for driver in drivers:
+        driver.get(url)
+    time.sleep(settle_s)
+
+
+def measure_memory(url: str, sessions: int, settle_s: float = 3.0) -> Dict[str, dict]:
+    results = {}
+
+    drivers = []
+    try:
+        for _ in range(sessions):
+            drivers.append(webdriver.Chrome(service=default_chrome_service(), options=default_chrome_options()))
+        _load(drivers, url, settle_s)
+        total = process_tree_mb([d.service.process.pid for d in drivers])
+        results['processos'] = {'total_mb': total, 'per_session_mb': total / sessions}
+    finally:
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+    pool = SharedChrome()
+    try:
+        drivers = [pool.new_driver() for _ in range(sessions)]
+        _load(drivers, url, settle_s)
+        total = process_tree_mb(pool.pids())
+        results['contextos'] = {'total_mb': total, 'per_session_mb': total / sessions}
+    finally:
+        pool.close()
+
+    for mode, r in results.items():
+        logger.info("%10s: %s sessões, %.0f MB no total, %.0f MB por sessão",
+                    mode, sessions, r['total_mb'], r['per_session_mb'])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memória por sessão: vários Chromes x contextos em um Chrome")
+    parser.add_argument('--url', default='http://127.0.0.1:8765/jasi-frontend/',
+                        help="Página carregada em cada sessão (padrão: siad_mock_server.py local)")
+    parser.add_argument('--sessions', type=int, default=4)
+    parser.add_argument('--settle', type=float, default=3.0, help="Espera após carregar antes de medir (s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    measure_memory(args.url, args.sessions, args.settle)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Gravador de comandos WebDriver e profiler de replay offline.
+
+CommandRecorder envolve driver.command_executor.execute: cada comando enviado ao
+chromedriver (find_element, executeScript, click, sendKeys, CDP...) vira uma linha
+JSONL com início, duração, intervalo desde o comando anterior no mesmo thread
+(tempo em Python + sleeps), unidade/passo atuais (siad_logging) e a função da
+automação que originou o comando (_click, _fill_field_guaranteed,
+wait_and_interact, _safe_js, _until...). Textos digitados são gravados só pelo
+tamanho; scripts são gravados uma vez por hash.
+
+Análise / replay:
+    python siad_command_trace.py analyze TRACE.jsonl
+    python siad_command_trace.py replay TRACE.jsonl [--limit N]
+
+analyze agrupa por (origem, comando, alvo): quantidade, tempo total e médio, e
+aponta comandos repetidos em sequência fora das esperas (candidatos a remoção).
+replay repete a sequência contra a página do siad_mock_server local (elementos
+trocados pelo <body>, navegação trocada pela página do mock) e mede o custo
+local de cada grupo: round-trip do chromedriver + execução no navegador. A
+diferença para o tempo gravado é o que foi gasto esperando o SIAD.
+"""
+import argparse
+import atexit
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from siad_logging import get_log_context
+
+logger = logging.getLogger(__name__)
+
+# funções da automação que interessam como origem do comando (a mais interna vence)
+CALLERS = (
+    '_click', '_fill_field_guaranteed', 'wait_and_interact', '_safe_js', '_until',
+    '_input_insert_text', '_input_js', '_input_clipboard', '_input_send_keys',
+    'sample_browser_health', 'capture', '_run_macro', 'login',
+)
+WAIT_CALLERS = {'_until'}
+_ELEMENT_KEY = 'element-6066-11e4-a52e-4f735466cecf'
+_TEXT_PARAMS = ('text', 'value')
+# nomes W3C e legados; os args podem levar o texto digitado (_input_js preenche a senha assim)
+_SCRIPT_COMMANDS = {'w3cExecuteScript', 'w3cExecuteScriptAsync', 'executeScript', 'executeAsyncScript'}
+_SKIP_REPLAY = {'newSession', 'quit', 'close', 'closeWindow', 'switchToWindow', 'getLog', 'getAvailableLogTypes'}
+
+
+def _strip_elements(value):
+    if isinstance(value, dict):
+        if _ELEMENT_KEY in value:
+            return {_ELEMENT_KEY: '<el>'}
+        return {k: _strip_elements(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_elements(v) for v in value]
+    return value
+
+
+def _mask_strings(value):
+    """Script args: strings become {'len': n}, elements are stripped, everything else is kept."""
+    if isinstance(value, str):
+        return {'len': len(value)}
+    if isinstance(value, dict):
+        if _ELEMENT_KEY in value:
+            return {_ELEMENT_KEY: '<el>'}
+        return {k: _mask_strings(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_mask_strings(v) for v in value]
+    return value
+
+
+class CommandRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8', buffering=1024 * 1024)
+        self._scripts = set()
+        self._last_end: Dict[int, float] = {}
+        self._t0 = time.monotonic()
+        self._write({'type': 'header', 'started': time.strftime('%Y-%m-%dT%H:%M:%S'), 'pid': os.getpid()})
+        atexit.register(self.close)
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    def attach(self, driver):
+        """Wraps the driver's command executor; call again after the driver is recreated."""
+        executor = driver.command_executor
+        original = getattr(executor, '_siad_original_execute', executor.execute)
+        recorder = self
+
+        def execute(command, params):
+            start = time.monotonic()
+            response = None
+            try:
+                response = original(command, params)
+                return response
+            finally:
+                recorder._record(command, params, start, time.monotonic(), response)
+
+        executor._siad_original_execute = original
+        executor.execute = execute
+
+    def _caller(self) -> str:
+        frame = inspect.currentframe()
+        fallback = None
+        try:
+            frame = frame.f_back.f_back.f_back  # _record <- execute <- selenium
+            while frame is not None:
+                name = frame.f_code.co_name
+                if name in CALLERS:
+                    return name
+                module = frame.f_globals.get('__name__', '')
+                if fallback is None and not module.startswith('selenium') and module != __name__:
+                    fallback = name
+                frame = frame.f_back
+        finally:
+            del frame
+        return fallback or '?'
+
+    def _sanitize(self, command: str, params: dict) -> dict:
+        out = {}
+        for key, value in (params or {}).items():
+            if key in ('sessionId', 'id'):
+                continue
+            if key == 'script':
+                script_id = hashlib.sha1(value.encode('utf-8')).hexdigest()[:10]
+                if script_id not in self._scripts:
+                    self._scripts.add(script_id)
+                    self._write({'type': 'script', 'id': script_id, 'text': value})
+                out['script'] = script_id
+            elif command == 'sendKeysToElement' and key in _TEXT_PARAMS:
+                # nunca gravar o que é digitado (senha)
+                out[key] = {'len': len(''.join(value) if isinstance(value, list) else value)}
+            elif key == 'args' and command in _SCRIPT_COMMANDS:
+                out[key] = _mask_strings(value)
+            elif key == 'params' and command == 'executeCdpCommand':
+                out[key] = {k: ({'len': len(v)} if k == 'text' else v) for k, v in (value or {}).items()}
+            else:
+                out[key] = _strip_elements(value)
+        if params and 'id' in params:
+            out['element'] = True
+        return out
+
+    def _record(self, command: str, params: dict, start: float, end: float, response):
+        unit, step = get_log_context()
+        value = response.get('value') if isinstance(response, dict) else None
+        error = value.get('error') if isinstance(value, dict) else None
+        thread = threading.get_ident()
+        with self._lock:
+            last = self._last_end.get(thread)
+            self._last_end[thread] = end
+            record = {
+                'type': 'cmd', 't': round(start - self._t0, 4), 'dur': round(end - start, 4),
+                'gap': round(start - last, 4) if last is not None else None,
+                'cmd': command, 'caller': self._caller(), 'unit': unit, 'step': step,
+                'thread': threading.current_thread().name,
+                'params': self._sanitize(command, params),
+            }
+            if error:
+                record['error'] = error
+            if not self._file.closed:
+                self._write(record)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+# -------------------------
+# Análise
+# -------------------------
+def load_trace(path: str):
+    scripts: Dict[str, str] = {}
+    commands: List[dict] = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['type'] == 'script':
+                scripts[record['id']] = record['text']
+            elif record['type'] == 'cmd':
+                commands.append(record)
+    return commands, scripts
+
+
+def _target(record: dict, scripts: Dict[str, str]) -> str:
+    params = record['params']
+    if 'script' in params:
+        text = ' '.join(scripts.get(params['script'], params['script']).split())
+        return text[:50]
+    if 'value' in params and 'using' in params:
+        return f"{params['using']}={params['value']}"[:70]
+    if record['cmd'] == 'executeCdpCommand':
+        return params.get('cmd', '')
+    if 'url' in params:
+        return params['url'][:50]
+    return ''
+
+
+def _key(record: dict, scripts: Dict[str, str]):
+    return record['caller'], record['cmd'], _target(record, scripts)
+
+
+def analyze(commands: List[dict], scripts: Dict[str, str], replay_cost: Optional[Dict[tuple, float]] = None,
+            top: int = 25) -> dict:
+    groups: Dict[tuple, dict] = {}
+    redundant: Dict[tuple, int] = {}
+    previous: Dict[str, tuple] = {}
+    for record in commands:
+        key = _key(record, scripts)
+        g = groups.setdefault(key, {'count': 0, 'total_s': 0.0, 'errors': 0})
+        g['count'] += 1
+        g['total_s'] += record['dur']
+        g['errors'] += 1 if record.get('error') else 0
+        # repetição imediata do mesmo comando no mesmo passo, fora do polling das esperas
+        signature = (key, record.get('step'), json.dumps(record['params'], sort_keys=True))
+        if record['caller'] not in WAIT_CALLERS and previous.get(record['thread']) == signature:
+            redundant[key] = redundant.get(key, 0) + 1
+        previous[record['thread']] = signature
+
+    total_cmd = sum(r['dur'] for r in commands)
+    total_gap = sum(r['gap'] or 0.0 for r in commands)
+    span = (commands[-1]['t'] + commands[-1]['dur'] - commands[0]['t']) if commands else 0.0
+    lines = [f"{len(commands)} comandos; {total_cmd:.1f}s dentro de comandos WebDriver, "
+             f"{total_gap:.1f}s entre comandos (Python, sleeps); duração gravada {span:.1f}s"]
+    header = f"{'origem':<24} {'comando':<20} {'n':>6} {'total s':>9} {'médio ms':>9}"
+    if replay_cost:
+        header += f" {'local ms':>9} {'espera SIAD s':>13}"
+    lines.append(header + "  alvo")
+    rows = sorted(groups.items(), key=lambda kv: -kv[1]['total_s'])[:top]
+    for (caller, cmd, target), g in rows:
+        line = f"{caller[:24]:<24} {cmd[:20]:<20} {g['count']:>6} {g['total_s']:>9.2f} {g['total_s'] / g['count'] * 1000:>9.1f}"
+        if replay_cost:
+            local = replay_cost.get((caller, cmd, target))
+            if local is None:
+                line += f" {'-':>9} {'-':>13}"
+            else:
+                line += f" {local * 1000:>9.1f} {max(0.0, g['total_s'] - local * g['count']):>13.2f}"
+        lines.append(f"{line}  {target}")
+    if redundant:
+        lines.append("Comandos repetidos em sequência (candidatos a remoção):")
+        for (caller, cmd, target), n in sorted(redundant.items(), key=lambda kv: -kv[1])[:top]:
+            lines.append(f"  {n:>5}x {caller} {cmd} {target}")
+    logger.info("\n".join(lines))
+    return {'groups': groups, 'redundant': redundant, 'total_command_s': total_cmd, 'total_gap_s': total_gap}
+
+
+# -------------------------
+# Replay contra o mock
+# -------------------------
+def _replace_elements(value, element_ref):
+    if isinstance(value, dict):
+        if _ELEMENT_KEY in value:
+            return element_ref
+        if set(value) == {'len'}:
+            return 'x' * value['len']
+        return {k: _replace_elements(v, element_ref) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_elements(v, element_ref) for v in value]
+    return value
+
+
+def replay(commands: List[dict], scripts: Dict[str, str], page_url: str, limit: Optional[int] = None) -> Dict[tuple, float]:
+    """Runs the trace against page_url and returns the mean local cost (s) per analyze() group."""
+    from selenium.webdriver.common.by import By
+    from selenium import webdriver
+    from siad_browser_pool import default_chrome_options, default_chrome_service
+
+    driver = webdriver.Chrome(service=default_chrome_service(), options=default_chrome_options())
+    costs: Dict[tuple, List[float]] = {}
+    try:
+        driver.get(page_url)
+        body = driver.find_element(By.TAG_NAME, 'body')
+        element_ref = {_ELEMENT_KEY: body.id}
+        for record in commands[:limit]:
+            cmd = record['cmd']
+            if cmd in _SKIP_REPLAY:
+                continue
+            params = {}
+            for key, value in record['params'].items():
+                if key == 'element':
+                    params['id'] = body.id
+                elif key == 'script':
+                    params['script'] = scripts.get(value, 'return null;')
+                elif isinstance(value, dict) and set(value) == {'len'}:
+                    params[key] = 'x' * value['len'] if key != 'value' else ['x'] * value['len']
+                elif key == 'params' and isinstance(value, dict):
+                    params[key] = {k: ('x' * v['len'] if isinstance(v, dict) and set(v) == {'len'} else v)
+                                   for k, v in value.items()}
+                else:
+                    params[key] = _replace_elements(value, element_ref)
+            if cmd == 'get':
+                params['url'] = page_url
+            start = time.monotonic()
+            try:
+                driver.execute(cmd, params)
+            except Exception:
+                pass  # elemento inexistente no mock etc.: o round-trip foi medido mesmo assim
+            costs.setdefault(_key(record, scripts), []).append(time.monotonic() - start)
+    finally:
+        driver.quit()
+    return {key: sum(values) / len(values) for key, values in costs.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análise / replay de gravações de comandos WebDriver")
+    parser.add_argument('mode', choices=('analyze', 'replay'))
+    parser.add_argument('trace')
+    parser.add_argument('--limit', type=int, default=None, help="Repete só os N primeiros comandos")
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--mock-port', type=int, default=0, help="Porta do mock (0 = escolhe uma livre)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    commands, scripts = load_trace(args.trace)
+    replay_cost = None
+    if args.mode == 'replay':
+        from siad_mock_server import make_server
+        server = make_server(args.mock_port, reports=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            replay_cost = replay(commands, scripts, f"http://127.0.0.1:{server.server_address[1]}/jasi-frontend/",
+                                 args.limit)
+        finally:
+            server.shutdown()
+    analyze(commands, scripts, replay_cost, args.top)
+
+
+if __name__ == "__main__":
+    main()
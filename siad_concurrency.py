@@ -0,0 +1,252 @@
+"""
+Governador de concorrência AIMD para execuções com várias sessões SIAD.
+
+Cada sessão é uma instância de SIADAutomation (um Chrome, um login) rodando em
+uma thread própria e puxando unidades de uma fila compartilhada. O governador
+observa, em janelas de tempo, a latência por passo e a taxa de timeouts
+reportadas por todas as sessões (via step_listeners) e ajusta o número de
+sessões ativas:
+
+- aumento aditivo (+1 sessão) enquanto a vazão (unidades/min) continua subindo;
+- redução multiplicativa quando a latência p90 passa de latency_factor x a base,
+  ou quando a taxa de timeouts passa de max_timeout_rate. A base é por passo
+  (clicar em um menu e esperar um relatório têm latências bem diferentes) e é
+  uma média móvel (EWMA, baseline_alpha) do p90 das janelas: uma janela rápida
+  fora do normal não fixa a base lá embaixo para sempre. A latência da janela é
+  a mediana, entre os passos com amostras suficientes, de p90 / base do passo;
+- mantém o nível quando a vazão estabiliza (joelho da curva), sondando +1 de
+  tempos em tempos.
+
+Sessões acima do limite ficam paradas na fronteira entre unidades (com o
+navegador aberto) até o limite voltar a subir. Sessão que cai (exceção) é
+substituída por outra no mesmo índice, até max_restarts vezes na execução.
+"""
+import logging
+import queue
+import statistics
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+class AIMDGovernor:
+    def __init__(self,
+                 min_sessions: int = 1,
+                 max_sessions: int = 4,
+                 initial_sessions: int = 1,
+                 window_s: float = 120.0,
+                 latency_factor: float = 1.6,
+                 max_timeout_rate: float = 0.05,
+                 decrease_factor: float = 0.5,
+                 min_gain: float = 0.05,
+                 probe_after_holds: int = 3,
+                 baseline_alpha: float = 0.1,
+                 min_step_samples: int = 5):
+        self.min_sessions = min_sessions
+        self.max_sessions = max_sessions
+        self.limit = max(min_sessions, min(initial_sessions, max_sessions))
+        self.window_s = window_s
+        self.latency_factor = latency_factor
+        self.max_timeout_rate = max_timeout_rate
+        self.decrease_factor = decrease_factor
+        self.min_gain = min_gain
+        self.probe_after_holds = probe_after_holds
+        self.baseline_alpha = baseline_alpha
+        self.min_step_samples = min_step_samples
+
+        self._cond = threading.Condition()
+        self._latencies: Dict[str, List[float]] = {}
+        self._steps = 0
+        self._timeouts = 0
+        self._units = 0
+        self._window_start = time.monotonic()
+        self.baseline: Dict[str, float] = {}  # p90 típico por passo (EWMA)
+        self._last_throughput: Optional[float] = None
+        self._holds = 0
+        self.history: List[dict] = []
+
+    # -------------------------
+    # Observação (chamado pelas sessões)
+    # -------------------------
+    def record_step(self, unit_code: Optional[str], step: str, duration: float, timed_out: bool):
+        """Compatible with SIADAutomation.step_listeners."""
+        with self._cond:
+            if step == 'unit_total':
+                self._units += 1
+                return
+            self._steps += 1
+            self._latencies.setdefault(step, []).append(duration)
+            if timed_out:
+                self._timeouts += 1
+
+    # -------------------------
+    # Controle
+    # -------------------------
+    def wait_turn(self, session_index: int, stop: threading.Event) -> bool:
+        """Blocks while session_index is above the current limit. Returns False when stop is set."""
+        with self._cond:
+            while session_index >= self.limit and not stop.is_set():
+                self._cond.wait(timeout=1.0)
+            return not stop.is_set()
+
+    def _latency_ratio(self) -> Optional[float]:
+        """Median over steps of window p90 / step baseline; updates the baselines. None without comparable steps."""
+        ratios = []
+        for step, values in self._latencies.items():
+            if len(values) < self.min_step_samples:
+                continue
+            p90 = _percentile(values, 90)
+            base = self.baseline.get(step)
+            if base is None:
+                self.baseline[step] = p90
+                continue
+            if base > 0:
+                ratios.append(p90 / base)
+            # a base acompanha devagar o nível atual (inclusive para cima, se a lentidão persistir)
+            self.baseline[step] = base + self.baseline_alpha * (p90 - base)
+        return statistics.median(ratios) if ratios else None
+
+    def evaluate(self) -> int:
+        """Closes the current window, applies the AIMD rule and returns the new limit."""
+        with self._cond:
+            elapsed = max(time.monotonic() - self._window_start, 1e-6)
+            throughput = self._units / elapsed * 60.0
+            p90 = _percentile([v for values in self._latencies.values() for v in values], 90)
+            ratio = self._latency_ratio()
+            timeout_rate = self._timeouts / self._steps if self._steps else 0.0
+            previous = self.limit
+
+            congested = timeout_rate > self.max_timeout_rate or (ratio is not None and ratio > self.latency_factor)
+            if congested:
+                self.limit = max(self.min_sessions, int(self.limit * self.decrease_factor))
+                self._holds = 0
+                decision = 'decrease'
+            elif self._last_throughput is None or throughput > self._last_throughput * (1 + self.min_gain):
+                self.limit = min(self.max_sessions, self.limit + 1)
+                self._holds = 0
+                decision = 'increase'
+            else:
+                self._holds += 1
+                decision = 'hold'
+                if self._holds >= self.probe_after_holds:
+                    self.limit = min(self.max_sessions, self.limit + 1)
+                    self._holds = 0
+                    decision = 'probe'
+
+            record = {
+                'sessions': previous,
+                'units_per_min': throughput,
+                'p90_step_s': p90,
+                'latency_ratio': ratio,
+                'timeout_rate': timeout_rate,
+                'decision': decision,
+                'new_limit': self.limit,
+            }
+            self.history.append(record)
+            # só compara vazão entre janelas com dados
+            if self._units:
+                self._last_throughput = throughput
+
+            self._latencies = {}
+            self._steps = 0
+            self._timeouts = 0
+            self._units = 0
+            self._window_start = time.monotonic()
+            self._cond.notify_all()
+
+        logger.info(
+            "Governador AIMD: sessões=%s vazão=%.2f un/min p90=%s (%s da base) timeouts=%.1f%% -> %s, novo limite=%s",
+            previous, throughput, f"{p90:.2f}s" if p90 is not None else "n/d",
+            f"{ratio:.2f}x" if ratio is not None else "n/d", timeout_rate * 100, decision, self.limit,
+        )
+        return self.limit
+
+
+def _unit_source(work: "queue.Queue[str]", governor: AIMDGovernor, session_index: int,
+                 stop: threading.Event) -> Iterator[str]:
+    while governor.wait_turn(session_index, stop):
+        try:
+            yield work.get_nowait()
+        except queue.Empty:
+            return
+
+
+def run_multi_session(unit_codes: List[str],
+                      automation_factory: Callable[[], object],
+                      governor: AIMDGovernor,
+                      poll_s: float = 5.0,
+                      max_restarts: int = 3):
+    """
+    Runs unit_codes over up to governor.max_sessions sessions. Sessions are
+    created lazily the first time the limit allows them.
+
+    Obs.: com input_mode='clipboard' o clipboard do sistema é compartilhado entre as
+    sessões; _fill_field_guaranteed valida o valor colado e cai para send_keys se
+    outra sessão o tiver sobrescrito. Os modos padrão não usam clipboard.
+    """
+    work: "queue.Queue[str]" = queue.Queue()
+    for code in unit_codes:
+        work.put(code)
+
+    stop = threading.Event()
+    sessions: Dict[int, threading.Thread] = {}
+    restarts = 0
+
+    def worker(session_index: int):
+        automation = None
+        try:
+            automation = automation_factory()
+            automation.step_listeners.append(governor.record_step)
+            automation.process_units(_unit_source(work, governor, session_index, stop))
+        except Exception as e:
+            logger.error("Sessão %s encerrada com erro: %s", session_index, e)
+        finally:
+            if automation is not None:
+                automation.close()
+
+    logger.info("Execução multi-sessão: %s unidades, até %s sessões.", len(unit_codes), governor.max_sessions)
+    next_eval = time.monotonic() + governor.window_s
+    try:
+        while True:
+            # cria as sessões que o limite atual permite e ainda não estão vivas (nunca criadas ou caíram)
+            for index in range(governor.limit):
+                if work.empty():
+                    break
+                t = sessions.get(index)
+                if t is not None and t.is_alive():
+                    continue
+                if t is not None:
+                    if restarts >= max_restarts:
+                        continue
+                    restarts += 1
+                    logger.warning("Sessão %s caiu; abrindo outra no lugar (%s/%s).", index, restarts, max_restarts)
+                t = threading.Thread(target=worker, args=(index,), name=f"siad-sessao-{index}", daemon=True)
+                sessions[index] = t
+                t.start()
+
+            if work.empty() or not any(t.is_alive() for t in sessions.values()):
+                break
+            time.sleep(poll_s)
+            if time.monotonic() >= next_eval:
+                governor.evaluate()
+                next_eval = time.monotonic() + governor.window_s
+    finally:
+        # acorda sessões paradas para encerrarem após a fila esvaziar
+        stop.set()
+        with governor._cond:
+            governor._cond.notify_all()
+        for t in sessions.values():
+            t.join()
+
+    logger.info("Execução multi-sessão finalizada. Unidades não processadas: %s", work.qsize())
+    return governor.history
@@ -0,0 +1,283 @@
+"""
+Download em lote dos relatórios já gerados pelo SIAD.
+
+Reaproveita os cookies da sessão autenticada do Selenium em um pool HTTP
+(urllib3, que já vem como dependência do selenium) e baixa os arquivos em
+paralelo com um número limitado de conexões. Cada arquivo é gravado em streaming
+(.part -> nome final), com verificação de tamanho (Content-Length / esperado) e
+SHA-256. Um manifesto JSON no diretório de destino guarda tamanho, hash e versão
+(data da linha na listagem) de cada arquivo baixado, para pular o que já está
+completo na próxima execução; um relatório regerado com o mesmo nome tem outra
+versão/tamanho/hash e é baixado de novo. Nomes vindos da página passam por
+safe_filename (sem diretórios nem caracteres fora de letras, dígitos, '.', '-' e '_').
+
+items_from_links dá nome único a links sem nome de arquivo (ex.: download?id=...)
+e, se várias linhas da listagem derem o mesmo nome, fica só a mais recente;
+download_all recusa nomes repetidos (baixariam no mesmo .part).
+
+Uso avulso (ex.: contra o servidor local siad_mock_server.py):
+    python siad_downloader.py lista.json --dest relatorios --cookie "JSESSIONID=..."
+onde lista.json é uma lista de {"url": ..., "filename": ..., "sha256": opcional, "size": opcional}.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+import urllib3
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '_downloads.json'
+_UNSAFE_CHARS_RE = re.compile(r'[^\w.-]+')
+_STAMP_RE = re.compile(r'(\d{2})/(\d{2})/(\d{4})(?:\s+(\d{2}):(\d{2})(?::(\d{2}))?)?')
+
+
+def safe_filename(name: Optional[str], default: str = 'relatorio') -> str:
+    """Plain file name from a page-supplied name/URL: no directories, no '..', only [\\w.-]."""
+    base = os.path.basename((name or '').replace('\\', '/'))
+    base = _UNSAFE_CHARS_RE.sub('_', base).lstrip('.')
+    return base or default
+
+
+def unit_in_text(text: str, unit_codes: List[str]) -> Optional[str]:
+    """Unit code found in a listing row, as a whole number (not inside dates or longer codes); longest code first."""
+    text = _STAMP_RE.sub(' ', text or '')
+    for code in sorted({str(c).strip() for c in unit_codes if c and str(c).strip()}, key=len, reverse=True):
+        if re.search(rf'(?<!\d){re.escape(code)}(?!\d)', text):
+            return code
+    return None
+
+
+def _version_time(version: Optional[str]) -> datetime.datetime:
+    # versão = datas/horas da linha da listagem; a mais recente vale
+    stamps = []
+    for d, m, y, hh, mm, ss in _STAMP_RE.findall(version or ''):
+        try:
+            stamps.append(datetime.datetime(int(y), int(m), int(d), int(hh or 0), int(mm or 0), int(ss or 0)))
+        except ValueError:
+            continue
+    return max(stamps, default=datetime.datetime.min)
+
+
+@dataclass
+class DownloadItem:
+    url: str
+    filename: str
+    unit_code: Optional[str] = None
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+    # identifica a geração do relatório (ex.: data/hora na listagem); mudou -> baixa de novo
+    version: Optional[str] = None
+    # tipo de relatório (nome do job do SIADAutomation), para o estado incremental por (unidade, job)
+    job: Optional[str] = None
+
+    def __post_init__(self):
+        # nome vem da página/lista: nunca deve sair de dest_dir
+        self.filename = safe_filename(self.filename)
+
+
+@dataclass
+class DownloadResult:
+    item: DownloadItem
+    status: str  # 'downloaded' | 'skipped' | 'failed'
+    size: int = 0
+    sha256: Optional[str] = None
+    error: Optional[str] = None
+
+
+def cookie_header_from_driver(driver) -> str:
+    return '; '.join(f"{c['name']}={c['value']}" for c in driver.get_cookies())
+
+
+class ReportDownloader:
+    def __init__(self, dest_dir: str, cookie_header: str = '', user_agent: Optional[str] = None,
+                 max_connections: int = 4, timeout_s: float = 120.0, chunk_size: int = 64 * 1024,
+                 retries: int = 2):
+        self.dest_dir = dest_dir
+        self.max_connections = max_connections
+        self.chunk_size = chunk_size
+        headers = {}
+        if cookie_header:
+            headers['Cookie'] = cookie_header
+        if user_agent:
+            headers['User-Agent'] = user_agent
+        self.http = urllib3.PoolManager(
+            num_pools=4,
+            maxsize=max_connections,
+            block=True,  # nunca mais que max_connections conexões por host
+            headers=headers,
+            timeout=urllib3.Timeout(connect=15.0, read=timeout_s),
+            retries=urllib3.Retry(total=retries, backoff_factor=1.0, status_forcelist=(502, 503, 504)),
+        )
+        self._manifest_lock = threading.Lock()
+        os.makedirs(dest_dir, exist_ok=True)
+        self.manifest_path = os.path.join(dest_dir, MANIFEST_NAME)
+        self.manifest: Dict[str, dict] = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning("Manifesto de downloads ilegível (%s); todos os arquivos serão verificados de novo.", e)
+            return {}
+
+    def _save_manifest(self):
+        tmp = f"{self.manifest_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    def _path(self, item: DownloadItem) -> str:
+        return os.path.join(self.dest_dir, item.filename)
+
+    def _already_downloaded(self, item: DownloadItem) -> bool:
+        path = self._path(item)
+        entry = self.manifest.get(item.filename)
+        if entry is None or not os.path.exists(path):
+            return False
+        if os.path.getsize(path) != entry['size']:
+            return False
+        if item.sha256 and item.sha256.lower() != entry['sha256']:
+            return False
+        if item.size is not None and item.size != entry['size']:
+            return False
+        if item.version is not None and item.version != entry.get('version'):
+            return False
+        return True
+
+    def _download_one(self, item: DownloadItem) -> DownloadResult:
+        if self._already_downloaded(item):
+            return DownloadResult(item, 'skipped', self.manifest[item.filename]['size'], self.manifest[item.filename]['sha256'])
+
+        path = self._path(item)
+        part = f"{path}.part"
+        digest = hashlib.sha256()
+        written = 0
+        resp = None
+        try:
+            resp = self.http.request('GET', item.url, preload_content=False)
+            if resp.status != 200:
+                raise IOError(f"HTTP {resp.status}")
+            announced = resp.headers.get('Content-Length')
+            with open(part, 'wb') as f:
+                for chunk in resp.stream(self.chunk_size):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    written += len(chunk)
+
+            expected = item.size if item.size is not None else (int(announced) if announced else None)
+            if expected is not None and written != expected:
+                raise IOError(f"tamanho {written} != esperado {expected}")
+            sha = digest.hexdigest()
+            if item.sha256 and sha != item.sha256.lower():
+                raise IOError(f"SHA-256 divergente ({sha})")
+
+            os.replace(part, path)
+            with self._manifest_lock:
+                self.manifest[item.filename] = {'url': item.url, 'unit_code': item.unit_code, 'size': written,
+                                                'sha256': sha, 'version': item.version, 'job': item.job}
+                self._save_manifest()
+            return DownloadResult(item, 'downloaded', written, sha)
+        except Exception as e:
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+            return DownloadResult(item, 'failed', written, error=str(e))
+        finally:
+            if resp is not None:
+                resp.release_conn()
+
+    def download_all(self, items: List[DownloadItem]) -> List[DownloadResult]:
+        results: List[DownloadResult] = []
+        unique: Dict[str, DownloadItem] = {}
+        for item in items:
+            if item.filename in unique:
+                # dois downloads no mesmo .part se sobrescreveriam e o manifesto guardaria só um
+                logger.error("Download recusado: nome %s repetido (%s e %s)",
+                             item.filename, unique[item.filename].url, item.url)
+                results.append(DownloadResult(item, 'failed', error='nome de arquivo repetido'))
+            else:
+                unique[item.filename] = item
+        with ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix='siad-download') as pool:
+            futures = [pool.submit(self._download_one, item) for item in unique.values()]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if result.status == 'failed':
+                    logger.warning("Download falhou: %s (%s)", result.item.filename, result.error)
+                else:
+                    logger.debug("Download %s: %s (%s bytes)", result.status, result.item.filename, result.size)
+
+        counts: Dict[str, int] = {}
+        for r in results:
+            counts[r.status] = counts.get(r.status, 0) + 1
+        logger.info("Downloads finalizados: %s", counts)
+        return results
+
+
+def _name_from_url(url: str) -> str:
+    parsed = urlparse(url)
+    name = safe_filename(parsed.path)
+    if parsed.query:
+        # download?id=...: o caminho é o mesmo para todos os relatórios
+        stem, ext = os.path.splitext(name)
+        name = f"{stem}_{hashlib.sha1(parsed.query.encode('utf-8')).hexdigest()[:10]}{ext}"
+    return name
+
+
+def items_from_links(links: List[dict], base_url: str) -> List[DownloadItem]:
+    """
+    Builds DownloadItems from SIADAutomation.collect_download_links() output.
+    Links that resolve to the same file name keep only the newest version (listing order breaks ties).
+    """
+    items: Dict[str, DownloadItem] = {}
+    for link in links:
+        url = urljoin(base_url, link['href'])
+        name = safe_filename(link.get('filename') or _name_from_url(url))
+        unit = link.get('unit_code')
+        if unit and not name.startswith(f"{unit}_"):
+            name = f"{unit}_{name}"
+        item = DownloadItem(url=url, filename=name, unit_code=unit, size=link.get('size'),
+                            sha256=link.get('sha256'), version=link.get('version'), job=link.get('job'))
+        previous = items.get(item.filename)
+        if previous is not None:
+            if _version_time(item.version) <= _version_time(previous.version):
+                logger.info("Link de %s ignorado: versão mais recente já listada (%s)",
+                            item.filename, previous.version)
+                continue
+            logger.info("Link de %s substituído pela versão mais recente (%s)", item.filename, item.version)
+        items[item.filename] = item
+    return list(items.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download em lote de relatórios do SIAD")
+    parser.add_argument('items', help="JSON com a lista de arquivos (url, filename, size, sha256)")
+    parser.add_argument('--dest', default='relatorios_siad')
+    parser.add_argument('--cookie', default='', help="Cabeçalho Cookie da sessão autenticada")
+    parser.add_argument('--connections', type=int, default=4)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with open(args.items, 'r', encoding='utf-8') as f:
+        items = [DownloadItem(**entry) for entry in json.load(f)]
+    results = ReportDownloader(args.dest, args.cookie, max_connections=args.connections).download_all(items)
+    failed = [r for r in results if r.status == 'failed']
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Execução incremental: só solicita relatório para unidades cujo inventário mudou
+ou cujo último relatório expirou.
+
+O SIAD não informa quando o inventário de uma unidade mudou, então a mudança é
+inferida pelos próprios relatórios: depois de cada download calcula-se um hash
+da tabela do relatório (lida com siad_ingest.parse_report; colunas ordenadas,
+sem colunas de data/hora e sem datas/horas dentro das células), não dos bytes do
+arquivo — .xlsx/.xls são compactados/binários e trazem a data de geração, então
+cada regeração teria outro hash. Formatos sem tabela (ex.: PDF) não têm hash.
+Por unidade ficam guardados:
+
+- reports[job]: hash / changed_at do último relatório de cada tipo (job) e
+  quando ele mudou pela última vez; a unidade mudou quando qualquer um mudou;
+- requested_at: última solicitação enviada.
+
+Uma unidade é solicitada de novo quando nunca foi, ou quando o tempo desde a
+última solicitação passa de um intervalo adaptativo: metade do tempo em que o
+inventário está sem mudar, limitado entre min_days e max_days.
+Sem hash (relatórios não baixados) o intervalo é min_days. Unidades que
+mudaram recentemente são conferidas com frequência; as estáveis, raramente, mas
+nunca depois de max_days (expiração). force=True ignora tudo (refresh completo).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DAY_S = 24 * 3600
+
+# datas/horas de emissão mudam a cada geração e não indicam mudança do inventário
+_VOLATILE_RE = re.compile(r'\d{2}/\d{2}/\d{4}|\d{4}-\d{2}-\d{2}|\d{2}:\d{2}(:\d{2})?')
+_VOLATILE_COLUMN_RE = re.compile(r'(^|_)(data|hora|date|time|emiss[aã]o|gerado|gera[cç][aã]o)(_|$)')
+# colunas acrescentadas por parse_report (mtime e nome do arquivo, não conteúdo)
+_INGEST_COLUMNS = {'unit_code', 'run_date', 'source_file'}
+
+
+def content_hash(path: str) -> Optional[str]:
+    """Hash of the report table without date/time columns or values; None if the file has no readable table."""
+    from siad_ingest import SUPPORTED_EXTENSIONS, parse_report
+
+    if not path.lower().endswith(SUPPORTED_EXTENSIONS):
+        return None
+    _, df, error = parse_report(path)
+    if error is not None:
+        logger.warning("Relatório %s ilegível para o hash incremental: %s", path, error)
+        return None
+    columns = sorted(c for c in df.columns if c not in _INGEST_COLUMNS and not _VOLATILE_COLUMN_RE.search(c))
+    rows = sorted(
+        '\x1f'.join(_VOLATILE_RE.sub('', str(v)).strip() if isinstance(v, str) else '' for v in row)
+        for row in df[columns].itertuples(index=False, name=None)
+    )
+    digest = hashlib.sha256('\x1f'.join(columns).encode('utf-8'))
+    for row in rows:
+        if row.strip('\x1f'):
+            digest.update(b'\n')
+            digest.update(row.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class IncrementalState:
+    def __init__(self, path: str = 'siad_incremental_state.json', min_days: float = 1.0, max_days: float = 30.0):
+        self.path = path
+        self.min_days = min_days
+        self.max_days = max_days
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.units: Dict[str, dict] = json.load(f)
+        except FileNotFoundError:
+            self.units = {}
+        for item in self.units.values():
+            # estado antigo: um hash por unidade, sem o tipo de relatório
+            if 'hash' in item:
+                item.setdefault('reports', {})[''] = {
+                    k: item.pop(k) for k in ('hash', 'changed_at', 'checked_at') if k in item
+                }
+
+    def interval_s(self, unit_code: str, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        item = self.units.get(str(unit_code), {})
+        changed_at = max((r.get('changed_at') or 0 for r in item.get('reports', {}).values()), default=0)
+        stable_for = (now - changed_at) if changed_at else 0.0
+        return min(self.max_days * DAY_S, max(self.min_days * DAY_S, stable_for / 2))
+
+    def is_due(self, unit_code: str, now: Optional[float] = None) -> bool:
+        now = now or time.time()
+        item = self.units.get(str(unit_code))
+        if not item or not item.get('requested_at'):
+            return True
+        # sem hash (relatório ainda não baixado, ex.: sem --download-dir) vale o intervalo mínimo
+        return now - item['requested_at'] >= self.interval_s(unit_code, now)
+
+    def select_units(self, unit_codes: List[str], force: bool = False) -> List[str]:
+        if force:
+            logger.info("Refresh completo: %s unidades.", len(unit_codes))
+            return list(unit_codes)
+        now = time.time()
+        with self._lock:
+            due = [code for code in unit_codes if self.is_due(code, now)]
+        logger.info("Execução incremental: %s de %s unidades a solicitar (%s sem mudança e dentro do prazo).",
+                    len(due), len(unit_codes), len(unit_codes) - len(due))
+        return due
+
+    def record_request(self, unit_code: str, outcome: str, duration: float):
+        """Compatible with SIADAutomation.unit_listeners."""
+        if outcome != 'ok':
+            return
+        with self._lock:
+            self.units.setdefault(str(unit_code), {})['requested_at'] = time.time()
+
+    def record_report(self, unit_code: str, report_path: str, job: Optional[str] = None):
+        new_hash = content_hash(report_path)
+        if new_hash is None:
+            return
+        now = time.time()
+        with self._lock:
+            item = self.units.setdefault(str(unit_code), {})
+            report = item.setdefault('reports', {}).setdefault(job or '', {})
+            if report.get('hash') != new_hash:
+                if report.get('hash'):
+                    logger.info("Inventário da unidade %s mudou desde o último relatório (%s).",
+                                unit_code, job or 'relatório')
+                report['hash'] = new_hash
+                report['changed_at'] = now
+            report['checked_at'] = now
+
+    def update_from_downloads(self, download_dir: str, manifest_name: str = '_downloads.json'):
+        """Hashes every report listed in the siad_downloader manifest (newest file per unit and job wins)."""
+        try:
+            with open(os.path.join(download_dir, manifest_name), 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return
+        newest: Dict[Tuple[str, str], str] = {}
+        for filename, entry in manifest.items():
+            unit = entry.get('unit_code')
+            path = os.path.join(download_dir, filename)
+            if not unit or not os.path.exists(path):
+                continue
+            key = (unit, entry.get('job') or '')
+            if key not in newest or os.path.getmtime(path) > os.path.getmtime(newest[key]):
+                newest[key] = path
+        for (unit, job), path in newest.items():
+            self.record_report(unit, path, job)
+
+    def save(self):
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.units, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
@@ -0,0 +1,230 @@
+"""
+Ingestão incremental dos relatórios de inventário baixados.
+
+Lê os arquivos do diretório de downloads (siad_downloader) em um pool de
+processos e acrescenta as linhas a um dataset único, chaveado por unidade e data
+de execução, para que consultas entre unidades não precisem abrir arquivo por
+arquivo:
+
+- SQLite (padrão): tabela 'inventario'; colunas novas dos relatórios são
+  adicionadas com ALTER TABLE.
+- Parquet (se pyarrow estiver instalado): diretório particionado por
+  run_date/unit_code.
+
+Reingerir um relatório alterado substitui as linhas anteriores do mesmo arquivo
+de origem (em qualquer partição), em vez de duplicar o inventário da unidade.
+
+Só os arquivos novos ou alterados (nome + tamanho + mtime) desde a última
+ingestão são processados; o estado fica em _ingest_state.json no destino.
+
+Uso:
+    python siad_ingest.py relatorios_siad --store inventario.db
+    python siad_ingest.py relatorios_siad --store inventario_parquet --format parquet
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = ('.csv', '.txt', '.xlsx', '.xls')
+KEY_COLUMNS = ['unit_code', 'run_date', 'source_file']
+
+
+def _unit_from_filename(filename: str) -> Optional[str]:
+    # siad_downloader nomeia os arquivos como <unidade>_<nome original>
+    match = re.match(r'^(\d+)_', filename)
+    return match.group(1) if match else None
+
+
+def _clean_column(name) -> str:
+    text = re.sub(r'\W+', '_', str(name).strip().lower()).strip('_')
+    return text or 'coluna'
+
+
+def parse_report(path: str) -> Tuple[str, Optional[pd.DataFrame], Optional[str]]:
+    """Runs in a worker process. Returns (path, dataframe, error)."""
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext in ('.xlsx', '.xls'):
+            df = pd.read_excel(path, dtype=str)
+        else:
+            df = pd.read_csv(path, sep=None, engine='python', dtype=str, encoding='utf-8', on_bad_lines='skip')
+        df.columns = [_clean_column(c) for c in df.columns]
+        df = df.loc[:, ~df.columns.duplicated()]
+
+        filename = os.path.basename(path)
+        df['unit_code'] = _unit_from_filename(filename)
+        df['run_date'] = time.strftime('%Y-%m-%d', time.localtime(os.path.getmtime(path)))
+        df['source_file'] = filename
+        return path, df, None
+    except Exception as e:
+        return path, None, str(e)
+
+
+class IngestState:
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self.files: Dict[str, dict] = json.load(f)
+        except FileNotFoundError:
+            self.files = {}
+
+    @staticmethod
+    def _signature(path: str) -> dict:
+        st = os.stat(path)
+        return {'size': st.st_size, 'mtime': st.st_mtime}
+
+    def is_new(self, path: str) -> bool:
+        return self.files.get(os.path.basename(path)) != self._signature(path)
+
+    def mark(self, path: str):
+        self.files[os.path.basename(path)] = self._signature(path)
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.files, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+class SQLiteStore:
+    table = 'inventario'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} (unit_code TEXT, run_date TEXT, source_file TEXT)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_unit ON {self.table} (unit_code, run_date)")
+
+    @property
+    def state_path(self) -> str:
+        return f"{os.path.splitext(self.path)[0]}_ingest_state.json"
+
+    def _columns(self) -> List[str]:
+        return [row[1] for row in self.conn.execute(f"PRAGMA table_info({self.table})")]
+
+    def append(self, df: pd.DataFrame):
+        existing = set(self._columns())
+        for col in df.columns:
+            if col not in existing:
+                self.conn.execute(f'ALTER TABLE {self.table} ADD COLUMN "{col}" TEXT')
+        # reingestão de um arquivo alterado substitui as linhas antigas dele
+        self.conn.execute(f"DELETE FROM {self.table} WHERE source_file = ?", (df['source_file'].iloc[0],))
+        cols = ', '.join(f'"{c}"' for c in df.columns)
+        marks = ', '.join('?' for _ in df.columns)
+        self.conn.executemany(
+            f"INSERT INTO {self.table} ({cols}) VALUES ({marks})",
+            df.where(pd.notna(df), None).itertuples(index=False, name=None),
+        )
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def parquet_files_for(path: str, stem: str) -> List[str]:
+    """Files written by ParquetStore for source stem: '<stem>-<n>.parquet' only, not '<stem>-2-<n>.parquet'."""
+    exact = re.compile(re.escape(stem) + r'-\d+\.parquet')
+    pattern = os.path.join(glob.escape(path), 'run_date=*', 'unit_code=*', f"{glob.escape(stem)}-*.parquet")
+    return [f for f in glob.glob(pattern) if exact.fullmatch(os.path.basename(f))]
+
+
+class ParquetStore:
+    def __init__(self, path: str):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError("Formato parquet requer pyarrow (pip install pyarrow)")
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @property
+    def state_path(self) -> str:
+        return os.path.join(self.path, '_ingest_state.json')
+
+    def append(self, df: pd.DataFrame):
+        # um arquivo por relatório dentro da partição; run_date vem do mtime, então um relatório
+        # alterado cai em outra partição: remove antes as linhas anteriores do mesmo arquivo de origem
+        stem = os.path.splitext(df['source_file'].iloc[0])[0]
+        for old in parquet_files_for(self.path, stem):
+            os.remove(old)
+        df.to_parquet(
+            self.path,
+            engine='pyarrow',
+            partition_cols=['run_date', 'unit_code'],
+            index=False,
+            basename_template=f"{stem}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+        )
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def ingest(source_dir: str, store_path: str, fmt: str = 'sqlite', workers: Optional[int] = None) -> Dict[str, int]:
+    store = ParquetStore(store_path) if fmt == 'parquet' else SQLiteStore(store_path)
+    state = IngestState(store.state_path)
+
+    candidates = [
+        os.path.join(source_dir, name) for name in sorted(os.listdir(source_dir))
+        if name.lower().endswith(SUPPORTED_EXTENSIONS)
+    ]
+    new_files = [path for path in candidates if state.is_new(path)]
+    logger.info("Ingestão: %s arquivos novos de %s em %s", len(new_files), len(candidates), source_dir)
+
+    counts = {'files': 0, 'rows': 0, 'errors': 0}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(parse_report, path) for path in new_files]
+            for future in as_completed(futures):
+                path, df, error = future.result()
+                if error is not None:
+                    counts['errors'] += 1
+                    logger.warning("Falha ao ler %s: %s", path, error)
+                    continue
+                if not df.empty:
+                    store.append(df)
+                state.mark(path)
+                counts['files'] += 1
+                counts['rows'] += len(df)
+        store.commit()
+        state.save()
+    finally:
+        store.close()
+
+    logger.info("Ingestão finalizada: %s", counts)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão incremental dos relatórios baixados do SIAD")
+    parser.add_argument('source_dir', help="Diretório com os relatórios baixados")
+    parser.add_argument('--store', default='inventario.db', help="Arquivo SQLite ou diretório Parquet")
+    parser.add_argument('--format', choices=('sqlite', 'parquet'), default='sqlite')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    ingest(args.source_dir, args.store, args.format, args.workers)
+
+
+if __name__ == "__main__":
+    main()
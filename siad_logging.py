@@ -0,0 +1,136 @@
+"""
+Logging assíncrono e estruturado para as automações do SIAD.
+
+- O thread da automação só coloca o LogRecord em uma fila (QueueHandler); um
+  QueueListener em background formata e grava, então I/O de log não bloqueia o
+  loop do WebDriver. A mensagem também só é montada no listener: use o estilo
+  logger.info("... %s", valor) em vez de f-strings nos pontos quentes.
+- Cada execução grava arquivos próprios (nada de filemode='w' sobrescrevendo o
+  log anterior): <nome>_<AAAAmmdd_HHMMSS>.jsonl (um JSON por linha, para análise
+  automática) e <nome>_<AAAAmmdd_HHMMSS>.log (texto), ambos com rotação.
+- Todo registro JSON tem os campos unit, step e duration_s; unit/step vêm do
+  contexto atual (set_log_context) ou de extra={...}.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+_unit = contextvars.ContextVar('siad_log_unit', default=None)
+_step = contextvars.ContextVar('siad_log_step', default=None)
+# cópia por thread para quem observa de outro thread (siad_profiler): contextvars só são legíveis no próprio
+_thread_context: Dict[int, Tuple] = {}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+run_log_paths = {}
+
+
+def set_log_context(unit=None, step=None):
+    """Sets unit/step for records logged from the current thread (None clears)."""
+    _unit.set(unit)
+    _step.set(step)
+    _thread_context[threading.get_ident()] = (unit, step)
+
+
+def set_log_step(step):
+    _step.set(step)
+    _thread_context[threading.get_ident()] = (_unit.get(), step)
+
+
+def get_log_context():
+    """(unit, step) of the current thread."""
+    return _unit.get(), _step.get()
+
+
+def thread_log_context(ident: int):
+    """(unit, step) last set by the thread with this ident, readable from any thread."""
+    return _thread_context.get(ident, (None, None))
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'unit'):
+            record.unit = _unit.get()
+        if not hasattr(record, 'step'):
+            record.step = _step.get()
+        if not hasattr(record, 'duration_s'):
+            record.duration_s = None
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Keeps msg/args unformatted so the % formatting happens in the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class JsonlFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'unit': getattr(record, 'unit', None),
+            'step': getattr(record, 'step', None),
+            'duration_s': getattr(record, 'duration_s', None),
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_async_logging(log_file: str = 'siad_automation.log', level: int = logging.INFO,
+                        max_bytes: int = 50 * 1024 * 1024, backup_count: int = 10) -> dict:
+    """
+    Installs the queue handler on the root logger once per process and returns
+    {'jsonl': path, 'text': path} of this run's files.
+    """
+    global _listener
+    if _listener is not None:
+        return run_log_paths
+
+    stem, _ = os.path.splitext(log_file)
+    stamp = time.strftime('%Y%m%d_%H%M%S')
+    run_log_paths['jsonl'] = f"{stem}_{stamp}.jsonl"
+    run_log_paths['text'] = f"{stem}_{stamp}.log"
+    log_dir = os.path.dirname(stem)
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    jsonl_handler = logging.handlers.RotatingFileHandler(
+        run_log_paths['jsonl'], maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    jsonl_handler.setFormatter(JsonlFormatter())
+    text_handler = logging.handlers.RotatingFileHandler(
+        run_log_paths['text'], maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+    text_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - [%(unit)s] %(message)s'))
+
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    queue_handler = _DeferredQueueHandler(log_queue)
+    # o contexto (unit/step) precisa ser lido no thread que gerou o registro
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, jsonl_handler, text_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_async_logging)
+    return run_log_paths
+
+
+def stop_async_logging():
+    """Flushes the queue and stops the background writer."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
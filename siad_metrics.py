@@ -0,0 +1,130 @@
+"""
+Endpoint local de métricas (formato texto do Prometheus) para acompanhar uma
+execução em andamento sem ficar lendo o log.
+
+Métricas expostas em http://127.0.0.1:<porta>/metrics:
+- siad_units_total{outcome="ok|skipped|failed"}
+- siad_units_per_minute (janela móvel de window_s segundos)
+- siad_inflight_unit{session,unit} (1 para a unidade em processamento em cada sessão)
+- siad_step_duration_seconds (histograma por passo)
+- siad_step_timeouts_total{step}
+- siad_run_uptime_seconds
+
+RunMetrics.on_step / on_unit são compatíveis com SIADAutomation.step_listeners /
+unit_listeners.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+class RunMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, window_s: float = 300.0):
+        self.buckets = tuple(buckets)
+        self.window_s = window_s
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        self.units: Dict[str, int] = {'ok': 0, 'skipped': 0, 'failed': 0}
+        self._completions: deque = deque()
+        self.inflight: Dict[str, str] = {}  # sessão (thread) -> unidade
+        self.step_counts: Dict[str, List[int]] = {}
+        self.step_sums: Dict[str, float] = {}
+        self.step_timeouts: Dict[str, int] = {}
+
+    def on_step(self, unit_code: Optional[str], step: str, duration: float, timed_out: bool):
+        session = threading.current_thread().name
+        with self._lock:
+            if unit_code is not None:
+                self.inflight[session] = unit_code
+            counts = self.step_counts.setdefault(step, [0] * (len(self.buckets) + 1))
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    counts[i] += 1
+            counts[-1] += 1  # +Inf / _count
+            self.step_sums[step] = self.step_sums.get(step, 0.0) + duration
+            if timed_out:
+                self.step_timeouts[step] = self.step_timeouts.get(step, 0) + 1
+
+    def on_unit(self, unit_code: str, outcome: str, duration: float):
+        now = time.monotonic()
+        with self._lock:
+            self.units[outcome] = self.units.get(outcome, 0) + 1
+            self._completions.append(now)
+            self.inflight.pop(threading.current_thread().name, None)
+
+    def units_per_minute(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            while self._completions and self._completions[0] < now - self.window_s:
+                self._completions.popleft()
+            # no começo da execução a janela é o tempo decorrido (mínimo de 1 min, para não explodir a taxa)
+            window = min(self.window_s, max(now - self.started, 60.0))
+            return len(self._completions) / window * 60.0
+
+    def render(self) -> str:
+        upm = self.units_per_minute()
+        out = []
+        with self._lock:
+            out.append('# HELP siad_units_total Unidades processadas por resultado.')
+            out.append('# TYPE siad_units_total counter')
+            for outcome, n in sorted(self.units.items()):
+                out.append(f'siad_units_total{{outcome="{_label(outcome)}"}} {n}')
+            out.append('# HELP siad_units_per_minute Unidades concluídas por minuto (janela móvel).')
+            out.append('# TYPE siad_units_per_minute gauge')
+            out.append(f'siad_units_per_minute {upm:.4f}')
+            out.append('# HELP siad_inflight_unit Unidade em processamento em cada sessão.')
+            out.append('# TYPE siad_inflight_unit gauge')
+            for session, unit in sorted(self.inflight.items()):
+                out.append(f'siad_inflight_unit{{session="{_label(session)}",unit="{_label(unit)}"}} 1')
+            out.append('# HELP siad_step_duration_seconds Duração de cada passo da automação.')
+            out.append('# TYPE siad_step_duration_seconds histogram')
+            for step, counts in sorted(self.step_counts.items()):
+                s = _label(step)
+                for bound, n in zip(self.buckets, counts):
+                    out.append(f'siad_step_duration_seconds_bucket{{step="{s}",le="{bound:g}"}} {n}')
+                out.append(f'siad_step_duration_seconds_bucket{{step="{s}",le="+Inf"}} {counts[-1]}')
+                out.append(f'siad_step_duration_seconds_sum{{step="{s}"}} {self.step_sums[step]:.4f}')
+                out.append(f'siad_step_duration_seconds_count{{step="{s}"}} {counts[-1]}')
+            out.append('# HELP siad_step_timeouts_total Timeouts por passo.')
+            out.append('# TYPE siad_step_timeouts_total counter')
+            for step, n in sorted(self.step_timeouts.items()):
+                out.append(f'siad_step_timeouts_total{{step="{_label(step)}"}} {n}')
+            out.append('# HELP siad_run_uptime_seconds Tempo desde o início da execução.')
+            out.append('# TYPE siad_run_uptime_seconds gauge')
+            out.append(f'siad_run_uptime_seconds {time.monotonic() - self.started:.1f}')
+        return '\n'.join(out) + '\n'
+
+
+def start_metrics_server(metrics: RunMetrics, port: int = 9108, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serves metrics.render() on /metrics from a daemon thread. Call shutdown() on the result to stop."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            logger.debug(fmt, *args)
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='siad-metrics', daemon=True).start()
+    logger.info("Métricas em http://%s:%s/metrics", host, port)
+    return server
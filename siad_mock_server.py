@@ -0,0 +1,260 @@
+"""
+Servidor HTTP local que imita as partes do SIAD usadas pelos estágios da automação,
+para testar e medir sem tocar no sistema real.
+
+Rotas:
+- GET  /jasi-frontend/[?rows=N]     -> página HTML com o formulário de login e N linhas de tabela
+                                       (peso de DOM para medir memória por sessão no navegador);
+                                       abre um "desktop" (dtid no HTML) e define o cookie JSESSIONID
+- POST /zkau                        -> eventos no estilo ZK (form: dtid, cmd_0, uuid_0, data_0 JSON):
+                                       onLogin {usuario, senha}  -> devolve o uuid do campo de unidade
+                                       onSelectUnit {value}      -> devolve o uuid do botão de solicitar
+                                                                   (unidades terminadas em 9: sem acesso)
+                                       onSolicitar {}            -> registra o relatório da unidade
+- GET  /login?usuario=..&senha=..   -> define o cookie JSESSIONID
+- GET  /relatorios/index.json       -> lista de relatórios "gerados" (url, filename, size, sha256)
+- GET  /relatorios/<arquivo>        -> conteúdo determinístico do relatório (exige cookie)
+
+Uso:
+    python siad_mock_server.py --port 8765 --reports 200
+"""
+import argparse
+import hashlib
+import json
+import logging
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+SESSION_COOKIE = 'JSESSIONID'
+
+
+def report_content(filename: str) -> bytes:
+    """Deterministic pseudo-report: a few KB to a few hundred KB depending on the name."""
+    seed = hashlib.sha256(filename.encode('utf-8')).digest()
+    lines = 50 + seed[0] * 20
+    body = ["SEQ;PATRIMONIO;DESCRICAO;VALOR"]
+    for i in range(lines):
+        body.append(f"{i};PATRIMONIO {seed[i % 32]:03d}{i:06d};BEM MOVEL;{(seed[(i + 1) % 32] * 37 + i) % 100000}")
+    return ('\n'.join(body) + '\n').encode('utf-8')
+
+
+UNAUTHORIZED_MESSAGE = 'NAO EXISTE PERFIL AUTORIZADO PARA A UNIDADE'
+
+# Os botões da página chamam /zkau como o cliente ZK faria, para que uma gravação HAR
+# feita no navegador contra o mock tenha a mesma forma de uma gravação no SIAD real.
+_APP_JS = """
+var uuids = {};
+function zkau(cmd, uuid, data) {
+  var body = new URLSearchParams({dtid: zkDesktop.dtid, cmd_0: cmd, uuid_0: uuid || '', data_0: JSON.stringify(data || {})});
+  return fetch('/zkau', {method: 'POST', body: body}).then(function (r) { return r.json(); }).then(function (j) {
+    if (j.uuid) { uuids[cmd] = j.uuid; }
+    document.getElementById('msg').innerText = j.rs ? j.rs[0][1] : '';
+    return j;
+  });
+}
+function entrar() { zkau('onLogin', '', {usuario: document.getElementById('u').value, senha: document.getElementById('s').value}); }
+function selecionar() { zkau('onSelectUnit', uuids.onLogin, {value: document.getElementById('un').value}); }
+function solicitar() { zkau('onSolicitar', uuids.onSelectUnit, {}); }
+"""
+
+
+def app_page(dtid: str, rows: int = 2000) -> bytes:
+    """HTML page with the same placeholders/buttons the automation's XPATHS expect on the login screen."""
+    body = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>SIAD (mock)</title>",
+        f"<script>var zkDesktop = {{dtid: '{dtid}'}};{_APP_JS}</script></head><body>",
+        "<input id='u' placeholder='Usuário'><input id='s' placeholder='Senha' type='password'>",
+        "<button onclick='entrar()'>Entrar</button>",
+        "<input id='un' placeholder='Digite a Unidade'><button onclick='selecionar()'>Selecionar</button>",
+        "<button onclick='solicitar()'>Solicitar geração</button><span id='msg'></span>",
+        "<table class='z-listbox'>",
+    ]
+    body.extend(f"<tr class='z-listitem'><td>{1000000 + i}</td><td>UNIDADE {i}</td></tr>" for i in range(rows))
+    body.append("</table></body></html>")
+    return ''.join(body).encode('utf-8')
+
+
+class MockSIAD:
+    def __init__(self, reports: int = 50, latency_s: float = 0.0):
+        self.latency_s = latency_s
+        self.sessions: Dict[str, str] = {}
+        self.desktops: Dict[str, dict] = {}
+        self.submissions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.reports = {f"{1000000 + i}_INVENTARIO.csv": report_content(f"{1000000 + i}_INVENTARIO.csv") for i in range(reports)}
+
+    def new_session(self, usuario: str) -> str:
+        token = secrets.token_hex(12)
+        with self.lock:
+            self.sessions[token] = usuario
+        return token
+
+    def new_desktop(self, session: str) -> str:
+        dtid = f"z_{secrets.token_hex(4)}"
+        with self.lock:
+            self.desktops[dtid] = {'session': session, 'user': None, 'unit': None, 'uuids': {}}
+        return dtid
+
+    def zk_event(self, session: Optional[str], form: Dict[str, str]) -> Tuple[int, dict]:
+        """Handles one /zkau event. Returns (status, json body)."""
+        with self.lock:
+            desktop = self.desktops.get(form.get('dtid', ''))
+            if desktop is None:
+                return 410, {'error': 'desktop inexistente'}
+            if session is None or desktop['session'] != session:
+                return 401, {'error': 'sessao invalida'}
+            cmd = form.get('cmd_0')
+            try:
+                data = json.loads(form.get('data_0') or '{}')
+            except ValueError:
+                return 400, {'error': 'data_0 invalido'}
+            if cmd != 'onLogin' and desktop['uuids'].get(cmd) != form.get('uuid_0'):
+                return 400, {'error': f'uuid invalido para {cmd}'}
+
+            if cmd == 'onLogin':
+                if not data.get('usuario') or not data.get('senha'):
+                    return 200, {'rs': [['alert', 'Usuário ou senha inválidos']]}
+                desktop['user'] = data['usuario']
+                uuid = desktop['uuids']['onSelectUnit'] = f"u_{secrets.token_hex(3)}"
+                return 200, {'rs': [['info', 'Login efetuado']], 'uuid': uuid}
+            if desktop['user'] is None:
+                return 200, {'rs': [['alert', 'Sessão não autenticada']]}
+            if cmd == 'onSelectUnit':
+                unit = str(data.get('value', '')).strip()
+                if not unit.isdigit() or unit.endswith('9'):
+                    desktop['unit'] = None
+                    return 200, {'rs': [['alert', UNAUTHORIZED_MESSAGE]]}
+                desktop['unit'] = unit
+                uuid = desktop['uuids']['onSolicitar'] = f"s_{secrets.token_hex(3)}"
+                return 200, {'rs': [['info', f'Unidade {unit} selecionada']], 'uuid': uuid}
+            if cmd == 'onSolicitar':
+                unit = desktop['unit']
+                if unit is None:
+                    return 200, {'rs': [['alert', 'Nenhuma unidade selecionada']]}
+                name = f"{unit}_INVENTARIO.csv"
+                self.reports[name] = report_content(name)
+                self.submissions[unit] = self.submissions.get(unit, 0) + 1
+                number = sum(self.submissions.values())
+                return 200, {'rs': [['alert', f'Solicitação registrada sob o número {number}']]}
+            return 400, {'error': f'comando desconhecido: {cmd}'}
+
+    def index(self, host: str) -> list:
+        return [
+            {
+                'url': f"http://{host}/relatorios/{name}",
+                'filename': name,
+                'unit_code': name.split('_')[0],
+                'size': len(data),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+            for name, data in sorted(self.reports.items())
+        ]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    siad: MockSIAD = None  # definido em make_server
+
+    def log_message(self, fmt, *args):
+        logger.debug(fmt, *args)
+
+    def _session(self) -> Optional[str]:
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            name, _, value = part.strip().partition('=')
+            if name == SESSION_COOKIE and value in self.siad.sessions:
+                return value
+        return None
+
+    def _send(self, status: int, body: bytes, content_type: str = 'text/plain; charset=utf-8',
+              headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _query(self) -> Tuple[str, Dict[str, str]]:
+        parsed = urlparse(self.path)
+        return parsed.path, {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+    def do_GET(self):
+        if self.siad.latency_s:
+            time.sleep(self.siad.latency_s)
+        path, query = self._query()
+
+        if path.rstrip('/') == '/jasi-frontend':
+            session = self._session() or self.siad.new_session('anonimo')
+            dtid = self.siad.new_desktop(session)
+            self._send(200, app_page(dtid, int(query.get('rows', 2000))), 'text/html; charset=utf-8',
+                       headers={'Set-Cookie': f"{SESSION_COOKIE}={session}; Path=/"})
+            return
+
+        if path == '/login':
+            token = self.siad.new_session(query.get('usuario', 'mock'))
+            self._send(200, b'ok', headers={'Set-Cookie': f"{SESSION_COOKIE}={token}; Path=/"})
+            return
+
+        if path == '/relatorios/index.json':
+            body = json.dumps(self.siad.index(self.headers.get('Host', 'localhost'))).encode('utf-8')
+            self._send(200, body, 'application/json')
+            return
+
+        if path.startswith('/relatorios/'):
+            if self._session() is None:
+                self._send(401, b'sessao invalida')
+                return
+            data = self.siad.reports.get(path[len('/relatorios/'):])
+            if data is None:
+                self._send(404, b'nao encontrado')
+                return
+            self._send(200, data, 'text/csv; charset=utf-8')
+            return
+
+        self._send(404, b'nao encontrado')
+
+    def do_POST(self):
+        if self.siad.latency_s:
+            time.sleep(self.siad.latency_s)
+        path, _ = self._query()
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length).decode('utf-8') if length else ''
+        if path != '/zkau':
+            self._send(404, b'nao encontrado')
+            return
+        form = {k: v[0] for k, v in parse_qs(raw, keep_blank_values=True).items()}
+        status, body = self.siad.zk_event(self._session(), form)
+        self._send(status, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json; charset=utf-8')
+
+
+def make_server(port: int = 8765, reports: int = 50, latency_s: float = 0.0) -> ThreadingHTTPServer:
+    handler = type('BoundMockHandler', (MockHandler,), {'siad': MockSIAD(reports, latency_s)})
+    return ThreadingHTTPServer(('127.0.0.1', port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita o SIAD")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--reports', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help="Atraso artificial por requisição (s)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = make_server(args.port, args.reports, args.latency)
+    logger.info("Mock do SIAD em http://127.0.0.1:%s/", args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
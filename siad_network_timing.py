@@ -0,0 +1,147 @@
+"""
+Tempo de rede por passo/unidade a partir do log de performance do Chrome (CDP).
+
+Com o Chrome iniciado com goog:loggingPrefs {'performance': 'ALL'} (eventos
+Network.*), a cada passo concluído o log é drenado e as requisições do ZK
+terminadas desde o passo anterior são atribuídas a ele (os passos de uma sessão
+são sequenciais, então não é preciso alinhar relógios). Para cada passo:
+
+- servidor: união dos intervalos sendEnd -> receiveHeadersEnd (tempo até o
+  primeiro byte, inclui a ida e volta da rede);
+- transferência: união dos intervalos receiveHeadersEnd -> loadingFinished;
+- outros de rede: fila/conexão/envio (ocupado em rede menos os dois acima);
+- cliente: duração do passo menos o tempo com alguma requisição em andamento
+  (esperas, sleeps, retries, renderização, Python).
+
+Os totais por unidade são registrados no passo 'unit_total' e report() soma tudo
+por nome de passo ao final.
+"""
+import json
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL_PATTERN = r'/zkau'
+
+
+def union_length(intervals: List[Tuple[float, float]]) -> float:
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(i for i in intervals if i[1] > i[0]):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+def split_timing(requests: List[dict], duration: float) -> dict:
+    busy = union_length([(r['start'], r['end']) for r in requests])
+    server = union_length([(r['send_end'], r['headers_end']) for r in requests if 'headers_end' in r])
+    transfer = union_length([(r['headers_end'], r['end']) for r in requests if 'headers_end' in r])
+    return {
+        'requests': len(requests),
+        'server_s': server,
+        'transfer_s': transfer,
+        'network_other_s': max(0.0, busy - server - transfer),
+        'client_s': max(0.0, duration - busy),
+        'duration_s': duration,
+    }
+
+
+class NetworkTimeline:
+    def __init__(self, url_pattern: str = DEFAULT_URL_PATTERN):
+        self.pattern = re.compile(url_pattern)
+        self._pending: Dict[str, dict] = {}
+        self._unit_requests: List[dict] = []
+        self._lock = threading.Lock()
+        self.per_step: Dict[str, dict] = {}
+
+    def reset(self):
+        """Forgets in-flight requests (new driver after a recycle: they will never finish)."""
+        self._pending.clear()
+        self._unit_requests = []
+
+    def _drain(self, driver) -> List[dict]:
+        done = []
+        for item in driver.get_log('performance'):
+            message = json.loads(item['message'])['message']
+            method, params = message.get('method'), message.get('params', {})
+            rid = params.get('requestId')
+            if method == 'Network.requestWillBeSent':
+                if self.pattern.search(params['request']['url']):
+                    self._pending[rid] = {'url': params['request']['url'], 'start': params['timestamp']}
+            elif rid not in self._pending:
+                continue
+            elif method == 'Network.responseReceived':
+                timing = params['response'].get('timing')
+                if timing:
+                    base = timing['requestTime']
+                    self._pending[rid]['send_end'] = base + timing['sendEnd'] / 1000.0
+                    self._pending[rid]['headers_end'] = base + timing['receiveHeadersEnd'] / 1000.0
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                request = self._pending.pop(rid)
+                request['end'] = params['timestamp']
+                request['failed'] = method == 'Network.loadingFailed'
+                done.append(request)
+        return done
+
+    def _accumulate(self, step: str, timing: dict):
+        with self._lock:
+            total = self.per_step.setdefault(step, {'count': 0, 'requests': 0, 'server_s': 0.0, 'transfer_s': 0.0,
+                                                    'network_other_s': 0.0, 'client_s': 0.0, 'duration_s': 0.0})
+            total['count'] += 1
+            for key in ('requests', 'server_s', 'transfer_s', 'network_other_s', 'client_s', 'duration_s'):
+                total[key] += timing[key]
+
+    def on_step(self, driver, unit_code: Optional[str], step: str, duration: float) -> Optional[dict]:
+        """Drains the performance log and attributes finished requests to this step."""
+        try:
+            finished = self._drain(driver)
+        except Exception as e:
+            logger.debug("Log de performance indisponível: %s", e)
+            return None
+        if step == 'unit_total':
+            requests = self._unit_requests + finished
+            self._unit_requests = []
+        else:
+            self._unit_requests.extend(finished)
+            requests = finished
+        timing = split_timing(requests, duration)
+        self._accumulate(step, timing)
+        if requests or step == 'unit_total':
+            logger.info(
+                "Rede %s: servidor %.2fs, transferência %.2fs, outros %.2fs, cliente %.2fs (%s req)",
+                step, timing['server_s'], timing['transfer_s'], timing['network_other_s'], timing['client_s'],
+                timing['requests'],
+                extra={'step': step, 'duration_s': round(duration, 3)},
+            )
+        return timing
+
+    def report(self):
+        with self._lock:
+            rows = sorted(self.per_step.items(), key=lambda kv: -kv[1]['duration_s'])
+        if not rows:
+            return
+        lines = [f"{'passo':<32} {'n':>5} {'req':>6} {'servidor s':>11} {'transf. s':>10} {'outros s':>9} {'cliente s':>10}"]
+        for step, t in rows:
+            lines.append(f"{step[:32]:<32} {t['count']:>5} {t['requests']:>6} {t['server_s']:>11.2f} "
+                         f"{t['transfer_s']:>10.2f} {t['network_other_s']:>9.2f} {t['client_s']:>10.2f}")
+        logger.info("Tempo por passo (rede x cliente):\n%s", "\n".join(lines))
+
+
+def merge_reports(timelines: List[NetworkTimeline]) -> NetworkTimeline:
+    merged = NetworkTimeline()
+    for timeline in timelines:
+        for step, t in timeline.per_step.items():
+            total = merged.per_step.setdefault(step, {k: 0 for k in t})
+            for key, value in t.items():
+                total[key] += value
+    return merged
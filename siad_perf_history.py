@@ -0,0 +1,299 @@
+"""
+Histórico de desempenho entre execuções, com detecção de regressão.
+
+O log de cada execução é um arquivo novo, mas os números agregados se perdiam
+entre eles. RunStats coleta durante a execução (é compatível com
+SIADAutomation.step_listeners / unit_listeners) e PerfHistory grava, por
+execução, em SQLite:
+
+- runs:  tipo ('run-s4', 'bench-protocol-s8-l0', ...), início/fim, unidades, unidades/min,
+         timeouts e parâmetros (JSON);
+- steps: por passo, contagem, p50, p95 e timeouts;
+- hours: por hora do dia (hora local), unidades, p50 da duração por unidade,
+         passos e timeouts; base do agendamento por horário (siad_run_scheduler).
+
+compare() confronta a execução com a linha de base (mediana das últimas
+`baseline_runs` execuções do mesmo tipo) e aponta queda de unidades/min acima de
+`throughput_drop`, p95 de passo acima de `step_slowdown` e taxa de timeouts
+acima do dobro da base. Comparações só entre execuções do mesmo tipo: bench no
+mock não vira base para o SIAD real.
+
+Uso:
+    python siad_perf_history.py list
+    python siad_perf_history.py compare [--run ID]
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from siad_timeouts import percentile
+
+logger = logging.getLogger(__name__)
+
+
+class RunStats:
+    def __init__(self):
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.elapsed_s: Optional[float] = None
+        self._lock = threading.Lock()
+        self.step_durations: Dict[str, List[float]] = {}
+        self.step_timeouts: Dict[str, int] = {}
+        self.units: Dict[str, int] = {}
+        self.hours: Dict[int, dict] = {}
+
+    def _hour(self) -> dict:
+        return self.hours.setdefault(time.localtime().tm_hour, {'units': 0, 'durations': [], 'steps': 0, 'timeouts': 0})
+
+    def on_step(self, unit_code: Optional[str], step: str, duration: float, timed_out: bool):
+        with self._lock:
+            self.step_durations.setdefault(step, []).append(duration)
+            hour = self._hour()
+            hour['steps'] += 1
+            if timed_out:
+                self.step_timeouts[step] = self.step_timeouts.get(step, 0) + 1
+                hour['timeouts'] += 1
+
+    def on_unit(self, unit_code: str, outcome: str, duration: float):
+        with self._lock:
+            self.units[outcome] = self.units.get(outcome, 0) + 1
+            hour = self._hour()
+            hour['units'] += 1
+            # unidades com falha terminam em timeout/erro e as puladas na pré-verificação (duração 0)
+            # nem foram abertas: a duração não representa a latência da hora
+            if outcome != 'failed' and duration > 0:
+                hour['durations'].append(duration)
+
+    def finish(self):
+        self.finished_at = time.time()
+        self.elapsed_s = time.monotonic() - self._started
+
+    def summary(self) -> dict:
+        if self.elapsed_s is None:
+            self.finish()
+        with self._lock:
+            units = sum(self.units.values())
+            steps = {}
+            for step, durations in self.step_durations.items():
+                ordered = sorted(durations)
+                steps[step] = {'count': len(ordered), 'p50': percentile(ordered, 0.5), 'p95': percentile(ordered, 0.95),
+                               'timeouts': self.step_timeouts.get(step, 0)}
+            hours = {hour: {'units': h['units'], 'unit_p50': percentile(sorted(h['durations']), 0.5),
+                            'steps': h['steps'], 'timeouts': h['timeouts']}
+                     for hour, h in self.hours.items()}
+            return {
+                'started_at': self.started_at, 'finished_at': self.finished_at,
+                'units': units, 'outcomes': dict(self.units),
+                'units_per_min': units / self.elapsed_s * 60 if self.elapsed_s else 0.0,
+                'timeouts': sum(self.step_timeouts.values()),
+                'steps': steps,
+                'hours': hours,
+            }
+
+
+class PerfHistory:
+    def __init__(self, path: str = 'siad_perf_history.db'):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL,
+                    units INTEGER NOT NULL,
+                    units_per_min REAL NOT NULL,
+                    timeouts INTEGER NOT NULL,
+                    params TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS steps (
+                    run_id INTEGER NOT NULL REFERENCES runs (id),
+                    step TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    p50 REAL NOT NULL,
+                    p95 REAL NOT NULL,
+                    timeouts INTEGER NOT NULL,
+                    PRIMARY KEY (run_id, step)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS hours (
+                    run_id INTEGER NOT NULL REFERENCES runs (id),
+                    hour INTEGER NOT NULL,
+                    units INTEGER NOT NULL,
+                    unit_p50 REAL NOT NULL,
+                    steps INTEGER NOT NULL,
+                    timeouts INTEGER NOT NULL,
+                    PRIMARY KEY (run_id, hour)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_runs_kind ON runs (kind, id)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record_run(self, kind: str, summary: dict, params: Optional[dict] = None) -> int:
+        with self._connect() as conn:
+            run_id = conn.execute(
+                "INSERT INTO runs (kind, started_at, finished_at, units, units_per_min, timeouts, params) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, summary['started_at'], summary.get('finished_at'), summary['units'], summary['units_per_min'],
+                 summary.get('timeouts', 0), json.dumps(params or {}, ensure_ascii=False, default=str)),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO steps (run_id, step, count, p50, p95, timeouts) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, step, s['count'], s['p50'], s['p95'], s['timeouts'])
+                 for step, s in summary.get('steps', {}).items()],
+            )
+            conn.executemany(
+                "INSERT INTO hours (run_id, hour, units, unit_p50, steps, timeouts) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, hour, h['units'], h['unit_p50'], h['steps'], h['timeouts'])
+                 for hour, h in summary.get('hours', {}).items()],
+            )
+        logger.info("Execução %s (%s) gravada no histórico: %s unidades, %.1f unid/min, %s timeouts",
+                    run_id, kind, summary['units'], summary['units_per_min'], summary.get('timeouts', 0))
+        return run_id
+
+    def runs(self, kind: Optional[str] = None, limit: int = 20) -> List[sqlite3.Row]:
+        with self._connect() as conn:
+            if kind is None:
+                return conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            return conn.execute("SELECT * FROM runs WHERE kind = ? ORDER BY id DESC LIMIT ?", (kind, limit)).fetchall()
+
+    def step_baseline(self, kind: str, runs: int = 10, min_count: int = 5) -> Dict[str, float]:
+        """Median p50 per step over the last runs of this kind."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT s.step, s.p50 FROM steps s JOIN "
+                "(SELECT id FROM runs WHERE kind = ? ORDER BY id DESC LIMIT ?) r ON s.run_id = r.id "
+                "WHERE s.count >= ?", (kind, runs, min_count)).fetchall()
+        values: Dict[str, List[float]] = {}
+        for row in rows:
+            values.setdefault(row['step'], []).append(row['p50'])
+        return {step: statistics.median(v) for step, v in values.items()}
+
+    def hourly_profile(self, kind: str, runs: int = 30, min_units: int = 3) -> Dict[int, dict]:
+        """Per hour of day: median unit p50 and timeouts per unit over the last runs of this kind."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT h.* FROM hours h JOIN "
+                "(SELECT id FROM runs WHERE kind = ? ORDER BY id DESC LIMIT ?) r ON h.run_id = r.id "
+                "WHERE h.units >= ?", (kind, runs, min_units)).fetchall()
+        grouped: Dict[int, List[sqlite3.Row]] = {}
+        for row in rows:
+            grouped.setdefault(row['hour'], []).append(row)
+        return {
+            hour: {
+                'unit_p50': statistics.median(r['unit_p50'] for r in items),
+                'timeouts_per_unit': sum(r['timeouts'] for r in items) / sum(r['units'] for r in items),
+                'units': sum(r['units'] for r in items),
+                'runs': len(items),
+            }
+            for hour, items in grouped.items()
+        }
+
+    def _steps(self, conn, run_ids: List[int]) -> Dict[int, Dict[str, sqlite3.Row]]:
+        out: Dict[int, Dict[str, sqlite3.Row]] = {run_id: {} for run_id in run_ids}
+        marks = ','.join('?' * len(run_ids))
+        for row in conn.execute(f"SELECT * FROM steps WHERE run_id IN ({marks})", run_ids):
+            out[row['run_id']][row['step']] = row
+        return out
+
+    def compare(self, run_id: Optional[int] = None, baseline_runs: int = 10, throughput_drop: float = 0.2,
+                step_slowdown: float = 0.5, min_count: int = 5, min_units: int = 5) -> List[str]:
+        """Regressions of run_id (default: the latest) against the median of the previous runs of the same kind."""
+        with self._connect() as conn:
+            if run_id is None:
+                run = conn.execute("SELECT * FROM runs ORDER BY id DESC LIMIT 1").fetchone()
+            else:
+                run = conn.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+            if run is None:
+                return []
+            # execuções muito curtas (interrompidas, nada a processar) não entram na base
+            base = conn.execute(
+                "SELECT * FROM runs WHERE kind = ? AND id < ? AND units >= ? ORDER BY id DESC LIMIT ?",
+                (run['kind'], run['id'], min_units, baseline_runs),
+            ).fetchall()
+            steps = self._steps(conn, [run['id']] + [b['id'] for b in base])
+
+        if not base:
+            logger.info("Execução %s (%s): sem histórico anterior para comparar.", run['id'], run['kind'])
+            return []
+        if run['units'] < min_units:
+            logger.info("Execução %s: só %s unidades, sem comparação.", run['id'], run['units'])
+            return []
+
+        regressions = []
+        base_upm = statistics.median(b['units_per_min'] for b in base)
+        if base_upm and run['units_per_min'] < base_upm * (1 - throughput_drop):
+            regressions.append(f"unidades/min {run['units_per_min']:.1f} vs base {base_upm:.1f} "
+                               f"({(run['units_per_min'] / base_upm - 1) * 100:+.0f}%)")
+
+        base_timeout_rate = statistics.median(b['timeouts'] / b['units'] for b in base)
+        timeout_rate = run['timeouts'] / run['units']
+        if run['timeouts'] >= 3 and timeout_rate > 2 * base_timeout_rate:
+            regressions.append(f"timeouts {timeout_rate:.2f}/unidade vs base {base_timeout_rate:.2f}/unidade")
+
+        for step, current in sorted(steps[run['id']].items()):
+            history = [steps[b['id']][step]['p95'] for b in base
+                       if step in steps[b['id']] and steps[b['id']][step]['count'] >= min_count]
+            if current['count'] < min_count or not history:
+                continue
+            base_p95 = statistics.median(history)
+            if base_p95 > 0 and current['p95'] > base_p95 * (1 + step_slowdown):
+                regressions.append(f"passo {step}: p95 {current['p95']:.2f}s vs base {base_p95:.2f}s "
+                                   f"(p50 {current['p50']:.2f}s)")
+
+        if regressions:
+            logger.warning("Regressão na execução %s (%s) contra %s anteriores:\n  %s",
+                           run['id'], run['kind'], len(base), "\n  ".join(regressions))
+        else:
+            logger.info("Execução %s (%s) dentro da base de %s anteriores (%.1f vs %.1f unid/min).",
+                        run['id'], run['kind'], len(base), run['units_per_min'], base_upm)
+        return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Histórico de desempenho das execuções do SIAD")
+    parser.add_argument('--db', default='siad_perf_history.db')
+    sub = parser.add_subparsers(dest='command', required=True)
+    listing = sub.add_parser('list', help="Últimas execuções")
+    listing.add_argument('--kind', default=None)
+    listing.add_argument('--limit', type=int, default=20)
+    cmp = sub.add_parser('compare', help="Compara uma execução com a linha de base")
+    cmp.add_argument('--run', type=int, default=None, help="Id da execução (padrão: a mais recente)")
+    cmp.add_argument('--baseline-runs', type=int, default=10)
+    cmp.add_argument('--throughput-drop', type=float, default=0.2)
+    cmp.add_argument('--step-slowdown', type=float, default=0.5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    history = PerfHistory(args.db)
+    if args.command == 'list':
+        for run in history.runs(args.kind, args.limit):
+            print(f"{run['id']:>5} {run['kind']:<16} "
+                  f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started_at']))} "
+                  f"{run['units']:>6} unid {run['units_per_min']:>8.1f} unid/min {run['timeouts']:>5} timeouts")
+    else:
+        regressions = history.compare(args.run, args.baseline_runs, args.throughput_drop, args.step_slowdown)
+        raise SystemExit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
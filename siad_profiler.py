@@ -0,0 +1,227 @@
+"""
+Profiler por amostragem do lado Python da automação.
+
+Um thread em background lê a pilha de cada thread (sys._current_frames) a cada
+intervalo e conta pilhas "colapsadas", o formato aceito por flamegraph.pl,
+speedscope e inferno:
+
+    [cpu];[passo click_x];process_units (siad_automation_report_Version9_Copilot:1180);... 37
+
+Cada amostra é marcada com:
+- [cpu] ou [espera]: pela fração de CPU do thread na última janela de
+  cpu_window_s (50 ms, acima da resolução de ~15 ms do relógio do Windows).
+  Tempo de CPU por thread: /proc/self/task/<tid>/schedstat no Linux, psutil
+  (se instalado) ou GetThreadTimes via ctypes no Windows. Sem nenhuma fonte a
+  divisão fica desligada (aviso no início e no relatório) e as amostras, [?];
+- o passo atual do thread (siad_logging.set_log_step), então pandas/formatação
+  de strings/retries aparecem separados da espera pelo navegador;
+- a unidade atual, contada à parte (report() lista as unidades com mais CPU),
+  para não fragmentar o flamegraph em uma torre por unidade.
+
+Custo: só o thread do profiler percorre pilhas; com o intervalo padrão (10 ms)
+a automação perde bem menos que com cProfile, que instrumenta toda chamada.
+"""
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Counter, Dict, Iterable, Optional, Tuple
+
+from siad_logging import thread_log_context
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_name(code) -> str:
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{code.co_name} ({module}:{code.co_firstlineno})".replace(';', ',')
+
+
+CpuReader = Callable[[Iterable[int]], Dict[int, int]]
+
+_THREAD_QUERY_LIMITED_INFORMATION = 0x0800
+
+
+def _proc_cpu_ns(native_ids: Iterable[int]) -> Dict[int, int]:
+    out = {}
+    for native_id in native_ids:
+        try:
+            with open(f"/proc/self/task/{native_id}/schedstat") as f:
+                out[native_id] = int(f.read().split()[0])
+        except (OSError, ValueError, IndexError):
+            continue
+    return out
+
+
+def _psutil_reader() -> CpuReader:
+    process = psutil.Process()
+
+    def read(native_ids: Iterable[int]) -> Dict[int, int]:
+        wanted = set(native_ids)
+        return {t.id: int((t.user_time + t.system_time) * 1e9) for t in process.threads() if t.id in wanted}
+    return read
+
+
+def _windows_reader() -> CpuReader:
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    kernel32.OpenThread.restype = wintypes.HANDLE
+    kernel32.OpenThread.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    kernel32.GetThreadTimes.argtypes = (wintypes.HANDLE,) + (ctypes.POINTER(wintypes.FILETIME),) * 4
+    kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+
+    def ticks(ft) -> int:
+        return (ft.dwHighDateTime << 32) | ft.dwLowDateTime
+
+    def read(native_ids: Iterable[int]) -> Dict[int, int]:
+        out = {}
+        for native_id in native_ids:
+            handle = kernel32.OpenThread(_THREAD_QUERY_LIMITED_INFORMATION, False, native_id)
+            if not handle:
+                continue
+            try:
+                created, exited, kernel, user = (wintypes.FILETIME() for _ in range(4))
+                if kernel32.GetThreadTimes(handle, ctypes.byref(created), ctypes.byref(exited),
+                                           ctypes.byref(kernel), ctypes.byref(user)):
+                    out[native_id] = (ticks(kernel) + ticks(user)) * 100  # FILETIME em unidades de 100 ns
+            finally:
+                kernel32.CloseHandle(handle)
+        return out
+    return read
+
+
+def cpu_reader() -> Tuple[Optional[CpuReader], str]:
+    """Per-thread CPU time source for this platform: (reader, name), or (None, '') if there is none."""
+    if os.path.isdir(f"/proc/self/task/{threading.get_native_id()}"):
+        return _proc_cpu_ns, '/proc'
+    if psutil is not None:
+        return _psutil_reader(), 'psutil'
+    if os.name == 'nt':
+        try:
+            return _windows_reader(), 'GetThreadTimes'
+        except (OSError, AttributeError) as e:
+            logger.debug("GetThreadTimes indisponível: %s", e)
+    return None, ''
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float = 0.01, max_depth: int = 64, cpu_window_s: float = 0.05):
+        self.interval_s = interval_s
+        self.max_depth = max_depth
+        self.cpu_window_s = cpu_window_s
+        self._read_cpu, self.cpu_source = cpu_reader()
+        self.stacks: Counter[str] = collections.Counter()
+        self.unit_cpu: Counter[str] = collections.Counter()
+        self.step_samples: Dict[str, Counter[str]] = collections.defaultdict(collections.Counter)
+        self.samples = 0
+        self.elapsed_s = 0.0
+        self._last_cpu: Dict[int, tuple] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='siad-profiler', daemon=True)
+        self._thread.start()
+        logger.info("Profiler por amostragem ligado (intervalo %.0f ms, CPU por thread: %s)",
+                    self.interval_s * 1000, self.cpu_source or 'indisponível')
+        if self._read_cpu is None:
+            logger.warning("Sem fonte de tempo de CPU por thread (/proc, psutil ou GetThreadTimes): divisão "
+                           "CPU/espera desligada, todas as amostras ficam como [?]. Instale psutil para ligar.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _state(self, native_id: Optional[int], cpu: Optional[int], now: float) -> str:
+        if cpu is None:
+            return '?'
+        previous = self._last_cpu.get(native_id)
+        if previous is None:
+            self._last_cpu[native_id] = (now, cpu, '?')
+            return '?'
+        start, start_cpu, state = previous
+        # a fração de CPU só é recalculada depois de uma janela inteira (relógio de CPU grosseiro no Windows)
+        if now - start >= self.cpu_window_s:
+            busy = (cpu - start_cpu) / 1e9 / (now - start)
+            state = 'cpu' if busy >= 0.5 else 'espera'
+            self._last_cpu[native_id] = (now, cpu, state)
+        return state
+
+    def _sample(self):
+        own = threading.get_ident()
+        threads = {t.ident: t for t in threading.enumerate()}
+        cpu: Dict[int, int] = {}
+        if self._read_cpu is not None:
+            cpu = self._read_cpu([t.native_id for t in threads.values() if t.native_id is not None])
+        now = time.monotonic()
+        for ident, frame in sys._current_frames().items():
+            thread = threads.get(ident)
+            if ident == own or thread is None:
+                continue
+            frames = []
+            while frame is not None and len(frames) < self.max_depth:
+                frames.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            state = self._state(thread.native_id, cpu.get(thread.native_id), now)
+            unit, step = thread_log_context(ident)
+            tags = [f"[{state}]", f"[passo {step}]" if step else f"[thread {thread.name}]"]
+            self.stacks[';'.join(tags + frames[::-1])] += 1
+            self.step_samples[step or f"thread {thread.name}"][state] += 1
+            if unit is not None and state == 'cpu':
+                self.unit_cpu[str(unit)] += 1
+        self.samples += 1
+
+    def _run(self):
+        started = time.monotonic()
+        while not self._stop.wait(self.interval_s):
+            self.elapsed_s = time.monotonic() - started
+            try:
+                self._sample()
+            except Exception as e:
+                logger.debug("Amostra do profiler falhou: %s", e)
+
+    def write_collapsed(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info("Perfil gravado em %s (%s amostras). Flamegraph: flamegraph.pl %s > perfil.svg "
+                    "(ou abra em https://www.speedscope.app)", path, self.samples, path)
+
+    def report(self, top: int = 15):
+        # o thread do profiler disputa o GIL, então o período real entre amostras é maior que o intervalo
+        seconds = self.elapsed_s / self.samples if self.samples else self.interval_s
+        self_cpu: Counter[str] = collections.Counter()
+        for stack, count in self.stacks.items():
+            if stack.startswith('[cpu];'):
+                self_cpu[stack.rsplit(';', 1)[-1]] += count
+        lines = []
+        if self._read_cpu is None:
+            lines.append("Divisão CPU/espera desligada: sem tempo de CPU por thread (instale psutil).")
+        lines.append(f"{'passo / thread':<36} {'cpu s':>8} {'espera s':>9} {'? s':>7}")
+        ranked = sorted(self.step_samples.items(), key=lambda kv: -kv[1]['cpu'])
+        for step, states in ranked[:top]:
+            lines.append(f"{step[:36]:<36} {states['cpu'] * seconds:>8.2f} "
+                         f"{states['espera'] * seconds:>9.2f} {states['?'] * seconds:>7.2f}")
+        lines.append("Funções com mais CPU própria (amostras):")
+        lines.extend(f"  {count:>6}  {name}" for name, count in self_cpu.most_common(top))
+        if self.unit_cpu:
+            lines.append("Unidades com mais CPU (s): " + ', '.join(
+                f"{unit}={count * seconds:.2f}" for unit, count in self.unit_cpu.most_common(10)))
+        logger.info("Perfil Python (amostragem):\n%s", "\n".join(lines))
@@ -0,0 +1,562 @@
+"""
+Motor de protocolo: solicita relatórios repetindo as requisições HTTP que o
+navegador faria, sem renderizar página nenhuma.
+
+1. Gravação: uma unidade é processada pelo fluxo Selenium com captura de rede
+   (--record-protocol ARQ.har no script principal; har_from_driver lê o log
+   "performance" do Chrome via CDP) ou exportando um HAR do DevTools.
+   ATENÇÃO: o HAR contém usuário e senha em claro.
+2. Aprendizado (learn_recipe): das requisições do mesmo host (sem estáticos),
+   - usuário, senha e o código da unidade gravada viram ${usuario}, ${senha},
+     ${unit} (também na forma URL-encoded, ${...:url});
+   - valores dinâmicos (dtid, uuids de widgets do ZK, tokens) que apareceram em
+     uma resposta anterior viram variáveis extraídas dessa resposta por regex
+     (contexto à esquerda do valor na gravação), como na correlação do JMeter;
+   - requisições antes da primeira que contém a unidade formam a fase de sessão
+     (login, uma vez por sessão); o resto é a fase de unidade, repetida por
+     unidade. A requisição de solicitação é a primeira cuja resposta contém
+     confirmation_marker (ou a última).
+3. Replay (ProtocolEngine): N sessões requests.Session (conexões keep-alive),
+   uma thread por sessão puxando unidades de uma fila. Status diferente do
+   gravado ou variável não encontrada = falha; marcador de "sem acesso" = unidade
+   pulada. Falha antes da solicitação: refaz o login e tenta mais uma vez; depois
+   disso a unidade volta como 'failed' para o fluxo Selenium (fallback), sem
+   passar pelos unit_listeners (o fluxo Selenium notifica o resultado final).
+   Falha depois de enviar a solicitação = 'uncertain' (não é repetida).
+
+Conferência contra o mock local:
+    python siad_protocol.py bench --units 500 --sessions 8
+"""
+import argparse
+import base64
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote_plus, urlencode, urlparse
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except Exception:
+    requests = None
+
+logger = logging.getLogger(__name__)
+
+UNAUTHORIZED_MARKERS = ('NAO EXISTE PERFIL AUTORIZADO',)
+DEFAULT_CONFIRMATION_MARKER = r'Solicita\w*\s+registrad'
+
+_STATIC_TYPES = {'image', 'stylesheet', 'script', 'font', 'media', 'manifest', 'other'}
+_STATIC_EXT = re.compile(r'\.(js|css|png|jpe?g|gif|svg|ico|woff2?|ttf|map)(\?|$)', re.I)
+_SKIP_HEADERS = {'cookie', 'content-length', 'host', 'connection', 'accept-encoding', 'origin', 'referer'}
+_TOKEN = re.compile(r'[A-Za-z0-9_\-]{4,}')
+_PLACEHOLDER = re.compile(r'\$\{([a-z0-9_]+)(:url)?\}')
+
+
+class ProtocolError(Exception):
+    """A replayed request did not behave like the recording."""
+
+
+# -------------------------
+# Gravação
+# -------------------------
+def load_har_entries(path: str) -> List[dict]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)['log']['entries']
+
+
+def _response_text(entry: dict) -> str:
+    content = entry.get('response', {}).get('content', {}) or {}
+    text = content.get('text') or ''
+    if content.get('encoding') == 'base64':
+        try:
+            text = base64.b64decode(text).decode('utf-8', errors='replace')
+        except Exception:
+            text = ''
+    return text
+
+
+def har_from_driver(driver, path: str) -> int:
+    """
+    Builds a HAR from Chrome's performance log (driver started with
+    goog:loggingPrefs {'performance': 'ALL'}) and writes it to path.
+    Must be called before the page is closed: bodies are read with Network.getResponseBody.
+    Returns the number of entries.
+    """
+    pending: Dict[str, dict] = {}
+    done: List[dict] = []
+    for item in driver.get_log('performance'):
+        message = json.loads(item['message'])['message']
+        method, params = message.get('method'), message.get('params', {})
+        rid = params.get('requestId')
+        if method == 'Network.requestWillBeSent':
+            req = params['request']
+            post = req.get('postData')
+            if post is None and req.get('hasPostData'):
+                try:
+                    post = driver.execute_cdp_cmd('Network.getRequestPostData', {'requestId': rid}).get('postData')
+                except Exception:
+                    post = None
+            pending[rid] = {
+                '_resourceType': (params.get('type') or '').lower(),
+                'request': {
+                    'method': req['method'], 'url': req['url'],
+                    'headers': [{'name': k, 'value': v} for k, v in req.get('headers', {}).items()],
+                    'postData': {'text': post} if post is not None else None,
+                },
+                'response': {'status': 0, 'headers': [], 'content': {}},
+            }
+        elif method == 'Network.responseReceived' and rid in pending:
+            resp = params['response']
+            pending[rid]['response'].update({
+                'status': resp.get('status', 0),
+                'headers': [{'name': k, 'value': v} for k, v in resp.get('headers', {}).items()],
+            })
+            pending[rid]['response']['content']['mimeType'] = resp.get('mimeType')
+        elif method == 'Network.loadingFinished' and rid in pending:
+            entry = pending.pop(rid)
+            try:
+                body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': rid})
+                entry['response']['content'].update({
+                    'text': body.get('body'), 'encoding': 'base64' if body.get('base64Encoded') else None,
+                })
+            except Exception:
+                pass
+            done.append(entry)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'log': {'version': '1.2', 'entries': done}}, f, ensure_ascii=False)
+    logger.info("Gravação de rede salva em %s (%s requisições)", path, len(done))
+    return len(done)
+
+
+# -------------------------
+# Aprendizado
+# -------------------------
+def _is_dynamic_entry(entry: dict, host: str) -> bool:
+    req = entry['request']
+    if urlparse(req['url']).netloc != host:
+        return False
+    if req['method'] == 'GET' and (
+        _STATIC_EXT.search(req['url']) or (entry.get('_resourceType') or 'document') in _STATIC_TYPES
+    ):
+        return False
+    return True
+
+
+def _literal_pattern(value: str) -> str:
+    # não substituir dentro de números/tokens maiores
+    return r'(?<![A-Za-z0-9])' + re.escape(value) + r'(?![A-Za-z0-9])'
+
+
+def _templatize(text: str, literals: Dict[str, str]) -> str:
+    for name, value in literals.items():
+        if not value:
+            continue
+        encoded = quote_plus(value)
+        if encoded != value:
+            text = re.sub(_literal_pattern(encoded), lambda m: '${' + name + ':url}', text)
+        text = re.sub(_literal_pattern(value), lambda m: '${' + name + '}', text)
+    return text
+
+
+def _is_form(req: dict, body: Optional[str]) -> bool:
+    content_type = next((h['value'] for h in req.get('headers', []) if h['name'].lower() == 'content-type'), '')
+    return bool(body) and ('x-www-form-urlencoded' in content_type or (
+        '=' in body and not body.lstrip().startswith(('{', '['))))
+
+
+def _candidate_tokens(values: List[str]) -> List[str]:
+    tokens = []
+    for value in values:
+        for token in _TOKEN.findall(value):
+            # valores gerados pelo servidor: misturam dígitos com letras/sublinhado
+            if re.search(r'\d', token) and re.search(r'[A-Za-z_]', token) and token not in tokens:
+                tokens.append(token)
+    return tokens
+
+
+def _extractor(response_text: str, token: str) -> Optional[str]:
+    pos = response_text.find(token)
+    if pos < 0:
+        return None
+    # menor contexto que ainda identifica o valor (menos chance de incluir texto variável)
+    for width in (3, 6, 10, 16):
+        left = response_text[max(0, pos - width):pos]
+        if len(left) < 3:
+            continue
+        pattern = re.escape(left) + r'([A-Za-z0-9_\-]+)'
+        m = re.search(pattern, response_text)
+        if m and m.group(1) == token:
+            return pattern
+    return None
+
+
+def learn_recipe(entries: List[dict], unit_code: str, usuario: str, senha: str,
+                 confirmation_marker: str = DEFAULT_CONFIRMATION_MARKER) -> dict:
+    first_doc = next(e for e in entries if e['request']['method'] == 'GET')
+    host = urlparse(first_doc['request']['url']).netloc
+    entries = [e for e in entries if _is_dynamic_entry(e, host)]
+    literals = {'senha': senha, 'usuario': usuario, 'unit': str(unit_code)}
+
+    steps: List[dict] = []
+    variables: Dict[str, str] = {}  # valor gravado -> nome da variável
+    for i, entry in enumerate(entries):
+        req = entry['request']
+        body = (req.get('postData') or {}).get('text')
+        parsed = urlparse(req['url'])
+        # query e corpo de formulário são guardados decodificados (pares chave/valor) e
+        # recodificados no replay; corpo de outro tipo fica como texto
+        query = [[k, v] for k, v in parse_qsl(parsed.query, keep_blank_values=True)]
+        form = [[k, v] for k, v in parse_qsl(body, keep_blank_values=True)] if _is_form(req, body) else None
+        raw_body = body if form is None else None
+        texts = [pair for pair in query + (form or [])]
+
+        def apply(fn):
+            nonlocal raw_body
+            for pair in texts:
+                pair[1] = fn(pair[1])
+            if raw_body is not None:
+                raw_body = fn(raw_body)
+
+        tokens = _candidate_tokens([v for _, v in texts] + ([raw_body] if raw_body else []))
+        apply(lambda text: _templatize(text, literals))
+
+        for token in tokens:
+            if token in literals.values():
+                continue
+            name = variables.get(token)
+            if name is None:
+                # resposta mais recente que contém o valor
+                for j in range(i - 1, -1, -1):
+                    pattern = _extractor(_response_text(entries[j]), token)
+                    if pattern:
+                        name = variables[token] = f"v{len(variables) + 1}"
+                        steps[j]['extract'][name] = pattern
+                        break
+            if name is None:
+                continue
+            apply(lambda text: re.sub(_literal_pattern(token), '${' + name + '}', text))
+
+        steps.append({
+            'name': f"{req['method']} {parsed.path} #{i}",
+            'method': req['method'],
+            'url': parsed._replace(query='').geturl(),
+            'query': query,
+            'form': form,
+            'body': raw_body,
+            'headers': {h['name']: h['value'] for h in req.get('headers', [])
+                        if h['name'].lower() not in _SKIP_HEADERS and not h['name'].startswith(':')},
+            'status': entry['response'].get('status', 200),
+            'extract': {},
+            '_response': _response_text(entry),
+        })
+
+    unit_start = next((i for i, s in enumerate(steps) if '${unit' in json.dumps([s['query'], s['form'], s['body']])), None)
+    if unit_start is None:
+        raise ValueError(f"A unidade {unit_code} não aparece em nenhuma requisição da gravação")
+    marker = re.compile(confirmation_marker, re.I)
+    submit = next((i for i in range(unit_start, len(steps)) if marker.search(steps[i]['_response'])), len(steps) - 1)
+    for step in steps:
+        step.pop('_response')
+
+    recipe = {
+        'version': 1,
+        'recorded_unit': str(unit_code),
+        'session_steps': steps[:unit_start],
+        'unit_steps': steps[unit_start:],
+        'submit_step': submit - unit_start,
+        'unauthorized_markers': list(UNAUTHORIZED_MARKERS),
+    }
+    logger.info("Receita aprendida: %s requisições de sessão, %s por unidade, %s variáveis correlacionadas, "
+                "solicitação no passo %s",
+                unit_start, len(steps) - unit_start, len(variables), submit - unit_start)
+    return recipe
+
+
+def save_recipe(recipe: dict, path: str):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(recipe, f, ensure_ascii=False, indent=1)
+
+
+def load_recipe(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# -------------------------
+# Replay
+# -------------------------
+class ProtocolEngine:
+    def __init__(self, recipe: dict, usuario: str, senha: str, sessions: int = 4, timeout: float = 30.0):
+        if requests is None:
+            raise RuntimeError("requests não instalado (pip install requests)")
+        self.recipe = recipe
+        self.credentials = {'usuario': usuario, 'senha': senha}
+        self.sessions = sessions
+        self.timeout = timeout
+        # mesmos contratos de SIADAutomation
+        self.unit_listeners: List[Callable[[str, str, float], None]] = []
+        self.submission_listeners: List[Callable[[str, str, str], None]] = []
+        self.submit_guards: List[Callable[[str], bool]] = []
+        # job registrado nas solicitações (ReportTracker confere a listagem por job): a receita
+        # grava o relatório de inventário, o primeiro job padrão de SIADAutomation
+        self.job_name = 'inventario_patrimonios'
+
+    def _render(self, template: Optional[str], variables: Dict[str, str]) -> Optional[str]:
+        if template is None:
+            return None
+
+        def sub(m):
+            value = variables.get(m.group(1))
+            if value is None:
+                raise ProtocolError(f"variável ${{{m.group(1)}}} sem valor")
+            return quote_plus(value) if m.group(2) else value
+
+        return _PLACEHOLDER.sub(sub, template)
+
+    def _send(self, http, step: dict, variables: Dict[str, str]) -> str:
+        url = step['url']
+        if step['query']:
+            url += '?' + urlencode([(k, self._render(v, variables)) for k, v in step['query']])
+        if step['form'] is not None:
+            body = urlencode([(k, self._render(v, variables)) for k, v in step['form']])
+        else:
+            body = self._render(step['body'], variables)
+        resp = http.request(step['method'], url, headers=step['headers'],
+                            data=body.encode('utf-8') if body is not None else None,
+                            timeout=self.timeout, allow_redirects=False)
+        expected = step['status']
+        if resp.status_code != expected and not (200 <= expected < 300 and 200 <= resp.status_code < 300):
+            raise ProtocolError(f"{step['name']}: status {resp.status_code} (gravado {expected})")
+        return resp.text
+
+    def _extract(self, step: dict, text: str, variables: Dict[str, str]):
+        for name, pattern in step['extract'].items():
+            m = re.search(pattern, text)
+            if not m:
+                raise ProtocolError(f"{step['name']}: variável {name} não encontrada na resposta")
+            variables[name] = m.group(1)
+
+    def _new_session(self) -> Tuple[object, Dict[str, str]]:
+        http = requests.Session()
+        http.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        variables = dict(self.credentials)
+        for step in self.recipe['session_steps']:
+            self._extract(step, self._send(http, step, variables), variables)
+        return http, variables
+
+    def _allow_submit(self, unit_code: str) -> bool:
+        for guard in self.submit_guards:
+            try:
+                if not guard(unit_code):
+                    return False
+            except Exception as e:
+                logger.error("Verificação antes de solicitar geração falhou para %s: %s", unit_code, e)
+                return False
+        return True
+
+    def process_unit(self, http, variables: Dict[str, str], unit_code: str) -> Tuple[str, str]:
+        """
+        Replays the unit phase. Returns (outcome, confirmation text) with outcome in
+        'ok' | 'skipped' | 'unauthorized' | 'uncertain'; raises ProtocolError before submission.
+        """
+        variables = dict(variables, unit=str(unit_code))
+        submit = self.recipe['submit_step']
+        confirmation = ''
+        for i, step in enumerate(self.recipe['unit_steps']):
+            if i == submit and not self._allow_submit(unit_code):
+                return 'skipped', ''
+            if i < submit:
+                text = self._send(http, step, variables)
+                if any(marker in text for marker in self.recipe['unauthorized_markers']):
+                    return 'unauthorized', ''
+                self._extract(step, text, variables)
+                continue
+            # a partir da solicitação nada é repetido: erro aqui = resultado incerto
+            try:
+                text = self._send(http, step, variables)
+                self._extract(step, text, variables)
+            except Exception as e:
+                logger.error("Unidade %s: falha depois de enviar a solicitação (%s); não será repetida.", unit_code, e)
+                return 'uncertain', confirmation
+            if i == submit:
+                confirmation = text[:500]
+        return 'ok', confirmation
+
+    def _notify(self, unit_code: str, outcome: str, duration: float, confirmation: str):
+        if outcome == 'ok':
+            for listener in self.submission_listeners:
+                try:
+                    listener(unit_code, self.job_name, confirmation)
+                except Exception as e:
+                    logger.debug("Submission listener falhou: %s", e)
+        if outcome == 'failed':
+            # volta para o fluxo Selenium, que notifica o resultado final da unidade
+            return
+        for listener in self.unit_listeners:
+            try:
+                # 'uncertain' não é falha para o histórico (a solicitação provavelmente saiu)
+                listener(unit_code, {'uncertain': 'ok', 'unauthorized': 'skipped'}.get(outcome, outcome), duration)
+            except Exception as e:
+                logger.debug("Unit listener falhou: %s", e)
+
+    def _worker(self, work: "queue.Queue[str]", outcomes: Dict[str, str]):
+        session = None
+        while True:
+            try:
+                unit_code = work.get_nowait()
+            except queue.Empty:
+                return
+            start = time.monotonic()
+            outcome, confirmation = 'failed', ''
+            for attempt in (1, 2):
+                try:
+                    if session is None:
+                        session = self._new_session()
+                    outcome, confirmation = self.process_unit(session[0], session[1], unit_code)
+                    break
+                except Exception as e:
+                    logger.warning("Protocolo: unidade %s, tentativa %s: %s", unit_code, attempt, e)
+                    # sessão possivelmente expirada: login de novo
+                    session = None
+            outcomes[unit_code] = outcome
+            self._notify(unit_code, outcome, time.monotonic() - start, confirmation)
+
+    def run(self, unit_codes: List[str]) -> Dict[str, str]:
+        """Returns {unit_code: outcome} (see process_unit, plus 'failed'); 'failed' units should go to the Selenium flow."""
+        work: "queue.Queue[str]" = queue.Queue()
+        for code in unit_codes:
+            work.put(str(code))
+        outcomes: Dict[str, str] = {}
+        start = time.monotonic()
+        threads = [threading.Thread(target=self._worker, args=(work, outcomes), name=f"siad-protocolo-{i}", daemon=True)
+                   for i in range(max(1, min(self.sessions, len(unit_codes))))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = max(time.monotonic() - start, 1e-6)
+        counts: Dict[str, int] = {}
+        for outcome in outcomes.values():
+            counts[outcome] = counts.get(outcome, 0) + 1
+        logger.info("Motor de protocolo: %s unidades em %.1fs (%.0f un/min), resultados %s",
+                    len(outcomes), elapsed, len(outcomes) / elapsed * 60, counts)
+        return outcomes
+
+
+# -------------------------
+# Conferência contra o mock
+# -------------------------
+def record_reference_har(base_url: str, usuario: str, senha: str, unit_code: str) -> List[dict]:
+    """
+    Drives the mock page's own /zkau calls (same requests its buttons send) with
+    requests and returns them as HAR entries, standing in for a browser recording.
+    """
+    http = requests.Session()
+    entries = []
+
+    def call(method, url, body=None, headers=None):
+        resp = http.request(method, url, data=body, headers=headers or {}, allow_redirects=False)
+        entries.append({
+            '_resourceType': 'document' if method == 'GET' else 'fetch',
+            'request': {'method': method, 'url': url,
+                        'headers': [{'name': k, 'value': v} for k, v in (headers or {}).items()],
+                        'postData': {'text': body} if body is not None else None},
+            'response': {'status': resp.status_code, 'content': {'text': resp.text}},
+        })
+        return resp.text
+
+    page = call('GET', f"{base_url}/jasi-frontend/?rows=10")
+    dtid = re.search(r"dtid: '([^']+)'", page).group(1)
+    form = {'Content-Type': 'application/x-www-form-urlencoded;charset=UTF-8'}
+
+    def zkau(cmd, uuid, data):
+        body = '&'.join(f"{k}={quote_plus(v)}" for k, v in (
+            ('dtid', dtid), ('cmd_0', cmd), ('uuid_0', uuid), ('data_0', json.dumps(data, separators=(',', ':')))))
+        return json.loads(call('POST', f"{base_url}/zkau", body, form))
+
+    login = zkau('onLogin', '', {'usuario': usuario, 'senha': senha})
+    selected = zkau('onSelectUnit', login['uuid'], {'value': unit_code})
+    zkau('onSolicitar', selected['uuid'], {})
+    return entries
+
+
+def bench(units: int, sessions: int, latency_s: float) -> dict:
+    from siad_mock_server import make_server
+
+    server = make_server(0, reports=0, latency_s=latency_s)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    siad = server.RequestHandlerClass.siad
+    try:
+        entries = record_reference_har(base_url, 'usuario.teste', 's3nha&x', '1000001')
+        recipe = learn_recipe(entries, '1000001', 'usuario.teste', 's3nha&x')
+        siad.submissions.clear()
+
+        unit_codes = [str(2000000 + i) for i in range(units)]
+        start = time.monotonic()
+        outcomes = ProtocolEngine(recipe, 'usuario.teste', 's3nha&x', sessions=sessions).run(unit_codes)
+        elapsed = time.monotonic() - start
+
+        expected_ok = {u for u in unit_codes if not u.endswith('9')}
+        ok = {u for u, o in outcomes.items() if o == 'ok'}
+        mismatches = [u for u in unit_codes if siad.submissions.get(u, 0) != (1 if u in expected_ok else 0)]
+        result = {
+            'units_per_min': len(outcomes) / elapsed * 60,
+            'ok': len(ok), 'unauthorized': sum(1 for o in outcomes.values() if o == 'unauthorized'),
+            'failed': sum(1 for o in outcomes.values() if o in ('failed', 'uncertain')),
+            'server_mismatches': len(mismatches),
+        }
+        logger.info("Bench no mock: %s", result)
+        return result
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motor de protocolo do SIAD (aprender gravação / conferir no mock)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    learn = sub.add_parser('learn', help="Gera a receita a partir de uma gravação HAR")
+    learn.add_argument('--har', required=True)
+    learn.add_argument('--unit', required=True, help="Código da unidade processada na gravação")
+    learn.add_argument('--usuario', required=True)
+    learn.add_argument('--senha', required=True)
+    learn.add_argument('--confirmation-marker', default=DEFAULT_CONFIRMATION_MARKER,
+                       help="Regex do texto de confirmação na resposta da solicitação")
+    learn.add_argument('--out', default='siad_protocol_recipe.json')
+    b = sub.add_parser('bench', help="Grava, aprende e repete contra o siad_mock_server local")
+    b.add_argument('--units', type=int, default=500)
+    b.add_argument('--sessions', type=int, default=8)
+    b.add_argument('--latency', type=float, default=0.0, help="Atraso artificial por requisição no mock (s)")
+    b.add_argument('--perf-history', default='siad_perf_history.db', metavar='DB',
+                   help="Grava o resultado no histórico de desempenho e compara com os benches anteriores")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == 'learn':
+        recipe = learn_recipe(load_har_entries(args.har), args.unit, args.usuario, args.senha, args.confirmation_marker)
+        save_recipe(recipe, args.out)
+        logger.info("Receita salva em %s", args.out)
+    else:
+        started_at = time.time()
+        result = bench(args.units, args.sessions, args.latency)
+        regressions = []
+        if args.perf_history:
+            from siad_perf_history import PerfHistory
+            history = PerfHistory(args.perf_history)
+            run_id = history.record_run(f"bench-protocol-s{args.sessions}-l{args.latency:g}", {
+                'started_at': started_at, 'finished_at': time.time(), 'units': args.units,
+                'units_per_min': result['units_per_min'], 'timeouts': 0, 'steps': {},
+            }, params={'sessions': args.sessions, 'latency': args.latency})
+            regressions = history.compare(run_id)
+        ok = result['server_mismatches'] == 0 and result['failed'] == 0 and not regressions
+        raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Acompanhamento dos relatórios solicitados ao SIAD.
+
+Cada 'Solicitar geração' é registrado com o texto do diálogo de confirmação e o
+identificador da solicitação extraído dele. Periodicamente a automação lê de uma
+vez só todas as linhas da listagem de relatórios (mesma tela onde aparece
+'INVENTARIO DE PATRIMONIOS') e reconcile() marca cada solicitação como
+'completed', 'pending' ou 'failed'. Ao final, missing() devolve o que ainda não
+foi gerado nesta execução, sem precisar conferir unidade por unidade.
+
+Casamento com a listagem: pelo identificador da solicitação quando o diálogo o
+trouxe (rótulo 'número'/'protocolo'); senão pelo código da unidade, mas só em
+linhas do mesmo job com data/hora posterior à solicitação (linhas de execuções
+anteriores não marcam uma solicitação nova como concluída), uma linha por
+solicitação.
+"""
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUBMITTED = 'submitted'
+PENDING = 'pending'
+COMPLETED = 'completed'
+FAILED = 'failed'
+
+# palavras na linha da listagem que indicam a situação do relatório (texto já em maiúsculas, sem acento)
+COMPLETED_MARKERS = ('CONCLUID', 'GERADO', 'FINALIZAD', 'DISPONIVEL')
+FAILED_MARKERS = ('ERRO', 'FALH', 'CANCELAD')
+
+# aplicado ao texto normalizado do diálogo: o número vem logo após o rótulo, não é a unidade nem uma data
+DEFAULT_REQUEST_ID_PATTERN = r'(?:NUMERO|PROTOCOLO|N[O\u00ba\u00b0]\.?)\s*:?\s*(\d+)'
+_ROW_DATE_RE = re.compile(r'(\d{2})/(\d{2})/(\d{4})(?:\s+(\d{2}):(\d{2})(?::(\d{2}))?)?')
+# relógio do SIAD x relógio local
+CLOCK_TOLERANCE_S = 300
+
+
+def _normalize(text: str) -> str:
+    table = str.maketrans('ÁÀÂÃÉÊÍÓÔÕÚÇáàâãéêíóôõúç', 'AAAAEEIOOOUCaaaaeeiooouc')
+    return (text or '').translate(table).upper()
+
+
+def _row_time(row_text: str) -> Optional[float]:
+    """Latest date/time in the row as epoch (date-only values count as the end of that day)."""
+    latest = None
+    for d, m, y, hh, mm, ss in _ROW_DATE_RE.findall(row_text or ''):
+        try:
+            if hh:
+                value = time.mktime((int(y), int(m), int(d), int(hh), int(mm), int(ss or 0), 0, 0, -1))
+            else:
+                value = time.mktime((int(y), int(m), int(d), 23, 59, 59, 0, 0, -1))
+        except (OverflowError, ValueError):
+            continue
+        latest = value if latest is None else max(latest, value)
+    return latest
+
+
+class ReportTracker:
+    def __init__(self, path: str = 'siad_report_tracker.db', request_id_pattern: str = DEFAULT_REQUEST_ID_PATTERN):
+        self.path = path
+        self.request_id_re = re.compile(request_id_pattern)
+        self.run_started = time.time()
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS submissions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    unit_code TEXT NOT NULL,
+                    job TEXT NOT NULL,
+                    request_id TEXT,
+                    dialog_text TEXT,
+                    status TEXT NOT NULL,
+                    submitted_at REAL NOT NULL,
+                    checked_at REAL,
+                    listing_text TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_submissions_unit ON submissions (unit_code, job)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def extract_request_id(self, dialog_text: str) -> Optional[str]:
+        match = self.request_id_re.search(_normalize(dialog_text))
+        return match.group(1) if match else None
+
+    def record_submission(self, unit_code: str, job: str, dialog_text: str):
+        """Compatible with SIADAutomation.submission_listeners."""
+        request_id = self.extract_request_id(dialog_text)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO submissions (unit_code, job, request_id, dialog_text, status, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(unit_code), job, request_id, dialog_text, SUBMITTED, time.time()),
+            )
+        logger.info("Solicitação registrada: unidade=%s job=%s id=%s", unit_code, job, request_id or 'n/d')
+
+    def _classify(self, row_text: str) -> str:
+        text = _normalize(row_text)
+        if any(m in text for m in FAILED_MARKERS):
+            return FAILED
+        if any(m in text for m in COMPLETED_MARKERS):
+            return COMPLETED
+        return PENDING
+
+    def reconcile(self, listing_rows: List[str], job: Optional[str] = None) -> Dict[str, int]:
+        """
+        Matches open submissions of job (all jobs if None) against the listing rows
+        (one string per row). Match by request id when known, otherwise by unit code
+        in a row dated after the submission; each row matches one submission.
+        Returns a count per resulting status.
+        """
+        rows = [r for r in listing_rows if r and r.strip()]
+        row_times = [_row_time(r) for r in rows]
+        used = set()
+        now = time.time()
+        counts: Dict[str, int] = {}
+        with self._lock, self._connect() as conn:
+            query = "SELECT id, unit_code, request_id, submitted_at FROM submissions WHERE status IN (?, ?)"
+            params = [SUBMITTED, PENDING]
+            if job is not None:
+                query += " AND job = ?"
+                params.append(job)
+            # as mais recentes primeiro: a linha mais nova fica com a solicitação mais nova
+            open_items = conn.execute(query + " ORDER BY submitted_at DESC", params).fetchall()
+            for item_id, unit_code, request_id, submitted_at in open_items:
+                token = request_id or unit_code
+                pattern = re.compile(rf'(?<!\d){re.escape(token)}(?!\d)')
+                match = None
+                for i, row in enumerate(rows):
+                    if i in used or not pattern.search(row):
+                        continue
+                    if request_id is None and (row_times[i] is None
+                                               or row_times[i] < submitted_at - CLOCK_TOLERANCE_S):
+                        continue
+                    match = row
+                    used.add(i)
+                    break
+                if match is None:
+                    # ainda não aparece na listagem
+                    status, listing = PENDING, None
+                else:
+                    status, listing = self._classify(match), match
+                conn.execute(
+                    "UPDATE submissions SET status = ?, checked_at = ?, listing_text = COALESCE(?, listing_text) WHERE id = ?",
+                    (status, now, listing, item_id),
+                )
+                counts[status] = counts.get(status, 0) + 1
+        logger.info("Conferência da listagem de relatórios (%s linhas): %s", len(rows), counts)
+        return counts
+
+    def missing(self, since: Optional[float] = None) -> List[dict]:
+        """Submissions since `since` (default: this run) not completed yet (pending, failed or never checked)."""
+        since = self.run_started if since is None else since
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT unit_code, job, request_id, status, submitted_at FROM submissions "
+                "WHERE status != ? AND submitted_at >= ? ORDER BY id",
+                (COMPLETED, since),
+            ).fetchall()
+        return [
+            {'unit_code': u, 'job': j, 'request_id': r, 'status': s, 'submitted_at': t}
+            for u, j, r, s, t in rows
+        ]
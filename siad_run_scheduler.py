@@ -0,0 +1,186 @@
+"""
+Agendamento da execução pelos horários rápidos do SIAD e ritmo conforme a latência ao vivo.
+
+1. Janela de início (pick_start): com o perfil por hora do dia gravado em
+   siad_perf_history (p50 da duração por unidade e timeouts por unidade em
+   execuções anteriores do mesmo tipo), cada hora recebe um custo relativo
+   (duração / mediana das horas + peso x timeouts por unidade). Entre começar
+   agora e começar em cada hora cheia dentro do horizonte, escolhe a janela com
+   a duração prevista da execução de menor custo; só vale esperar se o ganho
+   passar de min_gain. Horas sem histórico contam com o custo mediano.
+
+2. Ritmo (LatencyPacer): recebe cada passo (step_listeners) e compara a duração
+   com a base do passo (p50 do histórico ou, sem histórico, mediana das
+   primeiras amostras da execução). O índice de latência é a mediana das razões
+   na janela recente. Na fronteira entre unidades (SIADAutomation.unit_gates):
+   - índice >= slow_factor ou algum timeout: espera entre unidades, dobrando
+     até max_delay_s;
+   - índice >= pause_factor ou pause_timeouts timeouts: pausa todas as sessões
+     por pause_s (dobra a cada pausa seguida, até max_pause_s) e mede de novo;
+   - índice <= resume_factor sem timeouts: a espera cai pela metade até zerar.
+   Ajustes no máximo a cada adjust_s, para a janela refletir o novo ritmo.
+"""
+import datetime
+import logging
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def hour_costs(profile: Dict[int, dict], timeout_weight: float = 5.0) -> Dict[int, float]:
+    """Relative cost per hour of day (1.0 = typical); hours without history get the median cost."""
+    if not profile:
+        return {hour: 1.0 for hour in range(24)}
+    typical = statistics.median(p['unit_p50'] for p in profile.values()) or 1.0
+    known = {hour: p['unit_p50'] / typical + timeout_weight * p['timeouts_per_unit'] for hour, p in profile.items()}
+    neutral = statistics.median(known.values())
+    return {hour: known.get(hour, neutral) for hour in range(24)}
+
+
+def window_cost(costs: Dict[int, float], start: datetime.datetime, duration_s: float) -> float:
+    """Average cost over [start, start + duration], weighting each hour by the time spent in it."""
+    remaining = max(duration_s, 60.0)
+    total = 0.0
+    current = start
+    while remaining > 0:
+        next_hour = current.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+        span = min(remaining, (next_hour - current).total_seconds())
+        total += costs[current.hour] * span
+        remaining -= span
+        current = next_hour
+    return total / max(duration_s, 60.0)
+
+
+def pick_start(profile: Dict[int, dict], duration_s: float, now: Optional[datetime.datetime] = None,
+               horizon_h: int = 12, min_gain: float = 0.1) -> Tuple[datetime.datetime, float, float]:
+    """Returns (start, expected cost of that window, cost of starting now)."""
+    now = now or datetime.datetime.now()
+    costs = hour_costs(profile)
+    cost_now = window_cost(costs, now, duration_s)
+    best, best_cost = now, cost_now
+    first_hour = now.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+    for h in range(horizon_h):
+        candidate = first_hour + datetime.timedelta(hours=h)
+        cost = window_cost(costs, candidate, duration_s)
+        if cost < best_cost:
+            best, best_cost = candidate, cost
+    if best is not now and best_cost > cost_now * (1 - min_gain):
+        best, best_cost = now, cost_now
+    return best, best_cost, cost_now
+
+
+def wait_until(start: datetime.datetime):
+    delay = (start - datetime.datetime.now()).total_seconds()
+    if delay <= 0:
+        return
+    logger.info("Aguardando a janela de início: %s (em %.1f h)", start.strftime('%d/%m %H:%M'), delay / 3600)
+    while delay > 0:
+        time.sleep(min(delay, 60.0))
+        delay = (start - datetime.datetime.now()).total_seconds()
+
+
+class LatencyPacer:
+    def __init__(self, baseline: Optional[Dict[str, float]] = None, window_s: float = 120.0, min_samples: int = 10,
+                 warmup: int = 20, min_step_s: float = 0.2, slow_factor: float = 2.0, pause_factor: float = 4.0,
+                 resume_factor: float = 1.3, pause_timeouts: int = 3, base_delay_s: float = 5.0,
+                 max_delay_s: float = 60.0, pause_s: float = 60.0, max_pause_s: float = 600.0,
+                 adjust_s: float = 30.0):
+        self.baseline: Dict[str, float] = dict(baseline or {})
+        self.window_s = window_s
+        self.min_samples = min_samples
+        self.warmup = warmup
+        self.min_step_s = min_step_s
+        self.slow_factor = slow_factor
+        self.pause_factor = pause_factor
+        self.resume_factor = resume_factor
+        self.pause_timeouts = pause_timeouts
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.initial_pause_s = pause_s
+        self.max_pause_s = max_pause_s
+        self.adjust_s = adjust_s
+
+        self._lock = threading.Lock()
+        self._warmup: Dict[str, list] = {}
+        self._samples: deque = deque()  # (monotonic, razão, timed_out)
+        self.delay_s = 0.0
+        self._pause_s = pause_s
+        self._pause_until = 0.0
+        self._last_adjust = 0.0
+        self.pauses = 0
+
+    def record_step(self, unit_code: Optional[str], step: str, duration: float, timed_out: bool):
+        """Compatible with SIADAutomation.step_listeners."""
+        if step == 'unit_total':
+            return
+        with self._lock:
+            base = self.baseline.get(step)
+            if base is None:
+                early = self._warmup.setdefault(step, [])
+                early.append(duration)
+                if len(early) >= self.warmup:
+                    self.baseline[step] = statistics.median(early)
+                    del self._warmup[step]
+                if not timed_out:
+                    return
+                base = duration  # timeout conta mesmo sem base
+            if base < self.min_step_s and not timed_out:
+                return
+            self._samples.append((time.monotonic(), duration / max(base, self.min_step_s), timed_out))
+
+    def _window(self, now: float) -> Tuple[Optional[float], int, int]:
+        while self._samples and self._samples[0][0] < now - self.window_s:
+            self._samples.popleft()
+        ratios = [r for _, r, _ in self._samples]
+        timeouts = sum(1 for _, _, t in self._samples if t)
+        index = statistics.median(ratios) if len(ratios) >= self.min_samples else None
+        return index, timeouts, len(ratios)
+
+    def _decide(self) -> float:
+        now = time.monotonic()
+        if now < self._pause_until:
+            return self._pause_until - now
+        if now - self._last_adjust < self.adjust_s:
+            return self.delay_s
+        index, timeouts, n = self._window(now)
+        if index is None and not timeouts:
+            return self.delay_s
+        index_txt = f"{index:.1f}x" if index is not None else "n/d"
+        if timeouts >= self.pause_timeouts or (index is not None and index >= self.pause_factor):
+            # pausa seguida da anterior (sem ter voltado ao normal): dobra
+            self._pause_s = min(self.max_pause_s, self._pause_s * 2) if self.pauses and self.delay_s else self.initial_pause_s
+            self._pause_until = now + self._pause_s
+            self.delay_s = max(self.delay_s, self.base_delay_s)
+            self._samples.clear()
+            self.pauses += 1
+            self._last_adjust = now
+            logger.warning("Latência do SIAD %s da base, %s timeouts em %.0fs: pausando %.0fs",
+                           index_txt, timeouts, self.window_s, self._pause_s)
+            return self._pause_s
+        if timeouts or (index is not None and index >= self.slow_factor):
+            new_delay = min(self.max_delay_s, max(self.base_delay_s, self.delay_s * 2))
+            if new_delay != self.delay_s:
+                logger.info("Latência do SIAD %s da base (%s timeouts): espera entre unidades %.0fs -> %.0fs",
+                            index_txt, timeouts, self.delay_s, new_delay)
+            self.delay_s = new_delay
+        elif self.delay_s and index is not None and index <= self.resume_factor:
+            new_delay = self.delay_s / 2 if self.delay_s / 2 >= self.base_delay_s else 0.0
+            logger.info("Latência do SIAD normalizada (%s): espera entre unidades %.0fs -> %.0fs",
+                        index_txt, self.delay_s, new_delay)
+            self.delay_s = new_delay
+            if not new_delay:
+                self._pause_s = self.initial_pause_s
+        self._last_adjust = now
+        return self.delay_s
+
+    def gate(self, unit_code: str):
+        """Compatible with SIADAutomation.unit_gates: blocks this session as long as the pace requires."""
+        with self._lock:
+            wait = self._decide()
+        if wait > 0:
+            logger.debug("Aguardando %.1fs antes da unidade %s", wait, unit_code)
+            time.sleep(wait)
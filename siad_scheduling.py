@@ -0,0 +1,113 @@
+"""
+Escalonamento de unidades pelo tempo esperado (LPT - Longest Processing Time first).
+
+O histórico guarda, por unidade, uma média móvel exponencial (EWMA) da duração
+observada em execuções anteriores (arquivo JSON ao lado do log). Antes da
+execução as unidades são ordenadas da mais demorada para a mais rápida; como os
+workers puxam a próxima unidade da fila quando ficam livres, isso equivale ao
+escalonamento LPT e evita que uma unidade lenta fique para o final sozinha.
+
+Unidades sem histórico recebem a mediana das conhecidas (ou default_s).
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UnitDurationHistory:
+    def __init__(self, path: str = 'siad_unit_durations.json', alpha: float = 0.4, default_s: float = 60.0):
+        self.path = path
+        self.alpha = alpha
+        self.default_s = default_s
+        self._lock = threading.Lock()
+        self._data: Dict[str, dict] = {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._data = json.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning("Histórico de durações ilegível (%s): %s. Começando vazio.", path, e)
+
+    def record(self, unit_code: str, outcome: str, duration: float):
+        """Compatible with SIADAutomation.unit_listeners. Failed and unprocessed (duration 0) units are not recorded."""
+        if outcome == 'failed' or duration <= 0:
+            return
+        with self._lock:
+            item = self._data.get(str(unit_code))
+            if item is None:
+                self._data[str(unit_code)] = {'ewma_s': duration, 'runs': 1, 'last_s': duration}
+            else:
+                item['ewma_s'] = self.alpha * duration + (1 - self.alpha) * item['ewma_s']
+                item['runs'] += 1
+                item['last_s'] = duration
+
+    def _fallback(self) -> float:
+        known = sorted(item['ewma_s'] for item in self._data.values())
+        return known[len(known) // 2] if known else self.default_s
+
+    def estimate(self, unit_code: str) -> float:
+        with self._lock:
+            item = self._data.get(str(unit_code))
+            return item['ewma_s'] if item else self._fallback()
+
+    def estimates(self, unit_codes: List[str]) -> Dict[str, float]:
+        with self._lock:
+            fallback = self._fallback()
+            return {code: self._data.get(str(code), {}).get('ewma_s', fallback) for code in unit_codes}
+
+    def save(self):
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.path)
+
+
+def lpt_order(unit_codes: List[str], history: UnitDurationHistory) -> List[str]:
+    """Longest expected first; ties keep the spreadsheet order."""
+    est = history.estimates(unit_codes)
+    return sorted(unit_codes, key=lambda code: -est[code])
+
+
+def predict_makespan(unit_codes: List[str], history: UnitDurationHistory, workers: int) -> Tuple[float, List[float]]:
+    """Simulates workers pulling units in the given order; returns (makespan_s, load per worker)."""
+    est = history.estimates(unit_codes)
+    loads = [(0.0, w) for w in range(max(1, workers))]
+    heapq.heapify(loads)
+    for code in unit_codes:
+        load, w = heapq.heappop(loads)
+        heapq.heappush(loads, (load + est[code], w))
+    per_worker = [load for load, _ in sorted(loads, key=lambda x: x[1])]
+    return max(per_worker), per_worker
+
+
+class MakespanReport:
+    """Logs predicted (spreadsheet order vs. LPT) and actual makespan for a run."""
+
+    def __init__(self, unit_codes: List[str], scheduled: List[str], history: UnitDurationHistory, workers: int):
+        self.workers = workers
+        self.predicted_original, _ = predict_makespan(unit_codes, history, workers)
+        self.predicted_lpt, _ = predict_makespan(scheduled, history, workers)
+        self._start: Optional[float] = None
+        self.actual: Optional[float] = None
+
+    def start(self):
+        self._start = time.monotonic()
+        logger.info(
+            "Makespan previsto com %s worker(s): ordem da planilha %.1f min, LPT %.1f min",
+            self.workers, self.predicted_original / 60, self.predicted_lpt / 60
+        )
+
+    def finish(self):
+        self.actual = time.monotonic() - self._start
+        erro = (self.actual - self.predicted_lpt) / self.predicted_lpt * 100 if self.predicted_lpt else 0.0
+        logger.info(
+            "Makespan: previsto %.1f min, real %.1f min (%+.1f%%)", self.predicted_lpt / 60, self.actual / 60, erro
+        )
@@ -0,0 +1,173 @@
+"""
+Compilador de seletores: valida os XPATHS e troca por localizadores mais baratos.
+
+- compile_all(): na inicialização, testa a sintaxe de todos os XPaths na página
+  atual (XPath inválido = erro imediato) e conta quantos já estão presentes.
+- Para cada chave é derivado um candidato mais barato: CSS para XPaths simples
+  de tag + atributo (placeholder, class), ou um XPath com escopo reduzido nos
+  casos conhecidos (ex.: o translate() de 'error_unidade_nao_autorizada' só
+  dentro de janelas/modais do ZK).
+- verify(): na primeira vez que a chave é encontrada, confere se o candidato
+  aponta para o MESMO elemento do XPath original; só então passa a usá-lo
+  (estratégia fica em cache para o resto da execução).
+- stale_probe(): permite falhar rápido — se o ZK ficou ocioso (sem requisições
+  AU pendentes) em todas as consultas dos últimos fail_fast_s segundos da
+  espera e o elemento não existe, nada mais vai renderizá-lo e esperar o
+  TIMEOUT inteiro é desperdício. Qualquer consulta com o ZK ocupado reinicia a
+  janela, então uma pausa curta no meio da renderização não dispara a falha.
+- report(): ao final, lista seletores que falharam ou nunca foram encontrados.
+"""
+import logging
+import re
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+
+logger = logging.getLogger(__name__)
+
+
+class SelectorStaleError(TimeoutException):
+    """Element absent while the ZK client is idle: selector most likely broken."""
+
+
+# Candidatos escritos à mão para seletores caros (validados em runtime antes do uso)
+SCOPED_CANDIDATES = {
+    'error_unidade_nao_autorizada': (
+        By.XPATH,
+        "//div[contains(@class, 'z-window') or contains(@class, 'z-messagebox')]"
+        "//span[contains(translate(., 'abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'), 'NAO EXISTE PERFIL AUTORIZADO')]",
+    ),
+}
+
+_ATTR_EQ = re.compile(r"^//([a-z0-9]+)\[@([a-z-]+)='([^']*)'\]$", re.I)
+_ATTR_CONTAINS = re.compile(r"^//([a-z0-9]+)\[contains\(@([a-z-]+),\s*'([^']*)'\)\]$", re.I)
+
+_JS_COUNT = (
+    "try { return document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null)"
+    ".snapshotLength; } catch (e) { return -1; }"
+)
+_JS_SAME = (
+    "var a = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;"
+    "var b = arguments[1] === 'css selector' ? document.querySelector(arguments[2])"
+    " : document.evaluate(arguments[2], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;"
+    "return a !== null && a === b;"
+)
+_JS_IDLE = (
+    "return document.readyState === 'complete' && !!window.zAu && !!zAu.processing && !zAu.processing();"
+)
+
+
+def derive_css(xpath: str) -> Optional[str]:
+    """CSS equivalent for //tag[@attr='v'] and //tag[contains(@attr, 'v')]; None otherwise."""
+    m = _ATTR_EQ.match(xpath)
+    if m:
+        tag, attr, value = m.groups()
+        return f"{tag}[{attr}='{value}']"
+    m = _ATTR_CONTAINS.match(xpath)
+    if m:
+        tag, attr, value = m.groups()
+        return f"{tag}[{attr}*='{value}']"
+    return None
+
+
+class SelectorCompiler:
+    def __init__(self, driver, xpaths: Dict[str, str], fail_fast_s: float = 8.0):
+        self.driver = driver
+        self.xpaths = xpaths
+        self.fail_fast_s = fail_fast_s
+        self.candidates: Dict[str, Tuple[str, str]] = {}
+        self.strategies: Dict[str, Tuple[str, str]] = {}  # chave -> localizador validado
+        self.verified = set()
+        self.resolved = set()
+        self.failures: Dict[str, int] = {}
+
+    def set_driver(self, driver):
+        # após reciclagem do navegador as estratégias validadas continuam valendo
+        self.driver = driver
+
+    def compile_all(self) -> Dict[str, int]:
+        """Checks XPath syntax and presence of every key on the current page. Raises ValueError on invalid XPath."""
+        presence: Dict[str, int] = {}
+        invalid = []
+        for key, xpath in self.xpaths.items():
+            count = self.driver.execute_script(_JS_COUNT, xpath)
+            if count == -1:
+                invalid.append(key)
+                continue
+            presence[key] = count
+            css = derive_css(xpath)
+            if css:
+                self.candidates[key] = (By.CSS_SELECTOR, css)
+            elif key in SCOPED_CANDIDATES:
+                self.candidates[key] = SCOPED_CANDIDATES[key]
+        if invalid:
+            raise ValueError(f"XPaths inválidos: {invalid}")
+        present = sorted(k for k, c in presence.items() if c)
+        logger.info(
+            "Seletores compilados: %s válidos, %s com candidato mais barato, presentes na página atual: %s",
+            len(presence), len(self.candidates), present
+        )
+        return presence
+
+    def locator(self, key_or_xpath: str) -> Tuple[str, str]:
+        if key_or_xpath in self.strategies:
+            return self.strategies[key_or_xpath]
+        return By.XPATH, self.xpaths.get(key_or_xpath, key_or_xpath)
+
+    def verify(self, key: str):
+        """Called after the original locator found the element: adopt the candidate if it points to the same node."""
+        self.resolved.add(key)
+        if key in self.verified or key not in self.candidates:
+            return
+        self.verified.add(key)
+        by, value = self.candidates[key]
+        try:
+            same = self.driver.execute_script(_JS_SAME, self.xpaths[key], by, value)
+        except Exception:
+            same = False
+        if same:
+            self.strategies[key] = (by, value)
+            logger.info("Seletor '%s' passa a usar %s: %s", key, by, value)
+        else:
+            logger.info("Candidato para '%s' não confere com o XPath original; mantendo XPath.", key)
+
+    def _is_idle(self) -> bool:
+        try:
+            return bool(self.driver.execute_script(_JS_IDLE))
+        except Exception:
+            return False
+
+    def stale_probe(self, key_or_xpath: str, clock: Callable[[], float] = time.monotonic) -> Callable[[], bool]:
+        """
+        Per-wait check, called on every poll: True once the ZK client was idle at every
+        poll for fail_fast_s and the element is still absent.
+        """
+        busy_at = clock()  # início da espera conta como ocupado
+
+        def probe() -> bool:
+            nonlocal busy_at
+            now = clock()
+            if not self._is_idle():
+                busy_at = now
+                return False
+            if now - busy_at < self.fail_fast_s:
+                return False
+            try:
+                by, value = self.locator(key_or_xpath)
+                return not self.driver.find_elements(by, value)
+            except Exception:
+                return False
+        return probe
+
+    def record_failure(self, key: str):
+        self.failures[key] = self.failures.get(key, 0) + 1
+        # um candidato validado que parou de funcionar volta para o XPath original
+        self.strategies.pop(key, None)
+
+    def report(self):
+        never = sorted(k for k in self.xpaths if k not in self.resolved)
+        if self.failures:
+            logger.warning("Seletores com falha nesta execução (possivelmente desatualizados): %s", self.failures)
+        logger.info("Seletores nunca encontrados nesta execução: %s", never)
@@ -0,0 +1,78 @@
+"""
+Escolha automática entre estratégias equivalentes (A/B com exploração).
+
+Usado para a troca de unidade: 'direct' (preenche o modal "Digite a Unidade" se
+ele já estiver aberto, senão cai no menu) e 'menu' (menu do usuário -> Alterar
+Unidade -> OK -> Alterar direto). Cada tentativa registra duração e sucesso; a
+escolha é epsilon-greedy pelo custo esperado por troca bem sucedida
+(duração média / taxa de sucesso). Enquanto alguma estratégia tem menos de
+min_trials tentativas ela é escolhida primeiro, e com probabilidade epsilon a
+escolha é aleatória, para a comparação continuar valendo se o servidor mudar.
+"""
+import logging
+import random
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StrategySelector:
+    def __init__(self, names: List[str], epsilon: float = 0.1, min_trials: int = 3, window: int = 50,
+                 rng: Optional[random.Random] = None):
+        self.names = list(names)
+        self.epsilon = epsilon
+        self.min_trials = min_trials
+        self.window = window
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, dict] = {name: {'durations': [], 'results': [], 'chosen': 0} for name in self.names}
+
+    def _cost(self, name: str) -> float:
+        item = self.stats[name]
+        if not item['durations']:
+            return float('inf')
+        mean = sum(item['durations']) / len(item['durations'])
+        success = sum(item['results']) / len(item['results'])
+        return mean / max(success, 0.05)
+
+    def choose(self) -> str:
+        with self._lock:
+            untried = [n for n in self.names if len(self.stats[n]['results']) < self.min_trials]
+            if untried:
+                name = untried[0]
+            elif self.rng.random() < self.epsilon:
+                name = self.rng.choice(self.names)
+            else:
+                name = min(self.names, key=self._cost)
+            self.stats[name]['chosen'] += 1
+            return name
+
+    def record(self, name: str, duration: float, ok: bool):
+        with self._lock:
+            item = self.stats[name]
+            item['durations'] = (item['durations'] + [duration])[-self.window:]
+            item['results'] = (item['results'] + [1 if ok else 0])[-self.window:]
+
+    def summary(self) -> Dict[str, dict]:
+        with self._lock:
+            out = {}
+            for name, item in self.stats.items():
+                n = len(item['results'])
+                out[name] = {
+                    'chosen': item['chosen'],
+                    'mean_s': sum(item['durations']) / n if n else None,
+                    'success': sum(item['results']) / n if n else None,
+                    'cost_s': self._cost(name) if n else None,
+                }
+            return out
+
+    def report(self, label: str = 'Estratégias'):
+        lines = []
+        for name, s in self.summary().items():
+            if s['mean_s'] is None:
+                lines.append(f"{name}: sem tentativas")
+            else:
+                lines.append(f"{name}: {s['chosen']} usos, média {s['mean_s']:.2f}s, sucesso {s['success'] * 100:.0f}%, "
+                             f"custo por sucesso {s['cost_s']:.2f}s")
+        logger.info("%s:\n  %s", label, "\n  ".join(lines))
@@ -0,0 +1,102 @@
+"""
+Timeouts adaptativos por passo, derivados da latência observada.
+
+Cada chave de seletor guarda uma janela das últimas latências de espera bem
+sucedidas (tempo até o elemento aparecer). Com amostras suficientes, o timeout
+da espera passa a ser percentil(p) * fator, limitado entre floor_s e o timeout
+pedido pelo chamador (que continua sendo o teto). Um passo que normalmente
+aparece em 200 ms falha em segundos; um passo lento mas saudável mantém folga.
+
+Se uma espera estoura por causa do timeout adaptativo (e não do teto), o timeout
+daquela chave dobra até a próxima espera bem sucedida: uma lentidão real do
+servidor não vira uma sequência de falhas. As janelas são salvas em JSON para a
+próxima execução já começar adaptada.
+"""
+import json
+import logging
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[idx]
+
+
+class AdaptiveTimeouts:
+    def __init__(self, path: Optional[str] = 'siad_step_latency.json', quantile: float = 0.99, factor: float = 3.0,
+                 floor_s: float = 3.0, min_samples: int = 20, window: int = 200):
+        self.path = path
+        self.quantile = quantile
+        self.factor = factor
+        self.floor_s = floor_s
+        self.min_samples = min_samples
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._backoff: Dict[str, float] = {}
+        self.adaptive_timeouts: Dict[str, int] = {}
+        if path:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for key, values in json.load(f).items():
+                        self._samples[key] = deque(values[-window:], maxlen=window)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("Histórico de latência por passo ilegível (%s): %s. Começando vazio.", path, e)
+
+    def timeout_for(self, key: str, requested: float) -> float:
+        """Adaptive timeout for key, never above the caller's requested timeout."""
+        with self._lock:
+            samples = self._samples.get(key)
+            if not samples or len(samples) < self.min_samples:
+                return requested
+            adaptive = percentile(sorted(samples), self.quantile) * self.factor * self._backoff.get(key, 1.0)
+        return min(requested, max(self.floor_s, adaptive))
+
+    def record(self, key: str, duration: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(round(duration, 3))
+            self._backoff.pop(key, None)
+
+    def record_timeout(self, key: str, effective: float, requested: float):
+        """Widens the key's timeout when it was the adaptive value (not the caller's ceiling) that expired."""
+        if effective >= requested:
+            return
+        with self._lock:
+            self._backoff[key] = self._backoff.get(key, 1.0) * 2
+            self.adaptive_timeouts[key] = self.adaptive_timeouts.get(key, 0) + 1
+        logger.info("Timeout adaptativo de '%s' (%.1fs) estourou; dobrando até a próxima espera bem sucedida.",
+                    key, effective)
+
+    def report(self):
+        with self._lock:
+            keys = sorted(self._samples)
+        lines = []
+        for key in keys:
+            with self._lock:
+                values = sorted(self._samples[key])
+            adaptive = max(self.floor_s, percentile(values, self.quantile) * self.factor)
+            lines.append(f"{key}: p50 {percentile(values, 0.5):.2f}s p99 {percentile(values, 0.99):.2f}s "
+                         f"timeout adaptativo {adaptive:.1f}s ({len(values)} amostras)")
+        if lines:
+            logger.info("Timeouts por passo:\n  %s", "\n  ".join(lines))
+        if self.adaptive_timeouts:
+            logger.warning("Estouros de timeout adaptativo por passo: %s", self.adaptive_timeouts)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {key: list(values) for key, values in self._samples.items()}
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
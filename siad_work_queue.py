@@ -0,0 +1,375 @@
+"""
+Fila de trabalho compartilhada entre várias máquinas, com leases.
+
+A lista de unidades de execute_automation é publicada uma vez (idempotente por
+run_id) e cada máquina roda um worker que:
+
+1. pega o lease de uma unidade pendente (expira em lease_s segundos);
+2. renova o lease em background (heartbeat) enquanto a unidade é processada;
+3. marca a unidade como 'submitting' imediatamente antes de clicar em
+   'Solicitar geração' (submit guard do SIADAutomation);
+4. registra o resultado final ('done', 'skipped', 'failed'). Solicitação
+   cancelada pelo submit guard conta como 'failed' (a unidade volta para
+   'pending'), nunca como 'skipped'.
+
+Garantia de não duplicidade: uma unidade só volta para 'pending' se o lease
+expirar ANTES de 'submitting'. Se a máquina morrer depois disso, a unidade vai
+para 'uncertain' e nunca é re-solicitada automaticamente — deve ser conferida
+(ex.: na listagem de relatórios do SIAD) e liberada com release_uncertain().
+complete() expira os leases vencidos antes de registrar: resultado de lease
+vencido é recusado (a unidade já voltou para a fila), exceto 'ok' de uma
+unidade que ficou 'uncertain' (a solicitação saiu de fato).
+
+Backends:
+- SQLiteWorkQueue: arquivo SQLite (pode ficar em um compartilhamento de rede;
+  em SMB/NFS o lock de arquivo precisa estar funcionando corretamente).
+- LocalWorkQueue: implementação em memória, para uma máquina só / testes.
+"""
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LEASED = 'leased'
+SUBMITTING = 'submitting'
+DONE = 'done'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+UNCERTAIN = 'uncertain'
+
+_OUTCOME_STATUS = {'ok': DONE, 'skipped': SKIPPED, 'failed': FAILED}
+
+
+def _may_complete(status: str, lease_until: Optional[float], outcome: str, now: float) -> bool:
+    # o próprio host só resolve uma unidade 'uncertain' (lease expirado depois de solicitar) confirmando o envio
+    if status == UNCERTAIN:
+        return outcome == 'ok'
+    return status in (LEASED, SUBMITTING) and lease_until is not None and lease_until >= now
+
+
+class WorkQueue:
+    """Interface for queue backends. All methods must be safe across hosts/threads."""
+
+    def publish(self, run_id: str, unit_codes: List[str]) -> int:
+        raise NotImplementedError
+
+    def acquire(self, run_id: str, host: str, lease_s: float) -> Optional[str]:
+        raise NotImplementedError
+
+    def heartbeat(self, run_id: str, unit_code: str, host: str, lease_s: float) -> bool:
+        raise NotImplementedError
+
+    def mark_submitting(self, run_id: str, unit_code: str, host: str) -> bool:
+        raise NotImplementedError
+
+    def complete(self, run_id: str, unit_code: str, host: str, outcome: str, detail: str = '') -> bool:
+        raise NotImplementedError
+
+    def release_uncertain(self, run_id: str, unit_code: str, submitted: bool) -> bool:
+        raise NotImplementedError
+
+    def summary(self, run_id: str) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class SQLiteWorkQueue(WorkQueue):
+    def __init__(self, path: str, max_attempts: int = 3, busy_timeout_s: float = 30.0):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.busy_timeout_s = busy_timeout_s
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS units (
+                    run_id TEXT NOT NULL,
+                    unit_code TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    status TEXT NOT NULL,
+                    host TEXT,
+                    lease_until REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    detail TEXT,
+                    updated_at REAL,
+                    PRIMARY KEY (run_id, unit_code)
+                )
+            """)
+
+    def _connect(self) -> "_Transaction":
+        # uma conexão por operação: seguro entre threads e não segura lock do arquivo na rede
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_s, isolation_level=None)
+        return _Transaction(conn)
+
+    def publish(self, run_id: str, unit_codes: List[str]) -> int:
+        now = time.time()
+        with self._connect() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO units (run_id, unit_code, seq, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(run_id, str(code), i, PENDING, now) for i, code in enumerate(unit_codes)],
+            )
+            return conn.total_changes - before
+
+    def _expire_leases(self, conn, run_id: str, now: float):
+        # lease expirado depois de 'Solicitar geração' -> nunca re-solicitar automaticamente
+        conn.execute(
+            "UPDATE units SET status = ?, updated_at = ? WHERE run_id = ? AND status = ? AND lease_until < ?",
+            (UNCERTAIN, now, run_id, SUBMITTING, now),
+        )
+        conn.execute(
+            "UPDATE units SET status = ?, host = NULL, lease_until = NULL, updated_at = ? "
+            "WHERE run_id = ? AND status = ? AND lease_until < ?",
+            (PENDING, now, run_id, LEASED, now),
+        )
+
+    def acquire(self, run_id: str, host: str, lease_s: float) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            self._expire_leases(conn, run_id, now)
+            row = conn.execute(
+                "SELECT unit_code FROM units WHERE run_id = ? AND status = ? AND attempts < ? ORDER BY seq LIMIT 1",
+                (run_id, PENDING, self.max_attempts),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE units SET status = ?, host = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE run_id = ? AND unit_code = ?",
+                (LEASED, host, now + lease_s, now, run_id, row[0]),
+            )
+            return row[0]
+
+    def heartbeat(self, run_id: str, unit_code: str, host: str, lease_s: float) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE units SET lease_until = ?, updated_at = ? "
+                "WHERE run_id = ? AND unit_code = ? AND host = ? AND status IN (?, ?) AND lease_until >= ?",
+                (now + lease_s, now, run_id, unit_code, host, LEASED, SUBMITTING, now),
+            )
+            return cur.rowcount == 1
+
+    def mark_submitting(self, run_id: str, unit_code: str, host: str) -> bool:
+        # também aceita SUBMITTING: vários relatórios são solicitados na mesma seleção de unidade
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE units SET status = ?, updated_at = ? "
+                "WHERE run_id = ? AND unit_code = ? AND host = ? AND status IN (?, ?) AND lease_until >= ?",
+                (SUBMITTING, now, run_id, unit_code, host, LEASED, SUBMITTING, now),
+            )
+            return cur.rowcount == 1
+
+    def complete(self, run_id: str, unit_code: str, host: str, outcome: str, detail: str = '') -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            self._expire_leases(conn, run_id, now)
+            row = conn.execute(
+                "SELECT status, lease_until FROM units WHERE run_id = ? AND unit_code = ? AND host = ?",
+                (run_id, unit_code, host),
+            ).fetchone()
+            if row is None or not _may_complete(row[0], row[1], outcome, now):
+                return False
+            status = _OUTCOME_STATUS.get(outcome, FAILED)
+            if status == FAILED:
+                # falha antes de solicitar -> pode tentar de novo; depois -> incerto
+                status = UNCERTAIN if row[0] in (SUBMITTING, UNCERTAIN) else PENDING
+            conn.execute(
+                "UPDATE units SET status = ?, host = CASE WHEN ? = ? THEN NULL ELSE host END, "
+                "lease_until = NULL, detail = ?, updated_at = ? WHERE run_id = ? AND unit_code = ?",
+                (status, status, PENDING, detail, now, run_id, unit_code),
+            )
+            return True
+
+    def release_uncertain(self, run_id: str, unit_code: str, submitted: bool) -> bool:
+        now = time.time()
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE units SET status = ?, host = NULL, lease_until = NULL, updated_at = ? "
+                "WHERE run_id = ? AND unit_code = ? AND status = ?",
+                (DONE if submitted else PENDING, now, run_id, unit_code, UNCERTAIN),
+            )
+            return cur.rowcount == 1
+
+    def summary(self, run_id: str) -> Dict[str, int]:
+        with self._connect() as conn:
+            self._expire_leases(conn, run_id, time.time())
+            rows = conn.execute("SELECT status, COUNT(*) FROM units WHERE run_id = ? GROUP BY status", (run_id,)).fetchall()
+        return dict(rows)
+
+
+class _Transaction:
+    """Context manager: BEGIN IMMEDIATE on enter, COMMIT/ROLLBACK and close on exit."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.conn.close()
+        return False
+
+
+class LocalWorkQueue(WorkQueue):
+    """In-memory stand-in with the same state machine as SQLiteWorkQueue."""
+
+    def __init__(self, max_attempts: int = 3):
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._units: Dict[str, Dict[str, dict]] = {}
+
+    def publish(self, run_id: str, unit_codes: List[str]) -> int:
+        with self._lock:
+            run = self._units.setdefault(run_id, {})
+            added = 0
+            for code in unit_codes:
+                code = str(code)
+                if code not in run:
+                    run[code] = {'seq': len(run), 'status': PENDING, 'host': None, 'lease_until': None, 'attempts': 0, 'detail': ''}
+                    added += 1
+            return added
+
+    def _expire_leases(self, run: Dict[str, dict], now: float):
+        for item in run.values():
+            if item['lease_until'] is not None and item['lease_until'] < now:
+                if item['status'] == SUBMITTING:
+                    item['status'] = UNCERTAIN
+                elif item['status'] == LEASED:
+                    item.update(status=PENDING, host=None, lease_until=None)
+
+    def acquire(self, run_id: str, host: str, lease_s: float) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            run = self._units.get(run_id, {})
+            self._expire_leases(run, now)
+            candidates = [(item['seq'], code) for code, item in run.items()
+                          if item['status'] == PENDING and item['attempts'] < self.max_attempts]
+            if not candidates:
+                return None
+            code = min(candidates)[1]
+            item = run[code]
+            item.update(status=LEASED, host=host, lease_until=now + lease_s, attempts=item['attempts'] + 1)
+            return code
+
+    def _owned(self, run_id: str, unit_code: str, host: str, statuses) -> Optional[dict]:
+        item = self._units.get(run_id, {}).get(unit_code)
+        if item is None or item['host'] != host or item['status'] not in statuses:
+            return None
+        return item
+
+    def heartbeat(self, run_id: str, unit_code: str, host: str, lease_s: float) -> bool:
+        now = time.time()
+        with self._lock:
+            item = self._owned(run_id, unit_code, host, (LEASED, SUBMITTING))
+            if item is None or item['lease_until'] < now:
+                return False
+            item['lease_until'] = now + lease_s
+            return True
+
+    def mark_submitting(self, run_id: str, unit_code: str, host: str) -> bool:
+        with self._lock:
+            item = self._owned(run_id, unit_code, host, (LEASED, SUBMITTING))
+            if item is None or item['lease_until'] < time.time():
+                return False
+            item['status'] = SUBMITTING
+            return True
+
+    def complete(self, run_id: str, unit_code: str, host: str, outcome: str, detail: str = '') -> bool:
+        now = time.time()
+        with self._lock:
+            self._expire_leases(self._units.get(run_id, {}), now)
+            item = self._owned(run_id, unit_code, host, (LEASED, SUBMITTING, UNCERTAIN))
+            if item is None or not _may_complete(item['status'], item['lease_until'], outcome, now):
+                return False
+            status = _OUTCOME_STATUS.get(outcome, FAILED)
+            if status == FAILED:
+                status = UNCERTAIN if item['status'] in (SUBMITTING, UNCERTAIN) else PENDING
+            item.update(status=status, lease_until=None, detail=detail)
+            if status == PENDING:
+                item['host'] = None
+            return True
+
+    def release_uncertain(self, run_id: str, unit_code: str, submitted: bool) -> bool:
+        with self._lock:
+            item = self._units.get(run_id, {}).get(unit_code)
+            if item is None or item['status'] != UNCERTAIN:
+                return False
+            item.update(status=DONE if submitted else PENDING, host=None, lease_until=None)
+            return True
+
+    def summary(self, run_id: str) -> Dict[str, int]:
+        with self._lock:
+            run = self._units.get(run_id, {})
+            self._expire_leases(run, time.time())
+            counts: Dict[str, int] = {}
+            for item in run.values():
+                counts[item['status']] = counts.get(item['status'], 0) + 1
+            return counts
+
+
+class LeaseWorker:
+    """
+    Binds one SIADAutomation session to a WorkQueue: yields leased units to
+    process_units, heartbeats the current lease and records outcomes.
+    """
+
+    def __init__(self, work_queue: WorkQueue, run_id: str, host: Optional[str] = None,
+                 lease_s: float = 300.0, heartbeat_s: Optional[float] = None):
+        self.queue = work_queue
+        self.run_id = run_id
+        self.host = host or f"{socket.gethostname()}-{threading.get_ident()}"
+        self.lease_s = lease_s
+        self.heartbeat_s = heartbeat_s or lease_s / 3
+        self._current: Optional[str] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.heartbeat_s):
+            with self._lock:
+                unit = self._current
+            if unit and not self.queue.heartbeat(self.run_id, unit, self.host, self.lease_s):
+                logger.warning("Lease da unidade %s perdido por %s.", unit, self.host)
+
+    def units(self) -> Iterator[str]:
+        while not self._stop.is_set():
+            unit = self.queue.acquire(self.run_id, self.host, self.lease_s)
+            if unit is None:
+                return
+            with self._lock:
+                self._current = unit
+            yield unit
+
+    def submit_guard(self, unit_code: str) -> bool:
+        """SIADAutomation.submit_guards hook: only submit while we still own the lease."""
+        return self.queue.mark_submitting(self.run_id, unit_code, self.host)
+
+    def on_unit_done(self, unit_code: str, outcome: str, duration: float):
+        """SIADAutomation.unit_listeners hook."""
+        with self._lock:
+            self._current = None
+        if not self.queue.complete(self.run_id, unit_code, self.host, outcome, detail=f"{duration:.1f}s"):
+            logger.warning("Resultado de %s não registrado (lease não pertence mais a %s).", unit_code, self.host)
+
+    def run(self, automation_factory: Callable[[], object]):
+        automation = automation_factory()
+        automation.submit_guards.append(self.submit_guard)
+        automation.unit_listeners.append(self.on_unit_done)
+        beat = threading.Thread(target=self._heartbeat_loop, name="siad-heartbeat", daemon=True)
+        beat.start()
+        try:
+            automation.process_units(self.units())
+        finally:
+            self._stop.set()
+            automation.close()
+            beat.join()
+        logger.info("Worker %s finalizado. Situação da fila: %s", self.host, self.queue.summary(self.run_id))
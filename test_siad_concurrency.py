@@ -0,0 +1,107 @@
+import threading
+
+from siad_concurrency import AIMDGovernor, run_multi_session
+
+
+def _window(governor, steps, units=5, timeouts=0):
+    for step, duration, count in steps:
+        for i in range(count):
+            governor.record_step('100', step, duration, timed_out=i < timeouts)
+    for _ in range(units):
+        governor.record_step('100', 'unit_total', 1.0, False)
+    return governor.evaluate()
+
+
+def test_increases_while_throughput_grows_then_halves_on_latency():
+    governor = AIMDGovernor(max_sessions=4, initial_sessions=1)
+    assert _window(governor, [('click', 1.0, 10)], units=5) == 2
+    assert _window(governor, [('click', 1.0, 10)], units=10) == 3
+    # p90 do passo 3x a base: congestionado
+    assert _window(governor, [('click', 3.0, 10)], units=10) == 1
+    assert governor.history[-1]['decision'] == 'decrease'
+
+
+def test_timeouts_count_as_congestion():
+    governor = AIMDGovernor(max_sessions=4, initial_sessions=2)
+    assert _window(governor, [('click', 1.0, 10)], timeouts=2) == 1
+
+
+def test_one_fast_window_does_not_pin_the_baseline():
+    governor = AIMDGovernor(max_sessions=4, initial_sessions=4, probe_after_holds=100)
+    _window(governor, [('click', 1.0, 10)], units=10)
+    _window(governor, [('click', 0.3, 10)], units=10)  # janela anormalmente rápida
+    for _ in range(10):
+        _window(governor, [('click', 1.0, 10)], units=10)
+    assert all(r['decision'] != 'decrease' for r in governor.history[2:])
+    assert governor.history[-1]['latency_ratio'] < governor.latency_factor
+
+
+def test_baseline_follows_a_persistent_new_level():
+    governor = AIMDGovernor(max_sessions=4, initial_sessions=4, probe_after_holds=100)
+    _window(governor, [('click', 0.3, 10)], units=10)  # primeira janela rápida demais
+    for _ in range(30):
+        _window(governor, [('click', 1.0, 10)], units=10)
+    # a base subiu até o nível normal: não fica reduzindo para sempre
+    assert governor.history[-1]['decision'] != 'decrease'
+    assert governor.limit > governor.min_sessions
+
+
+def test_baseline_is_per_step():
+    governor = AIMDGovernor(max_sessions=4, initial_sessions=2)
+    _window(governor, [('click', 0.2, 10), ('wait_relatorio', 8.0, 10)], units=5)
+    # mesma mistura de passos em outra proporção: nenhum passo ficou mais lento
+    _window(governor, [('click', 0.2, 5), ('wait_relatorio', 8.0, 20)], units=10)
+    assert governor.history[-1]['decision'] != 'decrease'
+    assert governor.history[-1]['latency_ratio'] == 1.0
+
+
+def test_steps_with_few_samples_are_ignored():
+    governor = AIMDGovernor(max_sessions=4, initial_sessions=2, min_step_samples=5)
+    _window(governor, [('click', 1.0, 10)])
+    _window(governor, [('click', 1.0, 10), ('raro', 50.0, 2)])
+    assert governor.history[-1]['latency_ratio'] == 1.0
+
+
+class _FakeAutomation:
+    def __init__(self, processed, crash):
+        self.step_listeners = []
+        self.processed = processed
+        self.crash = crash
+
+    def process_units(self, units):
+        for unit in units:
+            if self.crash:
+                raise RuntimeError('navegador caiu')
+            self.processed.append(unit)
+
+    def close(self):
+        pass
+
+
+def test_crashed_session_is_replaced():
+    processed = []
+    created = []
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            created.append(1)
+            return _FakeAutomation(processed, crash=len(created) == 1)
+
+    governor = AIMDGovernor(max_sessions=1, initial_sessions=1)
+    run_multi_session([str(i) for i in range(5)], factory, governor, poll_s=0.01)
+    # a unidade em andamento na sessão que caiu se perde; as demais vão para a substituta
+    assert len(created) == 2
+    assert processed == ['1', '2', '3', '4']
+
+
+def test_restarts_are_bounded():
+    created = []
+
+    def factory():
+        created.append(1)
+        return _FakeAutomation([], crash=True)
+
+    governor = AIMDGovernor(max_sessions=1, initial_sessions=1)
+    run_multi_session([str(i) for i in range(10)], factory, governor, poll_s=0.01, max_restarts=2)
+    assert len(created) == 3
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip('urllib3')
+
+from siad_downloader import (  # noqa: E402
+    DownloadItem, DownloadResult, ReportDownloader, items_from_links, safe_filename, unit_in_text,
+)
+
+BASE = 'https://siad.example/siad/relatorios.zul'
+
+
+def test_safe_filename_strips_directories_and_unsafe_chars():
+    assert safe_filename('../../etc/passwd') == 'passwd'
+    assert safe_filename('C:\\\\temp\\\\rel atório?.xlsx') == 'rel_atório_.xlsx'
+    assert safe_filename('..') == 'relatorio'
+    assert DownloadItem(url='u', filename='a/../b.csv').filename == 'b.csv'
+
+
+def test_unit_in_text_matches_whole_codes_longest_first():
+    codes = ['12', '1234', '20']
+    assert unit_in_text('Relatório 1234 - INVENTARIO', codes) == '1234'
+    assert unit_in_text('Unidade 12 - CONCLUIDO', codes) == '12'
+    # não casa dentro de datas, números de solicitação ou códigos maiores
+    assert unit_in_text('01/12/2024 10:20 Solicitação 81234', codes) is None
+    assert unit_in_text('', codes) is None
+
+
+def test_query_links_get_distinct_names_and_unit_prefix():
+    links = [
+        {'href': 'download?id=1', 'unit_code': '100', 'version': '01/02/2024 10:00', 'job': 'inv'},
+        {'href': 'download?id=2', 'unit_code': '100', 'version': '01/02/2024 10:00', 'job': 'mov'},
+        {'href': '/arquivos/rel.xlsx', 'filename': '../rel.xlsx', 'unit_code': '200'},
+    ]
+    items = items_from_links(links, BASE)
+    names = [i.filename for i in items]
+    assert len(set(names)) == 3
+    assert all(n.startswith('100_download_') for n in names[:2])
+    assert names[2] == '200_rel.xlsx'
+    assert items[2].url == 'https://siad.example/arquivos/rel.xlsx'
+    assert [i.job for i in items[:2]] == ['inv', 'mov']
+
+
+def test_same_name_keeps_newest_version():
+    links = [
+        {'href': 'a.xlsx', 'filename': 'rel.xlsx', 'unit_code': '100', 'version': '02/01/2024 09:00'},
+        {'href': 'b.xlsx', 'filename': 'rel.xlsx', 'unit_code': '100', 'version': '01/02/2024 08:00'},
+        {'href': 'c.xlsx', 'filename': 'rel.xlsx', 'unit_code': '100', 'version': '15/01/2024 23:00'},
+    ]
+    items = items_from_links(links, BASE)
+    assert len(items) == 1
+    assert items[0].url.endswith('/b.xlsx')
+
+
+def test_download_all_refuses_duplicate_names(tmp_path, monkeypatch):
+    downloader = ReportDownloader(str(tmp_path))
+    calls = []
+
+    def fake_download(item):
+        calls.append(item)
+        return DownloadResult(item, 'downloaded')
+
+    monkeypatch.setattr(downloader, '_download_one', fake_download)
+    items = [DownloadItem(url='u1', filename='100_rel.xlsx'), DownloadItem(url='u2', filename='100_rel.xlsx')]
+    results = downloader.download_all(items)
+    assert [i.url for i in calls] == ['u1']
+    assert sorted(r.status for r in results) == ['downloaded', 'failed']
@@ -0,0 +1,97 @@
+import json
+import os
+
+import pytest
+
+from siad_incremental import DAY_S, IncrementalState
+
+
+def _state(tmp_path, units=None, **kwargs):
+    path = tmp_path / 'estado.json'
+    if units is not None:
+        path.write_text(json.dumps(units), encoding='utf-8')
+    return IncrementalState(str(path), **kwargs)
+
+
+def test_never_requested_is_due(tmp_path):
+    state = _state(tmp_path)
+    assert state.is_due('100', now=1000.0)
+
+
+def test_without_hash_waits_min_days(tmp_path):
+    now = 100 * DAY_S
+    state = _state(tmp_path, {'100': {'requested_at': now - 0.5 * DAY_S}}, min_days=1.0)
+    assert not state.is_due('100', now)
+    assert state.is_due('100', now + DAY_S)
+
+
+def test_interval_is_half_the_stable_time_within_bounds(tmp_path):
+    now = 100 * DAY_S
+    state = _state(tmp_path, {
+        'estavel': {'reports': {'inv': {'hash': 'a', 'changed_at': now - 20 * DAY_S}}},
+        'antigo': {'reports': {'inv': {'hash': 'a', 'changed_at': now - 90 * DAY_S}}},
+        'recente': {'reports': {'inv': {'hash': 'a', 'changed_at': now - DAY_S}}},
+    }, min_days=1.0, max_days=30.0)
+    assert state.interval_s('estavel', now) == 10 * DAY_S
+    assert state.interval_s('antigo', now) == 30 * DAY_S
+    assert state.interval_s('recente', now) == DAY_S
+
+
+def test_most_recent_change_of_any_job_counts(tmp_path):
+    now = 100 * DAY_S
+    state = _state(tmp_path, {'100': {'reports': {
+        'inv': {'hash': 'a', 'changed_at': now - 40 * DAY_S},
+        'mov': {'hash': 'b', 'changed_at': now - 4 * DAY_S},
+    }}})
+    assert state.interval_s('100', now) == 2 * DAY_S
+
+
+def test_legacy_state_is_migrated(tmp_path):
+    state = _state(tmp_path, {'100': {'hash': 'a', 'changed_at': 5.0, 'requested_at': 6.0}})
+    assert state.units['100'] == {'requested_at': 6.0, 'reports': {'': {'hash': 'a', 'changed_at': 5.0}}}
+
+
+def test_only_ok_outcomes_count_as_requests(tmp_path):
+    state = _state(tmp_path)
+    state.record_request('100', 'failed', 1.0)
+    state.record_request('200', 'ok', 1.0)
+    assert '100' not in state.units and state.units['200']['requested_at']
+
+
+def test_regenerated_report_keeps_its_hash(tmp_path):
+    pytest.importorskip('pandas')
+    from siad_incremental import content_hash
+
+    first, second, changed = tmp_path / '100_a.csv', tmp_path / '100_b.csv', tmp_path / '100_c.csv'
+    first.write_text("Patrimonio;Descricao;Data Emissao\n1;Mesa;01/02/2024 10:00\n2;Cadeira;01/02/2024 10:00\n",
+                     encoding='utf-8')
+    second.write_text("Descricao;Patrimonio;Data Emissao\nCadeira;2;03/04/2024 11:30\nMesa;1;03/04/2024 11:30\n",
+                      encoding='utf-8')
+    changed.write_text("Patrimonio;Descricao;Data Emissao\n1;Mesa;01/02/2024 10:00\n3;Armario;01/02/2024 10:00\n",
+                       encoding='utf-8')
+    assert content_hash(str(first)) == content_hash(str(second))
+    assert content_hash(str(first)) != content_hash(str(changed))
+    assert content_hash(str(tmp_path / 'relatorio.pdf')) is None
+
+
+def test_downloads_are_hashed_per_unit_and_job(tmp_path):
+    pytest.importorskip('pandas')
+    downloads = tmp_path / 'baixados'
+    downloads.mkdir()
+    (downloads / '100_inv.csv').write_text("Patrimonio;Descricao\n1;Mesa\n", encoding='utf-8')
+    (downloads / '100_mov.csv').write_text("Movimento;Destino\n7;200\n", encoding='utf-8')
+    os.utime(downloads / '100_mov.csv', (2e9, 2e9))
+    (downloads / '_downloads.json').write_text(json.dumps({
+        '100_inv.csv': {'unit_code': '100', 'job': 'inventario'},
+        '100_mov.csv': {'unit_code': '100', 'job': 'movimentacao'},
+    }), encoding='utf-8')
+
+    state = _state(tmp_path)
+    state.update_from_downloads(str(downloads))
+    hashes = {job: r['hash'] for job, r in state.units['100']['reports'].items()}
+    assert set(hashes) == {'inventario', 'movimentacao'}
+
+    # reprocessar os mesmos arquivos não conta como mudança de nenhum dos dois tipos
+    changed_at = {job: r['changed_at'] for job, r in state.units['100']['reports'].items()}
+    state.update_from_downloads(str(downloads))
+    assert {job: r['changed_at'] for job, r in state.units['100']['reports'].items()} == changed_at
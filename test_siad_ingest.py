@@ -0,0 +1,17 @@
+import os
+
+import pytest
+
+pytest.importorskip('pandas')
+
+from siad_ingest import parquet_files_for
+
+
+def test_parquet_files_match_the_exact_stem(tmp_path):
+    partition = tmp_path / 'run_date=2024-01-01' / 'unit_code=123'
+    partition.mkdir(parents=True)
+    for name in ('123_rel-0.parquet', '123_rel-1.parquet', '123_rel-2-0.parquet', '123_rel-x.parquet'):
+        (partition / name).write_bytes(b'')
+    found = sorted(os.path.basename(f) for f in parquet_files_for(str(tmp_path), '123_rel'))
+    assert found == ['123_rel-0.parquet', '123_rel-1.parquet']
+    assert [os.path.basename(f) for f in parquet_files_for(str(tmp_path), '123_rel-2')] == ['123_rel-2-0.parquet']
@@ -0,0 +1,70 @@
+import time
+
+import siad_report_tracker
+from siad_report_tracker import COMPLETED, FAILED, PENDING, SUBMITTED, ReportTracker
+
+SUBMITTED_AT = time.mktime((2024, 3, 10, 14, 0, 0, 0, 0, -1))
+
+
+def _stamp(offset_s):
+    return time.strftime('%d/%m/%Y %H:%M', time.localtime(SUBMITTED_AT + offset_s))
+
+
+def _tracker(tmp_path, monkeypatch):
+    monkeypatch.setattr(siad_report_tracker.time, 'time', lambda: SUBMITTED_AT)
+    tracker = ReportTracker(str(tmp_path / 'tracker.db'))
+    tracker.run_started = SUBMITTED_AT - 60
+    return tracker
+
+
+def test_extract_request_id_ignores_unit_and_dates(tmp_path, monkeypatch):
+    tracker = _tracker(tmp_path, monkeypatch)
+    assert tracker.extract_request_id("Unidade 1234 - solicitação número: 98765 em 10/03/2024") == '98765'
+    assert tracker.extract_request_id("Relatório da unidade 1234 solicitado") is None
+
+
+def test_matches_by_request_id(tmp_path, monkeypatch):
+    tracker = _tracker(tmp_path, monkeypatch)
+    tracker.record_submission('100', 'inventario', 'Protocolo: 555')
+    tracker.record_submission('200', 'inventario', 'Protocolo: 556')
+    counts = tracker.reconcile([
+        f"5550 INVENTARIO 100 {_stamp(60)} CONCLUIDO",  # outro número que contém 555
+        f"555 INVENTARIO 100 {_stamp(60)} CONCLUÍDO",
+        f"556 INVENTARIO 200 {_stamp(60)} ERRO NA GERAÇÃO",
+    ])
+    assert counts == {COMPLETED: 1, FAILED: 1}
+    assert [(m['unit_code'], m['status']) for m in tracker.missing()] == [('200', FAILED)]
+
+
+def test_unit_match_ignores_rows_from_before_the_submission(tmp_path, monkeypatch):
+    tracker = _tracker(tmp_path, monkeypatch)
+    tracker.record_submission('100', 'inventario', 'Solicitação enviada')
+    counts = tracker.reconcile([f"INVENTARIO 100 {_stamp(-86400)} CONCLUIDO"])
+    assert counts == {PENDING: 1}
+    counts = tracker.reconcile([f"INVENTARIO 100 {_stamp(-86400)} CONCLUIDO",
+                                f"INVENTARIO 100 {_stamp(120)} GERADO"])
+    assert counts == {COMPLETED: 1}
+    assert tracker.missing() == []
+
+
+def test_unit_code_must_match_whole_number(tmp_path, monkeypatch):
+    tracker = _tracker(tmp_path, monkeypatch)
+    tracker.record_submission('100', 'inventario', 'Solicitação enviada')
+    assert tracker.reconcile([f"INVENTARIO 1001 {_stamp(60)} CONCLUIDO"]) == {PENDING: 1}
+
+
+def test_each_row_matches_one_submission(tmp_path, monkeypatch):
+    tracker = _tracker(tmp_path, monkeypatch)
+    tracker.record_submission('100', 'inventario', 'Solicitação enviada')
+    tracker.record_submission('100', 'inventario', 'Solicitação enviada')
+    counts = tracker.reconcile([f"INVENTARIO 100 {_stamp(60)} CONCLUIDO"])
+    assert counts == {COMPLETED: 1, PENDING: 1}
+
+
+def test_reconcile_only_touches_the_given_job(tmp_path, monkeypatch):
+    tracker = _tracker(tmp_path, monkeypatch)
+    tracker.record_submission('100', 'inventario', 'Solicitação enviada')
+    tracker.record_submission('100', 'movimentacao', 'Solicitação enviada')
+    assert tracker.reconcile([f"MOVIMENTACAO 100 {_stamp(60)} CONCLUIDO"], job='movimentacao') == {COMPLETED: 1}
+    missing = tracker.missing()
+    assert [(m['job'], m['status']) for m in missing] == [('inventario', SUBMITTED)]
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from siad_work_queue import LocalWorkQueue, SQLiteWorkQueue, LeaseWorker
+
+
+@pytest.fixture(params=['local', 'sqlite'])
+def work_queue(request, tmp_path):
+    if request.param == 'local':
+        return LocalWorkQueue()
+    return SQLiteWorkQueue(str(tmp_path / 'fila.db'))
+
+
+def test_done_and_skipped_are_final(work_queue):
+    work_queue.publish('r1', ['1', '2'])
+    assert work_queue.acquire('r1', 'a', 60) == '1'
+    assert work_queue.complete('r1', '1', 'a', 'ok')
+    assert work_queue.acquire('r1', 'a', 60) == '2'
+    assert work_queue.complete('r1', '2', 'a', 'skipped')
+    assert work_queue.acquire('r1', 'a', 60) is None
+    assert work_queue.summary('r1') == {'done': 1, 'skipped': 1}
+
+
+def test_failure_before_submit_returns_to_pending(work_queue):
+    work_queue.publish('r1', ['1'])
+    work_queue.acquire('r1', 'a', 60)
+    assert work_queue.complete('r1', '1', 'a', 'failed')
+    assert work_queue.acquire('r1', 'b', 60) == '1'
+
+
+def test_failure_after_submit_is_uncertain(work_queue):
+    work_queue.publish('r1', ['1'])
+    work_queue.acquire('r1', 'a', 60)
+    assert work_queue.mark_submitting('r1', '1', 'a')
+    assert work_queue.complete('r1', '1', 'a', 'failed')
+    assert work_queue.acquire('r1', 'b', 60) is None
+    assert work_queue.summary('r1') == {'uncertain': 1}
+    assert work_queue.release_uncertain('r1', '1', submitted=False)
+    assert work_queue.acquire('r1', 'b', 60) == '1'
+
+
+def test_expired_lease_cannot_complete_and_unit_is_requeued(work_queue):
+    work_queue.publish('r1', ['1', '2'])
+    worker = LeaseWorker(work_queue, 'r1', host='a', lease_s=0.05)
+    assert work_queue.acquire('r1', 'a', 0.05) == '1'
+    time.sleep(0.1)
+    # guard bloqueia a solicitação; o resultado 'failed' (ou mesmo 'skipped') não fecha a unidade
+    assert not worker.submit_guard('1')
+    assert not work_queue.complete('r1', '1', 'a', 'skipped')
+    assert not work_queue.complete('r1', '1', 'a', 'failed')
+    assert work_queue.summary('r1') == {'pending': 2}
+    assert work_queue.acquire('r1', 'b', 60) == '1'
+
+
+def test_expired_lease_after_submit_can_only_be_confirmed(work_queue):
+    work_queue.publish('r1', ['1'])
+    work_queue.acquire('r1', 'a', 0.05)
+    assert work_queue.mark_submitting('r1', '1', 'a')
+    time.sleep(0.1)
+    assert not work_queue.complete('r1', '1', 'a', 'skipped')
+    assert work_queue.summary('r1') == {'uncertain': 1}
+    assert work_queue.complete('r1', '1', 'a', 'ok')
+    assert work_queue.summary('r1') == {'done': 1}
+
+
+def test_other_host_cannot_complete(work_queue):
+    work_queue.publish('r1', ['1'])
+    work_queue.acquire('r1', 'a', 60)
+    assert not work_queue.complete('r1', '1', 'b', 'ok')